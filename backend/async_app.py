@@ -0,0 +1,293 @@
+"""
+Async variant of the API: `uvicorn backend.async_app:app`.
+
+Same routes and behaviour as backend/main.py, but every endpoint is an
+`async def` on an AsyncSession (aiosqlite / asyncpg), so requests wait on
+database I/O in the event loop instead of occupying threadpool workers. The
+endpoint logic is shared with the sync app through AsyncSession.run_sync;
+image decoding and blob store reads and writes, which block, run in the
+threadpool between those calls.
+Broker messages still go through the outbox; the dispatcher publishes them
+off the event loop.
+"""
+
+from contextlib import asynccontextmanager
+from typing import Literal
+
+from fastapi import Depends, FastAPI, Header, Query, Request, Response, status
+from fastapi.middleware.cors import CORSMiddleware
+from sqlmodel.ext.asyncio.session import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from backend import crud
+from backend.async_database import (
+    dispose_async_engines,
+    get_async_read_session,
+    get_async_session,
+)
+from backend.feed_cache import CachedBody, feed_cache
+from backend.http_cache import NO_STORE, JSONGZipMiddleware, Validators, read_validators
+from backend.jobs import job_stream_response
+from backend.main import (
+    CORS_OPTIONS,
+    INCLUDE_DESCRIPTION,
+    accepted_job,
+    answer_conditional_get,
+    cached_response,
+    dispatcher,
+    image_response,
+    lifespan,
+    rows_response,
+)
+from backend.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from backend.schemas import (
+    CommentCreate,
+    CommentRead,
+    GeneratedCommentCreate,
+    GeneratedPostCreate,
+    JobRead,
+    JobUpdate,
+    PostCreate,
+    PostRead,
+    PostSummary,
+    SearchHit,
+)
+from backend.uploads import read_multipart_upload
+
+
+@asynccontextmanager
+async def async_lifespan(app: FastAPI):
+    async with lifespan(app):
+        yield
+    await dispose_async_engines()
+
+
+app = FastAPI(title="Simple Social API", lifespan=async_lifespan)
+
+app.add_middleware(CORSMiddleware, **CORS_OPTIONS)
+app.add_middleware(JSONGZipMiddleware)
+
+
+# Conditional GET of the read endpoints, as in backend/main.py
+async def conditional_get(
+    response: Response,
+    if_none_match: str | None = Header(None),
+    if_modified_since: str | None = Header(None),
+    session: AsyncSession = Depends(get_async_read_session),
+) -> Validators:
+    validators = await session.run_sync(read_validators)
+    return answer_conditional_get(validators, response, if_none_match, if_modified_since)
+
+
+# -------------------------------------------------
+# Posts
+# -------------------------------------------------
+@app.post("/posts/", response_model=PostRead)
+async def create_post(post: PostCreate, session: AsyncSession = Depends(get_async_session)):
+    job = await session.run_sync(crud.finished_job, post.job_id)
+    if job is not None and job.post_id is not None:
+        found = await session.run_sync(crud.find_post, job.post_id)
+        return await run_in_threadpool(crud.post_read, *found)
+    image = await run_in_threadpool(crud.store_post_image, post)
+    new_post = await session.run_sync(crud.store_post, post.text, post.user, image, post.job_id)
+    blob_hashes = {"full": image.blob_hash} if image else {}
+    created = await run_in_threadpool(crud.post_read, new_post, blob_hashes)
+    if created.image_full:
+        dispatcher.notify()
+    return created
+
+
+@app.post("/posts/upload", response_model=PostSummary)
+async def upload_post(request: Request, session: AsyncSession = Depends(get_async_session)):
+    upload = await read_multipart_upload(request)
+    created = await session.run_sync(crud.upload_post, upload)
+    if created.image_full_url:
+        dispatcher.notify()
+    return created
+
+
+@app.post("/posts/generate", response_model=JobRead, status_code=status.HTTP_202_ACCEPTED)
+async def create_post_with_ai(
+    post: GeneratedPostCreate,
+    response: Response,
+    session: AsyncSession = Depends(get_async_session),
+):
+    job = await session.run_sync(crud.enqueue_post_generation, post)
+    dispatcher.notify()
+    return accepted_job(response, job)
+
+
+@app.post(
+    "/posts/{post_id}/comments/generate",
+    response_model=JobRead,
+    status_code=status.HTTP_202_ACCEPTED,
+)
+async def create_comment_with_ai(
+    post_id: int,
+    comment: GeneratedCommentCreate,
+    response: Response,
+    session: AsyncSession = Depends(get_async_session),
+):
+    job = await session.run_sync(crud.enqueue_comment_generation, post_id, comment)
+    dispatcher.notify()
+    return accepted_job(response, job)
+
+
+@app.get("/posts/", response_model=list[PostSummary])
+async def get_all_posts(
+    text: str | None = Query(None, description="Search term for text"),
+    user: str | None = Query(None, description="Filter by author username"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Page size"),
+    cursor: str | None = Query(None, description="Cursor returned by the previous page"),
+    include: str | None = Query(None, description=INCLUDE_DESCRIPTION),
+    validators: Validators = Depends(conditional_get),
+    session: AsyncSession = Depends(get_async_read_session),
+):
+    includes = crud.parse_include(include)
+    page = await session.run_sync(
+        crud.cached_feed_page, text, user, limit, cursor, validators.version, includes
+    )
+    return cached_response(*page, validators)
+
+
+@app.get("/posts/{post_id}", response_model=PostRead)
+async def get_post_by_id(
+    post_id: int,
+    validators: Validators = Depends(conditional_get),
+    session: AsyncSession = Depends(get_async_read_session),
+):
+
+    async def load() -> CachedBody:
+        found = await session.run_sync(crud.find_post, post_id)
+        return crud.post_body(await run_in_threadpool(crud.post_read, *found))
+
+    key = crud.post_cache_key(post_id)
+    post = await feed_cache.read_through_async(key, load, validators.version)
+    return cached_response(*post, validators)
+
+
+@app.get("/posts/{post_id}/image/{variant}")
+async def get_post_image(
+    post_id: int,
+    variant: Literal["full", "thumb"],
+    size: int | None = Query(None, ge=1, description="Longest side in px (closest rendition)"),
+    accept: str | None = Header(None),
+    if_none_match: str | None = Header(None),
+    session: AsyncSession = Depends(get_async_read_session),
+):
+    image = await session.run_sync(crud.get_post_image, post_id, variant, size, accept)
+    # Remote blob stores are read with blocking calls
+    return await run_in_threadpool(image_response, image, if_none_match)
+
+
+@app.delete("/posts/{post_id}", status_code=204)
+async def delete_post(post_id: int, session: AsyncSession = Depends(get_async_session)):
+    await session.run_sync(crud.remove_post, post_id)
+    await collect_orphan_blobs(session)
+    return None
+
+
+async def collect_orphan_blobs(session: AsyncSession) -> None:
+    """crud.collect_orphan_blobs with the blob deletes in the threadpool."""
+    cutoff = crud.orphan_blob_cutoff()
+    due = await session.run_sync(crud.due_orphan_blobs)
+    deleted = await run_in_threadpool(crud.delete_idle_blobs, due, cutoff)
+    await session.run_sync(crud.forget_orphan_blobs, deleted)
+
+
+# -------------------------------------------------
+# Comments
+# -------------------------------------------------
+@app.get("/posts/{post_id}/comments", response_model=list[CommentRead])
+async def get_comments_for_post(
+    post_id: int,
+    text: str | None = Query(None, description="Search term in comment text"),
+    user: str | None = Query(None, description="Filter by comment user"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Page size"),
+    cursor: str | None = Query(None, description="Cursor returned by the previous page"),
+    session: AsyncSession = Depends(get_async_read_session),
+    validators: Validators = Depends(conditional_get),
+):
+    rows, next_cursor = await session.run_sync(
+        crud.list_comments, post_id, text, user, limit, cursor
+    )
+    return rows_response(rows, validators, next_cursor)
+
+
+@app.post("/posts/{post_id}/comments", response_model=CommentRead)
+async def create_comment(
+    post_id: int, comment: CommentCreate, session: AsyncSession = Depends(get_async_session)
+):
+    return await session.run_sync(crud.create_comment, post_id, comment)
+
+
+@app.delete("/comments/{comment_id}", status_code=204)
+async def delete_comment(comment_id: int, session: AsyncSession = Depends(get_async_session)):
+    await session.run_sync(crud.delete_comment, comment_id)
+    return None
+
+
+@app.get(
+    "/comments/{comment_id}", response_model=CommentRead, dependencies=[Depends(conditional_get)]
+)
+async def get_comment_by_id(
+    comment_id: int, session: AsyncSession = Depends(get_async_read_session)
+):
+    return await session.run_sync(crud.get_comment, comment_id)
+
+
+@app.get("/comments/", response_model=dict[int, list[CommentRead]])
+async def get_comments_for_posts(
+    post_id: list[int] = Query(..., max_length=MAX_PAGE_SIZE, description="Repeat per post"),
+    latest: int | None = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Newest N per post"),
+    session: AsyncSession = Depends(get_async_read_session),
+    validators: Validators = Depends(conditional_get),
+):
+    comments = await session.run_sync(crud.comments_for_posts, post_id, latest)
+    return rows_response(comments, validators)
+
+
+# -------------------------------------------------
+# Generation jobs
+# -------------------------------------------------
+@app.get("/jobs/{job_id}", response_model=JobRead)
+async def get_job(
+    job_id: str, response: Response, session: AsyncSession = Depends(get_async_session)
+):
+    response.headers["Cache-Control"] = NO_STORE
+    return await session.run_sync(crud.get_job, job_id)
+
+
+@app.patch("/jobs/{job_id}", response_model=JobRead)
+async def update_job(
+    job_id: str, update: JobUpdate, session: AsyncSession = Depends(get_async_session)
+):
+    return await session.run_sync(crud.update_job, job_id, update)
+
+
+@app.get("/jobs/{job_id}/stream")
+async def stream_job(job_id: str, session: AsyncSession = Depends(get_async_session)):
+    await session.run_sync(crud.get_job, job_id)
+    return job_stream_response(lambda: session.run_sync(crud.poll_job, job_id))
+
+
+# -------------------------------------------------
+# Feed cache counters
+# -------------------------------------------------
+@app.get("/cache/stats")
+async def get_cache_stats(response: Response):
+    response.headers["Cache-Control"] = NO_STORE
+    return feed_cache.stats()
+
+
+# -------------------------------------------------
+# Search
+# -------------------------------------------------
+@app.get("/search", response_model=list[SearchHit], dependencies=[Depends(conditional_get)])
+async def search(
+    q: str = Query(..., min_length=1, description="Search terms (prefix matched)"),
+    scope: Literal["posts", "comments"] = Query("posts", description="What to search"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Max hits"),
+    session: AsyncSession = Depends(get_async_read_session),
+):
+    return await session.run_sync(crud.search, q, scope, limit)
@@ -0,0 +1,79 @@
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import StaticPool
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from backend.database import (
+    DATABASE_URL,
+    DB_MAX_OVERFLOW,
+    DB_POOL_SIZE,
+    DB_POOL_TIMEOUT,
+    DB_QUERY_CACHE_SIZE,
+    READ_DATABASE_URL,
+    apply_sqlite_pragmas,
+    is_memory_sqlite,
+)
+
+# Async driver for each sync URL scheme (psycopg 3 is async-capable as is)
+_ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+}
+
+
+def to_async_url(url: str) -> str:
+    scheme, sep, rest = url.partition("://")
+    return f"{_ASYNC_DRIVERS.get(scheme, scheme)}{sep}{rest}"
+
+
+def create_async_db_engine(url: str, echo: bool = False) -> AsyncEngine:
+    """
+    Async counterpart of backend.database.create_db_engine: same pool sizing
+    and, for SQLite files, the same pragmas (applied through the sync engine).
+    """
+    url = to_async_url(url)
+    if url.startswith("sqlite"):
+        if is_memory_sqlite(url):
+            return create_async_engine(url, echo=echo, poolclass=StaticPool)
+        engine = create_async_engine(
+            url,
+            echo=echo,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+        )
+        event.listen(engine.sync_engine, "connect", apply_sqlite_pragmas)
+        return engine
+
+    return create_async_engine(
+        url,
+        echo=echo,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_pre_ping=True,
+        pool_recycle=1800,
+        query_cache_size=DB_QUERY_CACHE_SIZE,
+    )
+
+
+async_engine = create_async_db_engine(DATABASE_URL)
+async_read_engine = create_async_db_engine(READ_DATABASE_URL) if READ_DATABASE_URL else async_engine
+
+
+async def dispose_async_engines() -> None:
+    await async_engine.dispose()
+    if async_read_engine is not async_engine:
+        await async_read_engine.dispose()
+
+
+async def get_async_session():
+    async with AsyncSession(async_engine) as session:
+        yield session
+
+
+async def get_async_read_session():
+    async with AsyncSession(async_read_engine) as session:
+        yield session
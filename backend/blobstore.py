@@ -0,0 +1,272 @@
+"""
+Content-addressed storage for image bytes.
+
+Blobs are keyed by the SHA-256 of their content, so the database only keeps
+the hash (post_image.blob_hash) and identical images are stored once. Two
+backends:
+
+- LocalBlobStore (default): files under BLOB_ROOT, fanned out as
+  ab/cd/abcd...; served with FileResponse (sendfile where the server
+  supports it) or handed to nginx via X-Accel-Redirect.
+- S3BlobStore (BLOB_STORE=s3): any S3-compatible service through a
+  boto3-style client (`pip install boto3`, BLOB_S3_BUCKET, optionally
+  BLOB_S3_ENDPOINT_URL for MinIO and friends).
+
+Blobs are shared by every post with the same image, so they are only removed
+by the garbage collector in backend/crud.py, through delete_if_idle(): a put
+of content that is already stored refreshes the blob's modification time, and
+a blob written or put again since the collector's cutoff is kept.
+"""
+
+import hashlib
+import os
+import tempfile
+import uuid
+from abc import ABC, abstractmethod
+from datetime import datetime
+from pathlib import Path
+from typing import BinaryIO
+
+BLOB_STORE = os.environ.get("BLOB_STORE", "local")
+BLOB_ROOT = os.environ.get("BLOB_ROOT", "sqlite/blobs")
+BLOB_S3_BUCKET = os.environ.get("BLOB_S3_BUCKET", "social-images")
+BLOB_S3_PREFIX = os.environ.get("BLOB_S3_PREFIX", "blobs/")
+BLOB_S3_ENDPOINT_URL = os.environ.get("BLOB_S3_ENDPOINT_URL")
+# Local store behind nginx: internal location mapped to BLOB_ROOT, e.g. "/_blobs"
+BLOB_ACCEL_REDIRECT_PREFIX = os.environ.get("BLOB_ACCEL_REDIRECT_PREFIX", "").rstrip("/")
+# Size of the in-memory part of S3 upload buffers before they spill to disk
+_SPOOL_BYTES = 1024 * 1024
+# S3 error codes of a missing key (get_object: NoSuchKey, head_object: 404)
+_S3_MISSING_CODES = {"404", "NoSuchKey", "NotFound"}
+
+
+class BlobNotFound(KeyError):
+    pass
+
+
+class BlobWriter:
+    """
+    Incremental write of one blob: the hash is computed while the chunks
+    are written, the blob becomes visible under it on commit().
+    """
+
+    def __init__(self, store: "BlobStore"):
+        self.store = store
+        self.size = 0
+        self._hash = hashlib.sha256()
+        self._file = store._open_temp()
+
+    def write(self, chunk: bytes) -> None:
+        self._hash.update(chunk)
+        self._file.write(chunk)
+        self.size += len(chunk)
+
+    def read_back(self) -> BinaryIO:
+        """The bytes written so far, as a file positioned at the start."""
+        self._file.flush()
+        self._file.seek(0)
+        return self._file
+
+    def commit(self) -> str:
+        digest = self._hash.hexdigest()
+        self.store._commit_temp(self._file, digest)
+        return digest
+
+    def abort(self) -> None:
+        self.store._discard_temp(self._file)
+
+
+class BlobStore(ABC):
+    """Interface shared by the backends; blobs are immutable."""
+
+    def writer(self) -> BlobWriter:
+        return BlobWriter(self)
+
+    def put(self, data: bytes) -> str:
+        writer = self.writer()
+        writer.write(data)
+        return writer.commit()
+
+    @abstractmethod
+    def get(self, digest: str) -> bytes: ...
+
+    @abstractmethod
+    def exists(self, digest: str) -> bool: ...
+
+    @abstractmethod
+    def delete(self, digest: str) -> None: ...
+
+    @abstractmethod
+    def delete_if_idle(self, digest: str, idle_since: datetime) -> bool:
+        """
+        Delete the blob unless it was written or put again at or after
+        `idle_since`; True when it is gone.
+        """
+
+    def local_path(self, digest: str) -> Path | None:
+        """Filesystem path of the blob, if the backend has one."""
+        return None
+
+    @abstractmethod
+    def _open_temp(self): ...
+
+    @abstractmethod
+    def _commit_temp(self, file, digest: str) -> None:
+        """Store the temp file under `digest`; an existing blob is touched."""
+
+    @abstractmethod
+    def _discard_temp(self, file) -> None: ...
+
+
+class LocalBlobStore(BlobStore):
+    def __init__(self, root: str | Path = BLOB_ROOT):
+        self.root = Path(root)
+        self._tmp = self.root / "tmp"
+
+    def relative_path(self, digest: str) -> str:
+        return f"{digest[:2]}/{digest[2:4]}/{digest}"
+
+    def _path(self, digest: str) -> Path:
+        return self.root / self.relative_path(digest)
+
+    def get(self, digest: str) -> bytes:
+        try:
+            return self._path(digest).read_bytes()
+        except FileNotFoundError:
+            raise BlobNotFound(digest)
+
+    def exists(self, digest: str) -> bool:
+        return self._path(digest).exists()
+
+    def delete(self, digest: str) -> None:
+        self._path(digest).unlink(missing_ok=True)
+
+    def delete_if_idle(self, digest: str, idle_since: datetime) -> bool:
+        path = self._path(digest)
+        doomed = path.with_name(f"{digest}.{uuid.uuid4().hex}.gc")
+        try:
+            # Atomic: from here on a put of this content writes it anew
+            os.replace(path, doomed)
+        except FileNotFoundError:
+            return True
+        if doomed.stat().st_mtime >= idle_since.timestamp():
+            # Put again while the collector was deciding: keep it (same bytes
+            # as a blob a put may have written meanwhile)
+            os.replace(doomed, path)
+            return False
+        doomed.unlink()
+        return True
+
+    def local_path(self, digest: str) -> Path | None:
+        return self._path(digest)
+
+    def _open_temp(self):
+        self._tmp.mkdir(parents=True, exist_ok=True)
+        return tempfile.NamedTemporaryFile(dir=self._tmp, delete=False)
+
+    def _commit_temp(self, file, digest: str) -> None:
+        file.close()
+        path = self._path(digest)
+        try:
+            # Deduplicated: the same content is already stored. The new mtime
+            # keeps the garbage collector away from it (see delete_if_idle)
+            os.utime(path)
+            os.unlink(file.name)
+            return
+        except FileNotFoundError:
+            pass
+        path.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(file.name, path)  # atomic: readers never see partial blobs
+
+    def _discard_temp(self, file) -> None:
+        file.close()
+        Path(file.name).unlink(missing_ok=True)
+
+
+class S3BlobStore(BlobStore):
+    """
+    Blobs as objects in an S3 bucket. `client` is a boto3 S3 client (or
+    anything with the same put_object / get_object / head_object /
+    delete_object methods).
+    """
+
+    def __init__(self, client, bucket: str = BLOB_S3_BUCKET, prefix: str = BLOB_S3_PREFIX):
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+
+    @classmethod
+    def from_env(cls) -> "S3BlobStore":
+        import boto3  # optional dependency
+
+        return cls(boto3.client("s3", endpoint_url=BLOB_S3_ENDPOINT_URL))
+
+    def _key(self, digest: str) -> str:
+        return f"{self.prefix}{digest}"
+
+    def get(self, digest: str) -> bytes:
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=self._key(digest))["Body"].read()
+        except self._client_errors() as error:
+            if not self._is_missing(error):
+                raise
+            raise BlobNotFound(digest) from error
+
+    def exists(self, digest: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._key(digest))
+            return True
+        except self._client_errors() as error:
+            if not self._is_missing(error):
+                raise
+            return False
+
+    def delete(self, digest: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(digest))
+
+    def delete_if_idle(self, digest: str, idle_since: datetime) -> bool:
+        # S3 has no atomic rename, so unlike the local store this leaves a
+        # window of one HEAD -> DELETE round trip in which a put is not seen
+        try:
+            head = self.client.head_object(Bucket=self.bucket, Key=self._key(digest))
+        except self._client_errors() as error:
+            if not self._is_missing(error):
+                raise
+            return True
+        if head["LastModified"] >= idle_since:
+            return False
+        self.delete(digest)
+        return True
+
+    def _client_errors(self) -> tuple[type[Exception], ...]:
+        # boto3 raises ClientError (or a subclass such as NoSuchKey) for any
+        # failed call: a missing key, but also denied access, throttling, 5xx
+        error = getattr(getattr(self.client, "exceptions", None), "ClientError", None)
+        return (error,) if isinstance(error, type) else ()
+
+    @staticmethod
+    def _is_missing(error: Exception) -> bool:
+        code = getattr(error, "response", {}).get("Error", {}).get("Code")
+        return str(code) in _S3_MISSING_CODES
+
+    def _open_temp(self):
+        return tempfile.SpooledTemporaryFile(max_size=_SPOOL_BYTES)
+
+    def _commit_temp(self, file, digest: str) -> None:
+        # Written even when the content is already stored: the new
+        # LastModified keeps the garbage collector away from it
+        with file:
+            file.seek(0)
+            self.client.put_object(Bucket=self.bucket, Key=self._key(digest), Body=file)
+
+    def _discard_temp(self, file) -> None:
+        file.close()
+
+
+def create_blob_store() -> BlobStore:
+    if BLOB_STORE == "s3":
+        return S3BlobStore.from_env()
+    return LocalBlobStore(BLOB_ROOT)
+
+
+blob_store = create_blob_store()
@@ -0,0 +1,619 @@
+"""
+Database logic behind the API endpoints.
+
+Every function takes a (sync) Session as its first argument, so the same code
+serves the threadpool endpoints in backend/main.py and, through
+AsyncSession.run_sync, the async endpoints in backend/async_app.py.
+"""
+
+import base64
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from fastapi import HTTPException
+from sqlmodel import Session, col, delete, func, select
+
+from backend import fast_json
+from backend.blobstore import blob_store
+from backend.feed_cache import CachedBody, bump_version, cache_key, feed_cache
+from backend.images import DEFAULT_THUMB_SIZE, choose_rendition
+from backend.models import Comment, GenerationJob, OrphanBlob, Post, PostImage
+from backend.outbox import enqueue
+from backend.pagination import (
+    DEFAULT_PAGE_SIZE,
+    NEXT_CURSOR_HEADER,
+    after_cursor,
+    split_page,
+)
+from backend.schemas import (
+    CommentCreate,
+    CommentRead,
+    GeneratedCommentCreate,
+    GeneratedPostCreate,
+    JobRead,
+    JobUpdate,
+    PostCreate,
+    PostRead,
+    PostSummary,
+)
+from backend.search import search_comments, search_posts
+from backend.uploads import MultipartUpload, StoredImage, store_image_bytes
+
+# Finished generation jobs are kept this long for GET /jobs/{id}
+JOB_RETENTION = timedelta(hours=float(os.environ.get("JOB_RETENTION_HOURS", "24")))
+# A blob put within this long is not garbage collected: an upload may be
+# about to commit a reference to it (see collect_orphan_blobs)
+BLOB_GC_GRACE = timedelta(seconds=float(os.environ.get("BLOB_GC_GRACE_SECONDS", "3600")))
+BLOB_GC_BATCH = 100
+# Optional extras of a feed page (GET /posts/?include=...), one query each per page
+FEED_INCLUDES = ("comment_count", "latest_comments")
+LATEST_COMMENTS = int(os.environ.get("LATEST_COMMENTS", "3"))
+_COMMENT_COLUMNS = (
+    Comment.super_id,
+    Comment.comment_id,
+    Comment.text,
+    Comment.user,
+    Comment.created_at,
+)
+
+
+# -------------------------------------------------
+# Posts
+# -------------------------------------------------
+def decode_image(raw: str | None) -> bytes | None:
+    """Decode the base64 / data-URL image of a PostCreate payload."""
+    if raw is None or raw.strip() == "":
+        return None
+    if raw.startswith("/assets/"):
+        return None
+    raw = raw.strip()
+    if raw.startswith("data:"):
+        # Only the short header is inspected; no regex over the whole payload
+        header, sep, raw = raw.partition(",")
+        if not sep or not header.endswith(";base64"):
+            raise HTTPException(400, "Invalid data URL format")
+    try:
+        # Non-alphabet characters (line breaks, spaces) are skipped while
+        # decoding, so the string is not copied to strip them first
+        return base64.b64decode(raw, validate=False)
+    except Exception:
+        raise HTTPException(400, "Invalid base64 image string")
+
+
+def store_post(
+    session: Session, text: str, user: str, image: StoredImage | None, job_id: str | None = None
+) -> Post:
+    """
+    Insert a post and the metadata of its original image (already in the
+    blob store), and queue the resize job. A generated post completes its job.
+    """
+    new_post = Post(text=text, user=user)
+    session.add(new_post)
+    session.flush()
+    bump_version(session)
+    if job_id:
+        _complete_job(session, job_id, text, post_id=new_post.id)
+
+    if image is not None and new_post.id is not None:
+        session.add(
+            PostImage(
+                post_id=new_post.id,
+                variant="full",
+                blob_hash=image.blob_hash,
+                size=image.size,
+                width=image.width,
+                height=image.height,
+                content_type=image.content_type,
+            )
+        )
+        enqueue(session, "image.resize", {"post_id": new_post.id})
+
+    session.commit()
+    session.refresh(new_post)
+    return new_post
+
+
+def store_post_image(post: PostCreate) -> StoredImage | None:
+    """Decode, normalize and store the image of a PostCreate (PIL and blob store work)."""
+    image_bytes = decode_image(post.image)
+    return None if image_bytes is None else store_image_bytes(image_bytes)
+
+
+def post_read(post: Post, blob_hashes: dict[str, str]) -> PostRead:
+    """The post with its images ("full", "thumb") embedded, read from the blob store."""
+    images = {name: blob_store.get(digest) for name, digest in blob_hashes.items()}
+    return PostRead.from_orm_bytes(post, images)
+
+
+def create_post(session: Session, post: PostCreate) -> PostRead:
+    job = finished_job(session, post.job_id)
+    if job is not None and job.post_id is not None:
+        return get_post(session, job.post_id)
+    image = store_post_image(post)
+    new_post = store_post(session, post.text, post.user, image, post.job_id)
+    return post_read(new_post, {"full": image.blob_hash} if image else {})
+
+
+def upload_post(session: Session, upload: MultipartUpload) -> PostSummary:
+    text, user = upload.fields.get("text"), upload.fields.get("user")
+    if not text or not user:
+        raise HTTPException(422, "Fields 'text' and 'user' are required")
+    new_post = store_post(session, text, user, upload.image)
+    images = [("full", upload.image.width, upload.image.height)] if upload.image else []
+    return PostSummary.from_orm_urls(new_post, images)
+
+
+def enqueue_post_generation(session: Session, post: GeneratedPostCreate) -> JobRead:
+    job = _new_job(session, "post")
+    payload = {
+        "job_id": job.id,
+        "user": post.user,
+        "prompt": post.prompt,
+        "persona": post.persona,
+        "image": post.image,
+    }
+    enqueue(session, "posts.generate", payload)
+    session.commit()
+    session.refresh(job)
+    return JobRead.model_validate(job)
+
+
+def enqueue_comment_generation(
+    session: Session, post_id: int, comment: GeneratedCommentCreate
+) -> JobRead:
+    post = session.get(Post, post_id)
+    if not post:
+        raise HTTPException(404, "Post not found")
+
+    job = _new_job(session, "comment", post_id=post.id)
+    job_payload = {
+        "job_id": job.id,
+        "post_id": post.id,
+        "post_text": post.text,
+        "user": comment.user,
+        "persona": comment.persona,
+    }
+    enqueue(session, "comments.generate", job_payload)
+    session.commit()
+    session.refresh(job)
+    return JobRead.model_validate(job)
+
+
+# -------------------------------------------------
+# Generation jobs
+# -------------------------------------------------
+def _new_job(session: Session, kind: str, post_id: int | None = None) -> GenerationJob:
+    # Housekeeping on the way: finished jobs past their retention
+    cutoff = datetime.now(timezone.utc) - JOB_RETENTION
+    session.exec(
+        delete(GenerationJob).where(
+            col(GenerationJob.status).in_(("done", "failed")),
+            col(GenerationJob.updated_at) < cutoff,
+        )
+    )
+    job = GenerationJob(id=uuid.uuid4().hex, kind=kind, post_id=post_id)
+    session.add(job)
+    return job
+
+
+def finished_job(session: Session, job_id: str | None) -> GenerationJob | None:
+    """
+    The job if it is done already. The worker may run a job twice (a message
+    redelivered after a reconnect or a lost ack); the repeated create answers
+    with the post or comment of the first run instead of adding another one.
+    """
+    job = session.get(GenerationJob, job_id) if job_id else None
+    return job if job is not None and job.status == "done" else None
+
+
+def _complete_job(
+    session: Session,
+    job_id: str,
+    text: str,
+    post_id: int | None = None,
+    comment_id: int | None = None,
+) -> None:
+    job = session.get(GenerationJob, job_id)
+    if job is None:
+        # Expired or unknown: the content itself is what matters
+        return
+    job.status = "done"
+    job.text = text
+    job.error = None
+    if post_id is not None:
+        job.post_id = post_id
+    job.comment_id = comment_id
+    job.updated_at = datetime.now(timezone.utc)
+    session.add(job)
+
+
+def get_job(session: Session, job_id: str) -> JobRead:
+    job = session.get(GenerationJob, job_id)
+    if not job:
+        raise HTTPException(404, "Job not found")
+    return JobRead.model_validate(job)
+
+
+def poll_job(session: Session, job_id: str) -> JobRead | None:
+    """
+    Current state of a job for the event stream, None once it is gone. Ends
+    the read transaction, so the next poll sees new commits.
+    """
+    try:
+        job = session.get(GenerationJob, job_id)
+        return JobRead.model_validate(job) if job else None
+    finally:
+        session.rollback()
+
+
+def update_job(session: Session, job_id: str, update: JobUpdate) -> JobRead:
+    job = session.get(GenerationJob, job_id)
+    if not job:
+        raise HTTPException(404, "Job not found")
+    if job.status in ("done", "failed"):
+        # Late report of a retried or redelivered attempt: the outcome stands
+        return JobRead.model_validate(job)
+
+    for field, value in update.model_dump(exclude_unset=True).items():
+        setattr(job, field, value)
+    job.updated_at = datetime.now(timezone.utc)
+    session.add(job)
+    session.commit()
+    session.refresh(job)
+    return JobRead.model_validate(job)
+
+
+def parse_include(include: str | None) -> tuple[str, ...]:
+    """The FEED_INCLUDES named in a comma-separated `include`, in canonical order."""
+    names = {name.strip() for name in (include or "").split(",") if name.strip()}
+    unknown = names.difference(FEED_INCLUDES)
+    if unknown:
+        expected = ", ".join(FEED_INCLUDES)
+        raise HTTPException(422, f"Unknown include: {', '.join(sorted(unknown))} ({expected})")
+    return tuple(name for name in FEED_INCLUDES if name in names)
+
+
+def list_posts(
+    session: Session,
+    text: str | None,
+    user: str | None,
+    limit: int,
+    cursor: str | None,
+    include: tuple[str, ...] = (),
+) -> tuple[list[dict], str | None]:
+    """
+    One feed page, newest first, plus the cursor of the next page. The rows
+    are PostSummary-shaped dicts built from the columns (see backend/fast_json.py).
+    """
+    query = select(Post.id, Post.text, Post.user, Post.created_at)
+    if text:
+        # The comment in the next row is necessary to silence Pylance
+        query = query.where(Post.text.ilike(f"%{text}%"))  # type: ignore[attr-defined]
+    if user:
+        query = query.where(Post.user == user)
+    query = after_cursor(query, Post.created_at, Post.id, cursor)
+    # The comment in the next row is necessary to silence Pylance
+    query = query.order_by(Post.created_at.desc(), Post.id.desc())  # type: ignore[attr-defined]
+
+    rows = session.exec(query.limit(limit + 1)).all()
+    if not rows:
+        raise HTTPException(404, "No posts found")
+
+    posts, next_cursor = split_page(rows, limit, lambda row: (row.created_at, row.id))
+
+    # Which images exist, and their dimensions, without reading any BLOB
+    images: dict[int, list] = {}
+    image_keys = select(
+        PostImage.post_id, PostImage.variant, PostImage.width, PostImage.height
+    ).where(col(PostImage.post_id).in_([p.id for p in posts]))
+    for post_id, variant, width, height in session.exec(image_keys):
+        images.setdefault(post_id, []).append((variant, width, height))
+    summaries = [PostSummary.row(*post, images.get(post.id, [])) for post in posts]
+
+    post_ids = [post.id for post in posts]
+    if "comment_count" in include:
+        counts = comment_counts(session, post_ids)
+        for summary in summaries:
+            summary["comment_count"] = counts.get(summary["id"], 0)
+    if "latest_comments" in include:
+        latest = comments_by_post(session, post_ids, LATEST_COMMENTS)
+        for summary in summaries:
+            summary["latest_comments"] = latest[summary["id"]]
+    return summaries, next_cursor
+
+
+def cached_feed_page(
+    session: Session,
+    text: str | None,
+    user: str | None,
+    limit: int,
+    cursor: str | None,
+    version: int | None = None,
+    include: tuple[str, ...] = (),
+) -> tuple[CachedBody, bool]:
+    """list_posts serialized, through the feed cache; also says whether it was a hit."""
+
+    def load() -> CachedBody:
+        posts, next_cursor = list_posts(session, text, user, limit, cursor, include)
+        headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else {}
+        return CachedBody(fast_json.dumps(posts), headers)
+
+    key = cache_key("feed", text, user, limit, cursor, include)
+    return feed_cache.read_through(session, key, load, version)
+
+
+def _image_variants(session: Session, post_id: int) -> list[str]:
+    query = select(PostImage.variant).where(PostImage.post_id == post_id)
+    return list(session.exec(query))
+
+
+def _thumb_variant(variants: list[str], size: int, accept: str | None) -> str | None:
+    chosen = choose_rendition(variants, size, accept)
+    if chosen is None and "thumb" in variants:
+        return "thumb"  # made by the resizer before renditions existed
+    return chosen
+
+
+def find_post(session: Session, post_id: int) -> tuple[Post, dict[str, str]]:
+    """The post and the blob hashes of the images post_read embeds."""
+    post = session.get(Post, post_id)
+    if not post:
+        raise HTTPException(404, "Post not found")
+
+    # Only the original and the default-size JPEG thumbnail are embedded
+    thumb = _thumb_variant(_image_variants(session, post_id), DEFAULT_THUMB_SIZE, None)
+    wanted = ["full"] + ([thumb] if thumb else [])
+    query = select(PostImage).where(
+        PostImage.post_id == post_id, col(PostImage.variant).in_(wanted)
+    )
+    blob_hashes = {
+        ("thumb" if image.variant == thumb else image.variant): image.blob_hash
+        for image in session.exec(query)
+    }
+    return post, blob_hashes
+
+
+def get_post(session: Session, post_id: int) -> PostRead:
+    return post_read(*find_post(session, post_id))
+
+
+def post_cache_key(post_id: int) -> str:
+    return cache_key("post", post_id)
+
+
+def post_body(post: PostRead) -> CachedBody:
+    return CachedBody(post.model_dump_json().encode(), {})
+
+
+def cached_post(
+    session: Session, post_id: int, version: int | None = None
+) -> tuple[CachedBody, bool]:
+    """get_post serialized, through the feed cache; also says whether it was a hit."""
+
+    def load() -> CachedBody:
+        return post_body(get_post(session, post_id))
+
+    return feed_cache.read_through(session, post_cache_key(post_id), load, version)
+
+
+def get_post_image(
+    session: Session, post_id: int, variant: str, size: int | None, accept: str | None
+) -> PostImage:
+    """
+    The stored image answering /posts/{id}/image/{variant}: "full" is the
+    original unless a size is asked for, "thumb" the rendition closest to
+    `size` (default DEFAULT_THUMB_SIZE) in the best format the client accepts.
+    """
+    if variant == "full" and size is None:
+        stored = "full"
+    else:
+        variants = _image_variants(session, post_id)
+        stored = _thumb_variant(variants, size or DEFAULT_THUMB_SIZE, accept)
+        if stored is None and variant == "full" and "full" in variants:
+            stored = "full"
+
+    image = session.get(PostImage, (post_id, stored)) if stored else None
+    if not image:
+        if not session.get(Post, post_id):
+            raise HTTPException(404, "Post not found")
+        raise HTTPException(404, "Image not found")
+    return image
+
+
+def delete_post(session: Session, post_id: int) -> None:
+    remove_post(session, post_id)
+    collect_orphan_blobs(session)
+
+
+def remove_post(session: Session, post_id: int) -> None:
+    """delete_post without the blob garbage collection."""
+    post = session.get(Post, post_id)
+    if not post:
+        raise HTTPException(404, "Post not found")
+
+    hashes = set(session.exec(select(PostImage.blob_hash).where(PostImage.post_id == post_id)))
+    # Bulk deletes, so no comment rows are loaded first
+    session.exec(delete(Comment).where(col(Comment.super_id) == post_id))
+    session.exec(delete(PostImage).where(col(PostImage.post_id) == post_id))
+    session.delete(post)
+    _orphan_blobs(session, hashes)
+    bump_version(session)
+    session.commit()
+
+
+def _orphan_blobs(session: Session, hashes: set[str]) -> None:
+    """Queue the blobs no post_image row points to anymore (they are shared)."""
+    if not hashes:
+        return
+    referenced = select(PostImage.blob_hash).where(col(PostImage.blob_hash).in_(hashes))
+    queued = select(OrphanBlob.blob_hash).where(col(OrphanBlob.blob_hash).in_(hashes))
+    for digest in hashes - set(session.exec(referenced)) - set(session.exec(queued)):
+        session.add(OrphanBlob(blob_hash=digest))
+
+
+def orphan_blob_cutoff(grace: timedelta = BLOB_GC_GRACE) -> datetime:
+    return datetime.now(timezone.utc) - grace
+
+
+def due_orphan_blobs(session: Session, limit: int = BLOB_GC_BATCH) -> list[str]:
+    """
+    Queued orphans that are still unreferenced. The ones an upload has
+    referred to again meanwhile leave the queue.
+    """
+    queued = set(session.exec(select(OrphanBlob.blob_hash).limit(limit)))
+    if not queued:
+        return []
+    query = select(PostImage.blob_hash).where(col(PostImage.blob_hash).in_(queued))
+    referenced = set(session.exec(query))
+    if referenced:
+        forget_orphan_blobs(session, referenced)
+    return sorted(queued - referenced)
+
+
+def delete_idle_blobs(hashes: list[str], cutoff: datetime) -> list[str]:
+    """
+    The blob store part of the collection (blocking I/O): the hashes deleted.
+    A blob the store fails on stays queued for a later run.
+    """
+    deleted = []
+    for digest in hashes:
+        try:
+            if blob_store.delete_if_idle(digest, cutoff):
+                deleted.append(digest)
+        except Exception as e:
+            print(f"[backend] blob {digest} not collected, retrying later: {e}", flush=True)
+    return deleted
+
+
+def forget_orphan_blobs(session: Session, hashes: list[str] | set[str]) -> None:
+    if hashes:
+        session.exec(delete(OrphanBlob).where(col(OrphanBlob.blob_hash).in_(hashes)))
+        session.commit()
+
+
+def collect_orphan_blobs(session: Session, grace: timedelta = BLOB_GC_GRACE) -> int:
+    """
+    Delete queued orphan blobs that nothing refers to again and that no put
+    has touched within `grace`: an upload of the same content skips the write
+    (deduplication) but touches the blob, then commits its post_image row, so
+    a recently touched blob may be about to be referenced. Those stay queued
+    for a later run. Runs after every post deletion; returns the number of
+    blobs deleted.
+    """
+    cutoff = orphan_blob_cutoff(grace)
+    deleted = delete_idle_blobs(due_orphan_blobs(session), cutoff)
+    forget_orphan_blobs(session, deleted)
+    return len(deleted)
+
+
+# -------------------------------------------------
+# Comments
+# -------------------------------------------------
+def list_comments(
+    session: Session,
+    post_id: int,
+    text: str | None,
+    user: str | None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: str | None = None,
+) -> tuple[list[dict], str | None]:
+    """
+    One page of a post's comments, oldest first, plus the cursor of the next
+    page. CommentRead-shaped dicts straight from the columns (see
+    backend/fast_json.py).
+    """
+    query = select(*_COMMENT_COLUMNS).where(Comment.super_id == post_id)
+    if text:
+        query = query.where(Comment.text.ilike(f"%{text}%"))  # type: ignore[attr-defined]
+    if user:
+        query = query.where(Comment.user == user)
+    query = after_cursor(query, Comment.created_at, Comment.comment_id, cursor, descending=False)
+    query = query.order_by(col(Comment.created_at), col(Comment.comment_id))
+
+    rows = session.exec(query.limit(limit + 1)).all()
+    comments, next_cursor = split_page(rows, limit, lambda row: (row.created_at, row.comment_id))
+    return [row._asdict() for row in comments], next_cursor
+
+
+def comment_counts(session: Session, post_ids: list[int]) -> dict[int, int]:
+    """Number of comments per post, for posts that have any."""
+    query = (
+        select(Comment.super_id, func.count())
+        .where(col(Comment.super_id).in_(post_ids))
+        .group_by(Comment.super_id)
+    )
+    return dict(session.exec(query).all())
+
+
+def comments_by_post(
+    session: Session, post_ids: list[int], latest: int | None = None
+) -> dict[int, list[dict]]:
+    """
+    The comments of each post (oldest first, every post id gets a list) in
+    one query, or only the `latest` ones of each post.
+    """
+    query = select(*_COMMENT_COLUMNS).where(col(Comment.super_id).in_(post_ids))
+    if latest is not None:
+        newest_first = (col(Comment.created_at).desc(), col(Comment.comment_id).desc())
+        position = func.row_number().over(partition_by=Comment.super_id, order_by=newest_first)
+        ranked = query.add_columns(position.label("position")).subquery()
+        columns = [ranked.c[column.key] for column in _COMMENT_COLUMNS]
+        query = select(*columns).where(ranked.c.position <= latest)
+    query = query.order_by("super_id", "created_at", "comment_id")
+
+    comments: dict[int, list[dict]] = {post_id: [] for post_id in post_ids}
+    for row in session.exec(query):
+        comments[row.super_id].append(row._asdict())
+    return comments
+
+
+def comments_for_posts(
+    session: Session, post_ids: list[int], latest: int | None = None
+) -> dict[str, list[dict]]:
+    """comments_by_post for GET /comments/, keyed by the post id as a JSON object key."""
+    comments = comments_by_post(session, list(dict.fromkeys(post_ids)), latest)
+    return {str(post_id): rows for post_id, rows in comments.items()}
+
+
+def create_comment(session: Session, post_id: int, comment: CommentCreate) -> CommentRead:
+    if not session.get(Post, post_id):
+        raise HTTPException(404, "Post not found")
+    job = finished_job(session, comment.job_id)
+    if job is not None and job.comment_id is not None:
+        return get_comment(session, job.comment_id)
+
+    new_comment = Comment(super_id=post_id, **comment.model_dump(exclude={"job_id"}))
+    session.add(new_comment)
+    if comment.job_id:
+        session.flush()
+        _complete_job(session, comment.job_id, comment.text, comment_id=new_comment.comment_id)
+    bump_version(session)
+    session.commit()
+    session.refresh(new_comment)
+    return CommentRead.from_orm(new_comment)
+
+
+def delete_comment(session: Session, comment_id: int) -> None:
+    comment = session.exec(select(Comment).where(Comment.comment_id == comment_id)).first()
+    if not comment:
+        raise HTTPException(404, "Comment not found")
+    session.delete(comment)
+    bump_version(session)
+    session.commit()
+
+
+def get_comment(session: Session, comment_id: int) -> CommentRead:
+    comment = session.exec(select(Comment).where(Comment.comment_id == comment_id)).first()
+    if not comment:
+        raise HTTPException(404, "Comment not found")
+    return CommentRead.from_orm(comment)
+
+
+# -------------------------------------------------
+# Search
+# -------------------------------------------------
+def search(session: Session, q: str, scope: str, limit: int) -> list[dict]:
+    if scope == "comments":
+        return search_comments(session, q, limit)
+    return search_posts(session, q, limit)
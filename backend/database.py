@@ -1,6 +1,9 @@
 import os
 from pathlib import Path
 
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import StaticPool
 from sqlmodel import Session, SQLModel, create_engine
 
 # 1) Detect if we are running tests
@@ -8,8 +11,11 @@ TESTING = os.environ.get("WALLOH_SOCIAL_TESTING") == "1"
 
 if TESTING:
     DATABASE_URL = os.environ.get("TEST_DB_URL", "sqlite:///:memory:")
+    READ_DATABASE_URL = None
 else:
     DATABASE_URL = os.environ.get("DB_URL", "sqlite:///sqlite/social.db")
+    # Optional read replica (e.g. a PostgreSQL streaming replica) for GET endpoints
+    READ_DATABASE_URL = os.environ.get("DB_READ_URL")
 
 # 2) If using a file-based DB, ensure directory exists (but NOT during tests)
 if not TESTING and DATABASE_URL.startswith("sqlite") and "memory" not in DATABASE_URL:
@@ -17,13 +23,102 @@ if not TESTING and DATABASE_URL.startswith("sqlite") and "memory" not in DATABAS
     db_file = Path(db_path)
     db_file.parent.mkdir(parents=True, exist_ok=True)
 
-engine = create_engine(DATABASE_URL, echo=False)
+# 3) Engine tuning. The backend and the image-resizer write to the same SQLite
+#    file, so WAL mode (readers never block on the writer) and a busy timeout
+#    (writers wait for each other instead of failing with "database is locked")
+#    matter most.
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "30"))
+# SQLAlchemy's cache of compiled SQL, and (psycopg 3) the number of executions
+# after which a statement is prepared server-side
+DB_QUERY_CACHE_SIZE = int(os.environ.get("DB_QUERY_CACHE_SIZE", "1200"))
+DB_PREPARE_THRESHOLD = int(os.environ.get("DB_PREPARE_THRESHOLD", "5"))
+
+SQLITE_PRAGMAS = {
+    "journal_mode": os.environ.get("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "busy_timeout": int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+    "mmap_size": int(os.environ.get("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    # Negative values are KiB: 64 MiB page cache per connection
+    "cache_size": int(os.environ.get("SQLITE_CACHE_SIZE", "-65536")),
+    "temp_store": os.environ.get("SQLITE_TEMP_STORE", "MEMORY"),
+}
+
+
+def is_memory_sqlite(url: str) -> bool:
+    return ":memory:" in url or url.rstrip("/") == "sqlite:"
+
+
+def apply_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+
+def create_db_engine(url: str, echo: bool = False) -> Engine:
+    """
+    Engine factory shared by the backend and the image-resizer.
+
+    - SQLite files: every pooled connection gets SQLITE_PRAGMAS (WAL, ...)
+    - SQLite in-memory: a single shared connection (StaticPool)
+    - PostgreSQL and others: a sized connection pool with pre-ping; psycopg 3
+      connections additionally prepare frequently used statements
+    """
+    if url.startswith("sqlite"):
+        connect_args = {"check_same_thread": False}
+        if is_memory_sqlite(url):
+            return create_engine(url, echo=echo, connect_args=connect_args, poolclass=StaticPool)
+        engine = create_engine(
+            url,
+            echo=echo,
+            connect_args=connect_args,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+        )
+        event.listen(engine, "connect", apply_sqlite_pragmas)
+        return engine
+
+    connect_args = {}
+    if url.startswith("postgresql+psycopg:"):
+        connect_args["prepare_threshold"] = DB_PREPARE_THRESHOLD
+    return create_engine(
+        url,
+        echo=echo,
+        connect_args=connect_args,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_pre_ping=True,
+        pool_recycle=1800,
+        query_cache_size=DB_QUERY_CACHE_SIZE,
+    )
+
+
+engine = create_db_engine(DATABASE_URL)
+# Without a replica, reads simply use the primary
+read_engine = create_db_engine(READ_DATABASE_URL) if READ_DATABASE_URL else engine
 
 
 def init_db():
+    import backend.models  # noqa: F401  (register the tables on SQLModel.metadata)
+    from backend.migrations import run_migrations
+
     SQLModel.metadata.create_all(engine)
+    run_migrations(engine)
 
 
 def get_session():
     with Session(engine) as session:
         yield session
+
+
+def get_read_session():
+    """
+    Session for read-only endpoints. Routed to the replica when DB_READ_URL is
+    set; replicas may lag slightly behind the primary.
+    """
+    with Session(read_engine) as session:
+        yield session
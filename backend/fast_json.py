@@ -0,0 +1,25 @@
+"""
+JSON encoding of the list endpoints' rows.
+
+The rows are plain dicts built straight from query tuples, in the shape of
+the endpoint's response_model, and go out as a ready Response: no Pydantic
+model per row, no second validation against response_model and no stdlib
+json pass. orjson is used when installed (`pip install orjson`, extra
+"fast-json"); pydantic-core's encoder, already a dependency, otherwise.
+Both write datetimes like Pydantic does (ISO 8601, "Z" for UTC).
+"""
+
+from typing import Any
+
+import pydantic_core
+
+try:
+    import orjson  # optional dependency
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+def dumps(rows: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(rows, option=orjson.OPT_UTC_Z)
+    return pydantic_core.to_json(rows)
@@ -0,0 +1,279 @@
+"""
+Read-through cache of serialized feed pages (GET /posts/) and post details
+(GET /posts/{id}).
+
+Entries are the finished JSON bodies, so a hit skips the queries, the blob
+reads and the base64 encoding. Each entry is stored under the version of the
+"posts" counter in the cache_version table. Writes that change what these
+endpoints return (new, uploaded and deleted posts, new and deleted comments,
+renditions committed by the image-resizer) bump that counter in their own
+transaction, so every API process, whoever wrote, stops serving older
+entries at once; a lookup costs one primary-key read of the counter.
+
+Two tiers: an LRU in process memory bounded by FEED_CACHE_MAX_BYTES (0
+disables the cache), and optionally a SQLite file shared by the API
+processes of a host (FEED_CACHE_SHARED_PATH), standing in for a Redis or
+memcached tier.
+
+No web framework imports: the image-resizer bumps the version too.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from datetime import datetime, timezone
+from typing import NamedTuple
+
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, col, select, update
+
+from backend.models import CacheVersion
+
+FEED_CACHE_MAX_BYTES = int(os.environ.get("FEED_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+FEED_CACHE_SHARED_PATH = os.environ.get("FEED_CACHE_SHARED_PATH", "")
+FEED_CACHE_SHARED_MAX_BYTES = int(
+    os.environ.get("FEED_CACHE_SHARED_MAX_BYTES", str(256 * 1024 * 1024))
+)
+
+POSTS = "posts"
+CACHE_HEADER = "X-Cache"
+
+
+# -------------------------------------------------
+# Versions
+# -------------------------------------------------
+def version_state(session: Session, name: str = POSTS) -> tuple[int, datetime | None]:
+    """Version of `name` and the (UTC) time it was last bumped."""
+    query = select(CacheVersion.version, CacheVersion.updated_at).where(CacheVersion.name == name)
+    row = session.exec(query).first()
+    if row is None:
+        return 0, None
+    version, updated_at = row
+    if updated_at is not None and updated_at.tzinfo is None:
+        updated_at = updated_at.replace(tzinfo=timezone.utc)  # SQLite drops the zone
+    return version, updated_at
+
+
+def current_version(session: Session, name: str = POSTS) -> int:
+    return version_state(session, name)[0]
+
+
+def bump_version(session: Session, name: str = POSTS) -> None:
+    """Invalidate the cached reads of `name`; part of the caller's transaction."""
+    now = datetime.now(timezone.utc)
+    increment = (
+        update(CacheVersion)
+        .where(col(CacheVersion.name) == name)
+        .values(version=CacheVersion.version + 1, updated_at=now)
+    )
+    if session.exec(increment).rowcount:
+        return
+    try:
+        with session.begin_nested():
+            session.add(CacheVersion(name=name, version=1, updated_at=now))
+    except IntegrityError:
+        # Created by a concurrent writer in the meantime
+        session.exec(increment)
+
+
+# -------------------------------------------------
+# Entries
+# -------------------------------------------------
+class CachedBody(NamedTuple):
+    body: bytes  # JSON
+    headers: dict[str, str]
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + sum(len(k) + len(v) for k, v in self.headers.items())
+
+
+def cache_key(*parts) -> str:
+    return json.dumps(parts, separators=(",", ":"))
+
+
+class SharedFeedCache:
+    """
+    Second tier in a SQLite file that the API processes of a host share.
+    Entries of older versions go with the first put of a newer one, and
+    beyond `max_bytes` the least recently used go.
+    """
+
+    def __init__(self, path: str, max_bytes: int = FEED_CACHE_SHARED_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA busy_timeout=1000")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS feed_cache (key TEXT PRIMARY KEY, "
+            "version INTEGER NOT NULL, body BLOB NOT NULL, headers TEXT NOT NULL, "
+            "used_at REAL NOT NULL)"
+        )
+
+    def get(self, key: str, version: int) -> CachedBody | None:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT body, headers FROM feed_cache WHERE key = ? AND version = ?",
+                (key, version),
+            ).fetchone()
+            if row is None:
+                return None
+            self._db.execute("UPDATE feed_cache SET used_at = ? WHERE key = ?", (time.time(), key))
+        return CachedBody(row[0], json.loads(row[1]))
+
+    def put(self, key: str, version: int, entry: CachedBody) -> None:
+        with self._lock, self._db:
+            self._db.execute("BEGIN")
+            self._db.execute("DELETE FROM feed_cache WHERE version < ?", (version,))
+            self._db.execute(
+                "INSERT OR REPLACE INTO feed_cache (key, version, body, headers, used_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, version, entry.body, json.dumps(entry.headers), time.time()),
+            )
+            # Everything past the newest `max_bytes`
+            self._db.execute(
+                "DELETE FROM feed_cache WHERE key IN (SELECT key FROM (SELECT key, "
+                "SUM(length(body)) OVER (ORDER BY used_at DESC, key) AS total "
+                "FROM feed_cache) WHERE total > ?)",
+                (self.max_bytes,),
+            )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM feed_cache")
+
+
+class FeedCache:
+    """
+    In-process LRU of serialized responses, at most `max_bytes` of them, in
+    front of an optional shared tier. Entries of an older version are
+    dropped as soon as a newer one is seen.
+    """
+
+    def __init__(
+        self, max_bytes: int = FEED_CACHE_MAX_BYTES, shared: SharedFeedCache | None = None
+    ):
+        self.max_bytes = max_bytes
+        self.shared = shared
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.size = 0
+        self._version: int | None = None
+        self._entries: OrderedDict[str, CachedBody] = OrderedDict()
+        # Sync endpoints run in threadpool workers
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _sync_version(self, version: int) -> None:
+        if version != self._version:
+            self._entries.clear()
+            self.size = 0
+            self._version = version
+
+    def get(self, key: str, version: int) -> CachedBody | None:
+        with self._lock:
+            self._sync_version(version)
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+        entry = self.shared.get(key, version) if self.shared else None
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.shared_hits += 1
+        self._store(key, version, entry)
+        return entry
+
+    def put(self, key: str, version: int, entry: CachedBody) -> None:
+        self._store(key, version, entry)
+        if self.shared:
+            self.shared.put(key, version, entry)
+
+    def _store(self, key: str, version: int, entry: CachedBody) -> None:
+        if entry.size > self.max_bytes:
+            return
+        with self._lock:
+            if self._version is not None and version < self._version:
+                return  # loaded before a write that another request has seen
+            self._sync_version(version)
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= previous.size
+            self._entries[key] = entry
+            self.size += entry.size
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= evicted.size
+
+    def read_through(
+        self,
+        session: Session,
+        key: str,
+        load: Callable[[], CachedBody],
+        version: int | None = None,
+    ) -> tuple[CachedBody, bool]:
+        """
+        The entry of `key` (and whether it was cached), loaded and stored on a
+        miss. `version` saves the lookup when the caller has just read it.
+        """
+        if not self.enabled:
+            return load(), False
+        if version is None:
+            version = current_version(session)
+        entry = self.get(key, version)
+        if entry is not None:
+            return entry, True
+        entry = load()
+        self.put(key, version, entry)
+        return entry, False
+
+    async def read_through_async(
+        self, key: str, load: Callable[[], Awaitable[CachedBody]], version: int
+    ) -> tuple[CachedBody, bool]:
+        """read_through for the async app, whose loaders await their I/O."""
+        if not self.enabled:
+            return await load(), False
+        entry = self.get(key, version)
+        if entry is not None:
+            return entry, True
+        entry = await load()
+        self.put(key, version, entry)
+        return entry, False
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+            self._version = None
+        if self.shared:
+            self.shared.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+        }
+
+
+feed_cache = FeedCache(
+    shared=SharedFeedCache(FEED_CACHE_SHARED_PATH) if FEED_CACHE_SHARED_PATH else None
+)
@@ -0,0 +1,108 @@
+"""
+HTTP caching of the JSON read endpoints.
+
+Validators come from the "posts" version counter (backend/feed_cache.py),
+which every write to posts, comments or renditions bumps: a weak ETag of
+the version and Last-Modified from the time of the bump. A conditional GET
+whose copy is still current is answered 304 after that one primary-key read,
+before the endpoint queries or serializes anything. JSON bodies from
+GZIP_MIN_SIZE bytes on are gzip-compressed for clients that accept it.
+"""
+
+import gzip
+import os
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import NamedTuple
+
+from sqlmodel import Session
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from backend.feed_cache import version_state
+
+# Clients may keep responses but must revalidate them (cheap, see above)
+API_CACHE_CONTROL = os.environ.get("API_CACHE_CONTROL", "no-cache")
+NO_STORE = "no-store"
+GZIP_MIN_SIZE = int(os.environ.get("GZIP_MIN_SIZE", "1024"))
+GZIP_LEVEL = 6
+
+
+class Validators(NamedTuple):
+    version: int
+    etag: str
+    last_modified: datetime | None
+
+    @property
+    def headers(self) -> dict[str, str]:
+        headers = {"ETag": self.etag, "Cache-Control": API_CACHE_CONTROL}
+        if self.last_modified is not None:
+            headers["Last-Modified"] = format_datetime(self.last_modified, usegmt=True)
+        return headers
+
+    def not_modified(self, if_none_match: str | None, if_modified_since: str | None) -> bool:
+        if if_none_match is not None:
+            # Weak comparison; If-None-Match wins over If-Modified-Since
+            tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+            return "*" in tags or self.etag.removeprefix("W/") in tags
+        if if_modified_since is None or self.last_modified is None:
+            return False
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        # HTTP dates have whole seconds
+        return self.last_modified.replace(microsecond=0) <= since
+
+
+def read_validators(session: Session) -> Validators:
+    version, updated_at = version_state(session)
+    # The bump time tells a recreated database (versions from 0 again) apart
+    stamp = int(updated_at.timestamp() * 1000) if updated_at else 0
+    return Validators(version, f'W/"posts-{version}-{stamp}"', updated_at)
+
+
+class JSONGZipMiddleware:
+    """
+    gzip for JSON responses of at least `minimum_size` bytes. Unlike
+    starlette's GZipMiddleware it leaves images (already compressed) and
+    event streams alone.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = GZIP_MIN_SIZE, level: int = GZIP_LEVEL):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.level = level
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        accepts_gzip = "gzip" in Headers(scope=scope).get("accept-encoding", "")
+        start: Message | None = None
+
+        async def send_json(message: Message) -> None:
+            nonlocal start
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                is_json = headers.get("content-type", "").startswith("application/json")
+                if is_json and "content-encoding" not in headers:
+                    MutableHeaders(raw=message["headers"]).add_vary_header("Accept-Encoding")
+                    if accepts_gzip:
+                        start = message  # held back until the body size is known
+                        return
+            elif start is not None and message["type"] == "http.response.body":
+                body = message.get("body", b"")
+                if len(body) >= self.minimum_size and not message.get("more_body", False):
+                    body = gzip.compress(body, self.level)
+                    headers = MutableHeaders(raw=start["headers"])
+                    headers["Content-Encoding"] = "gzip"
+                    headers["Content-Length"] = str(len(body))
+                    message = {**message, "body": body}
+                await send(start)
+                start = None
+            await send(message)
+
+        await self.app(scope, receive, send_json)
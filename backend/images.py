@@ -0,0 +1,286 @@
+import io
+import os
+import warnings
+from dataclasses import dataclass
+from typing import BinaryIO
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+# Magic-number prefixes of the image formats we expect from uploads
+_SIGNATURES = [
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"BM", "image/bmp"),
+]
+
+
+def sniff_content_type(data: bytes) -> str:
+    """
+    Guess the media type of image bytes from their header.
+    Falls back to application/octet-stream for unknown formats.
+    """
+    for signature, content_type in _SIGNATURES:
+        if data.startswith(signature):
+            return content_type
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    if data[4:12] in (b"ftypavif", b"ftypavis"):
+        return "image/avif"
+    return "application/octet-stream"
+
+
+# -------------------------------------------------
+# Upload validation / normalization
+# Every original is checked from its header before anything is decoded, and
+# stored without metadata, upright and at most MAX_IMAGE_DIMENSION px, which
+# bounds the memory and CPU of every later read and resize.
+# -------------------------------------------------
+# Header-declared size above which an upload is rejected as a decompression
+# bomb (a small file that would decode to gigabytes)
+MAX_IMAGE_PIXELS = int(os.environ.get("MAX_IMAGE_PIXELS", str(50_000_000)))
+# Longest side of stored originals; larger uploads are downsized
+MAX_IMAGE_DIMENSION = int(os.environ.get("MAX_IMAGE_DIMENSION", "4096"))
+ORIGINAL_QUALITY = int(os.environ.get("IMAGE_ORIGINAL_QUALITY", "90"))
+UPLOAD_FORMATS = {
+    "PNG": "image/png",
+    "JPEG": "image/jpeg",
+    "GIF": "image/gif",
+    "WEBP": "image/webp",
+}
+
+# Pillow's own guard, for images decoded anywhere else (e.g. legacy originals
+# in the resizer): a warning above the limit, an error at twice of it
+Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+
+
+class InvalidImage(ValueError):
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+@dataclass(frozen=True)
+class NormalizedImage:
+    content_type: str
+    width: int
+    height: int
+    # Re-encoded bytes, or None when the upload can be stored as it is
+    data: bytes | None
+
+
+def _open_checked(source: BinaryIO) -> Image.Image:
+    """Open an image reading only its header, and validate format and size."""
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", Image.DecompressionBombWarning)
+            img = Image.open(source, formats=list(UPLOAD_FORMATS))
+    except (Image.DecompressionBombError, Image.DecompressionBombWarning):
+        raise InvalidImage("Image dimensions too large", 413)
+    except (UnidentifiedImageError, OSError, SyntaxError, ValueError):
+        raise InvalidImage("Unsupported or corrupt image", 415)
+
+    width, height = img.size
+    if width < 1 or height < 1:
+        raise InvalidImage("Invalid image dimensions")
+    if width * height > MAX_IMAGE_PIXELS:
+        raise InvalidImage("Image dimensions too large", 413)
+    return img
+
+
+def normalize_image(source: BinaryIO, max_dimension: int = MAX_IMAGE_DIMENSION) -> NormalizedImage:
+    """
+    Validate an uploaded image and bring it into storage shape: EXIF
+    orientation applied, EXIF and other metadata stripped, longest side at
+    most `max_dimension`. Images that already comply are kept byte for byte
+    (no generation loss); animated images are only validated.
+
+    Raises InvalidImage (with an HTTP status code) for unsupported formats,
+    corrupt data and decompression bombs.
+    """
+    img = _open_checked(source)
+    fmt = img.format
+    content_type = UPLOAD_FORMATS[fmt]
+    oversized = max(img.size) > max_dimension
+
+    try:
+        # Both may read past the header (frame count, trailing EXIF chunks)
+        animated = getattr(img, "n_frames", 1) > 1
+        exif = img.getexif()
+    except Exception:
+        raise InvalidImage("Unsupported or corrupt image", 415)
+
+    if animated:
+        if oversized:
+            raise InvalidImage("Animated image dimensions too large", 413)
+        return NormalizedImage(content_type, img.width, img.height, None)
+
+    if not oversized and not exif and "xmp" not in img.info:
+        try:
+            # Structural check (chunk CRCs, markers) without decoding pixels
+            source.seek(0)
+            Image.open(source, formats=[fmt]).verify()
+        except Exception:
+            raise InvalidImage("Unsupported or corrupt image", 415)
+        return NormalizedImage(content_type, img.width, img.height, None)
+
+    if fmt == "JPEG":
+        # Let libjpeg decode at a reduced scale (1/2 .. 1/8) when downsizing
+        img.draft(img.mode, (max_dimension, max_dimension))
+    try:
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((max_dimension, max_dimension))
+    except Exception:
+        raise InvalidImage("Unsupported or corrupt image", 415)
+
+    buf = io.BytesIO()
+    save_options = {"icc_profile": img.info.get("icc_profile")}
+    if fmt in ("JPEG", "WEBP"):
+        save_options["quality"] = ORIGINAL_QUALITY
+    # Metadata is only written when passed explicitly, so none is carried over
+    img.save(buf, format=fmt, **save_options)
+    return NormalizedImage(content_type, img.width, img.height, buf.getvalue())
+
+
+# -------------------------------------------------
+# Renditions
+# The image-resizer stores every original in several sizes (longest side in
+# px) and formats. Stored as post_image variants named "<size>.<format>",
+# e.g. "400.webp"; the API picks one per request from `size` and Accept.
+# -------------------------------------------------
+RENDITION_SIZES = sorted(
+    int(s) for s in os.environ.get("IMAGE_RENDITION_SIZES", "160,400,1080").split(",")
+)
+# Modern formats first; JPEG must stay as the fallback every client can show.
+# AVIF compresses best but encodes several times slower than WebP.
+RENDITION_FORMATS = [
+    f.strip() for f in os.environ.get("IMAGE_RENDITION_FORMATS", "webp,jpeg").split(",")
+]
+RENDITION_QUALITY = int(os.environ.get("IMAGE_RENDITION_QUALITY", "80"))
+# Size served by /posts/{id}/image/thumb when the client does not ask for one
+DEFAULT_THUMB_SIZE = int(os.environ.get("IMAGE_DEFAULT_THUMB_SIZE", "400"))
+FALLBACK_FORMAT = "jpeg"
+
+FORMAT_CONTENT_TYPES = {"avif": "image/avif", "webp": "image/webp", "jpeg": "image/jpeg"}
+# Server-side preference when the client accepts several formats
+_FORMAT_PREFERENCE = ["avif", "webp", "jpeg"]
+
+
+@dataclass(frozen=True)
+class Rendition:
+    size: int
+    format: str
+    width: int
+    height: int
+    data: bytes
+
+    @property
+    def variant(self) -> str:
+        return rendition_variant(self.size, self.format)
+
+    @property
+    def content_type(self) -> str:
+        return FORMAT_CONTENT_TYPES[self.format]
+
+
+def rendition_variant(size: int, fmt: str) -> str:
+    return f"{size}.{fmt}"
+
+
+def parse_rendition_variant(variant: str) -> tuple[int, str] | None:
+    """(size, format) of a rendition variant, None for "full" and legacy rows."""
+    size, _, fmt = variant.partition(".")
+    if not size.isdigit() or fmt not in FORMAT_CONTENT_TYPES:
+        return None
+    return int(size), fmt
+
+
+def _encodable(img: Image.Image, fmt: str) -> Image.Image:
+    has_alpha = img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info)
+    if fmt == "jpeg" and has_alpha:
+        # JPEG has no alpha channel: flatten onto white
+        img = img.convert("RGBA")
+        background = Image.new("RGB", img.size, (255, 255, 255))
+        background.paste(img, mask=img.getchannel("A"))
+        return background
+    if img.mode in ("RGB", "RGBA"):
+        return img
+    return img.convert("RGBA" if has_alpha else "RGB")
+
+
+def make_renditions(
+    data: bytes,
+    sizes: list[int] = RENDITION_SIZES,
+    formats: list[str] = RENDITION_FORMATS,
+    quality: int = RENDITION_QUALITY,
+) -> list[Rendition]:
+    """
+    Downscale image bytes to every size in `sizes` and encode each in every
+    format. Never upscales: sizes that would come out no smaller than the
+    previous one are skipped. Pure and picklable, so the image-resizer can
+    run it in a process pool.
+    """
+    original = Image.open(io.BytesIO(data))
+    original.load()
+
+    renditions = []
+    previous_dimensions = None
+    for size in sorted(sizes):
+        img = original.copy()
+        img.thumbnail((size, size))
+        if img.size == previous_dimensions:
+            continue
+        previous_dimensions = img.size
+
+        for fmt in formats:
+            buf = io.BytesIO()
+            _encodable(img, fmt).save(buf, format=fmt.upper(), quality=quality)
+            renditions.append(Rendition(size, fmt, img.width, img.height, buf.getvalue()))
+    return renditions
+
+
+def _accept_media_types(accept: str) -> set[str]:
+    media_types = set()
+    for part in accept.lower().split(","):
+        media_type, *params = (p.strip() for p in part.split(";"))
+        if "q=0" in params or "q=0.0" in params:
+            continue
+        media_types.add(media_type)
+    return media_types
+
+
+def accepted_formats(accept: str | None) -> list[str]:
+    """
+    Rendition formats the client explicitly accepts, in server preference
+    order. Wildcards do not count, as browsers send */* even when they cannot
+    decode AVIF; JPEG is always acceptable.
+    """
+    media_types = _accept_media_types(accept or "")
+    formats = [f for f in _FORMAT_PREFERENCE if FORMAT_CONTENT_TYPES[f] in media_types]
+    if FALLBACK_FORMAT not in formats:
+        formats.append(FALLBACK_FORMAT)
+    return formats
+
+
+def choose_rendition(available: list[str], size: int, accept: str | None) -> str | None:
+    """
+    Variant name of the best stored rendition: the smallest size that is at
+    least `size` (else the largest there is), in the most preferred format
+    the client accepts.
+    """
+    by_size: dict[int, set[str]] = {}
+    for variant in available:
+        parsed = parse_rendition_variant(variant)
+        if parsed:
+            by_size.setdefault(parsed[0], set()).add(parsed[1])
+    if not by_size:
+        return None
+
+    candidates = sorted(by_size)
+    chosen = next((s for s in candidates if s >= size), candidates[-1])
+    for fmt in accepted_formats(accept):
+        if fmt in by_size[chosen]:
+            return rendition_variant(chosen, fmt)
+    # Only formats the client did not ask for: fall back to any of them
+    return rendition_variant(chosen, sorted(by_size[chosen])[0])
@@ -0,0 +1,84 @@
+"""
+Server-Sent Events stream of an AI generation job (GET /jobs/{id}/stream).
+
+The job row is polled by primary key (cheap, and works with any number of
+API processes, the worker reports through the database). Events:
+
+- `status`  {"status": "queued" | "running"} on every change
+- `token`   {"delta": "..."} text generated since the previous event
+- `text`    {"text": "..."} the whole text, when it started over (retry)
+- `done`    {"post_id": ..., "comment_id": ...} final, then the stream ends
+- `failed`  {"error": "..."} final, then the stream ends
+
+plus a comment line every JOB_STREAM_KEEPALIVE seconds to keep proxies from
+closing an idle connection.
+"""
+
+import asyncio
+import json
+import os
+import time
+from collections.abc import AsyncIterator, Awaitable, Callable
+
+from fastapi.responses import StreamingResponse
+
+from backend.schemas import JobRead
+
+JOB_STREAM_POLL_INTERVAL = float(os.environ.get("JOB_STREAM_POLL_INTERVAL", "0.25"))
+JOB_STREAM_KEEPALIVE = 15.0
+# A stream is closed after this long; EventSource clients reconnect on their own
+JOB_STREAM_MAX_SECONDS = float(os.environ.get("JOB_STREAM_MAX_SECONDS", "300"))
+
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def job_events(
+    load_job: Callable[[], Awaitable[JobRead | None]],
+    poll_interval: float = JOB_STREAM_POLL_INTERVAL,
+    max_seconds: float = JOB_STREAM_MAX_SECONDS,
+) -> AsyncIterator[str]:
+    """Events for the job `load_job` returns, until it is finished or gone."""
+    started = last_event = time.monotonic()
+    status, text = None, ""
+    while True:
+        job = await load_job()
+        events = []
+        if job is None:
+            yield sse_event("failed", {"error": "Job not found"})
+            return
+        if job.status != status and job.status in ("queued", "running"):
+            events.append(sse_event("status", {"status": job.status}))
+        status = job.status
+        if job.text != text:
+            if job.text.startswith(text):
+                delta = job.text.removeprefix(text)
+                events.append(sse_event("token", {"delta": delta}))
+            else:
+                events.append(sse_event("text", {"text": job.text}))
+            text = job.text
+        if job.status == "done":
+            events.append(sse_event("done", {"post_id": job.post_id, "comment_id": job.comment_id}))
+        elif job.status == "failed":
+            events.append(sse_event("failed", {"error": job.error}))
+
+        now = time.monotonic()
+        if events:
+            last_event = now
+            yield "".join(events)
+        elif now - last_event >= JOB_STREAM_KEEPALIVE:
+            last_event = now
+            yield ": keepalive\n\n"
+        if job.status in ("done", "failed") or now - started >= max_seconds:
+            return
+        await asyncio.sleep(poll_interval)
+
+
+def job_stream_response(load_job: Callable[[], Awaitable[JobRead | None]]) -> StreamingResponse:
+    return StreamingResponse(
+        job_events(load_job),
+        media_type="text/event-stream",
+        # No caching, and no buffering in nginx, or the tokens arrive in one go
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,88 +1,72 @@
-import base64
-import json
 import os
-import re
 from contextlib import asynccontextmanager
-
-import pika
-from fastapi import Depends, FastAPI, HTTPException, Query
+from typing import Literal
+
+from fastapi import (
+    Depends,
+    FastAPI,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    status,
+)
 from fastapi.middleware.cors import CORSMiddleware
-from sqlmodel import Session, select
-
-from backend.database import get_session, init_db
-from backend.models import Comment, Post
+from fastapi.responses import FileResponse
+from sqlmodel import Session
+from starlette.concurrency import run_in_threadpool
+
+from backend import crud, fast_json
+from backend.blobstore import BLOB_ACCEL_REDIRECT_PREFIX, blob_store
+from backend.database import engine, get_read_session, get_session, init_db
+from backend.feed_cache import CACHE_HEADER, CachedBody, feed_cache
+from backend.http_cache import NO_STORE, JSONGZipMiddleware, Validators, read_validators
+from backend.jobs import job_stream_response
+from backend.messaging import publisher
+from backend.models import PostImage
+from backend.outbox import OutboxDispatcher
+from backend.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, NEXT_CURSOR_HEADER
 from backend.schemas import (
     CommentCreate,
     CommentRead,
     GeneratedCommentCreate,
     GeneratedPostCreate,
+    JobRead,
+    JobUpdate,
     PostCreate,
     PostRead,
+    PostSummary,
+    SearchHit,
 )
+from backend.uploads import read_multipart_upload
 
-TESTING = os.environ.get("WALLOH_SOCIAL_TESTING") == "1"
-
-RABBIT_HOST = os.environ.get("RABBIT_HOST", "localhost")
 BACKEND_URL = os.environ.get("BACKEND_URL", "http://localhost:8000")
 
 
 # -------------------------------------------------
-# RabbitMQ helper
+# RabbitMQ jobs go through the transactional outbox: handlers only write an
+# outbox row, the dispatcher publishes it with the pooled publisher.
 # -------------------------------------------------
-def publish_resize_job(post_id: int) -> None:
-    connection = pika.BlockingConnection(pika.ConnectionParameters(host=RABBIT_HOST))
-    channel = connection.channel()
-    channel.queue_declare(queue="image.resize", durable=True)
-
-    channel.basic_publish(
-        exchange="",
-        routing_key="image.resize",
-        body=json.dumps({"post_id": post_id}),
-    )
-
-    connection.close()
-
-
-# Neues: Publisher für AI-Generierung von Posts
-def publish_post_generate_job(payload: dict) -> None:
-    connection = pika.BlockingConnection(pika.ConnectionParameters(host=RABBIT_HOST))
-    channel = connection.channel()
-    channel.queue_declare(queue="posts.generate", durable=True)
-
-    channel.basic_publish(
-        exchange="",
-        routing_key="posts.generate",
-        body=json.dumps(payload),
-    )
-    connection.close()
-
-
-def publish_comment_generate_job(payload: dict) -> None:
-    connection = pika.BlockingConnection(pika.ConnectionParameters(host=RABBIT_HOST))
-    channel = connection.channel()
-    channel.queue_declare(queue="comments.generate", durable=True)
-
-    channel.basic_publish(
-        exchange="",
-        routing_key="comments.generate",
-        body=json.dumps(payload),
-    )
-    connection.close()
+dispatcher = OutboxDispatcher(lambda: Session(engine), publisher)
 
 
 # -------------------------------------------------
 # FastAPI setup
+# (the endpoint logic lives in backend/crud.py and is shared with the async
+# variant of this app in backend/async_app.py)
 # -------------------------------------------------
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     init_db()
+    publisher.start()
+    dispatcher.start()
     yield
+    await dispatcher.stop()
+    publisher.stop()
 
 
-app = FastAPI(title="Simple Social API", lifespan=lifespan)
-
-app.add_middleware(
-    CORSMiddleware,
+CORS_OPTIONS = dict(
     allow_origins=[
         "http://localhost:4200",
         "http://127.0.0.1:4200",
@@ -90,114 +74,213 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, CACHE_HEADER],
 )
 
+app = FastAPI(title="Simple Social API", lifespan=lifespan)
+
+app.add_middleware(CORSMiddleware, **CORS_OPTIONS)
+app.add_middleware(JSONGZipMiddleware)
+
+
+# -------------------------------------------------
+# Conditional GET of the read endpoints (see backend/http_cache.py)
+# -------------------------------------------------
+def answer_conditional_get(
+    validators: Validators,
+    response: Response,
+    if_none_match: str | None,
+    if_modified_since: str | None,
+) -> Validators:
+    if validators.not_modified(if_none_match, if_modified_since):
+        raise HTTPException(status.HTTP_304_NOT_MODIFIED, headers=validators.headers)
+    response.headers.update(validators.headers)
+    return validators
+
+
+def conditional_get(
+    response: Response,
+    if_none_match: str | None = Header(None),
+    if_modified_since: str | None = Header(None),
+    session: Session = Depends(get_read_session),
+) -> Validators:
+    """
+    Validators of the request's read; an unchanged copy is answered 304
+    right here, before the endpoint runs its query.
+    """
+    validators = read_validators(session)
+    return answer_conditional_get(validators, response, if_none_match, if_modified_since)
+
 
 # -------------------------------------------------
 # Create Post (publish resize job)
 # -------------------------------------------------
 @app.post("/posts/", response_model=PostRead)
 def create_post(post: PostCreate, session: Session = Depends(get_session)):
-    raw = post.image
-    if raw is None or raw.strip() == "":
-        image_bytes = None
-    elif raw.startswith("/assets/"):
-        image_bytes = None
-    else:
-        raw = raw.strip()
-        if raw.startswith("data:"):
-            match = re.match(r"data:.*?;base64,(.*)", raw, re.DOTALL)
-            if not match:
-                raise HTTPException(400, "Invalid data URL format")
-            raw = match.group(1)
-        raw = raw.replace("\n", "").replace("\r", "").replace(" ", "")
-        try:
-            image_bytes = base64.b64decode(raw, validate=False)
-        except Exception:
-            raise HTTPException(400, "Invalid base64 image string")
-
-    new_post = Post(
-        image_full=image_bytes,
-        image_thumb=None,
-        text=post.text,
-        user=post.user,
-    )
-
-    session.add(new_post)
-    session.commit()
-    session.refresh(new_post)
-
-    if not TESTING and new_post.image_full is not None and new_post.id is not None:
-        publish_resize_job(new_post.id)
-
-    return PostRead.from_orm_bytes(new_post)
-
-
-@app.post("/posts/generate")
-def create_post_with_ai(post: GeneratedPostCreate):
-
-    # enqueue job and return accepted
-    job = {"user": post.user, "prompt": post.prompt, "persona": post.persona, "image": post.image}
-    publish_post_generate_job(job)
-    from fastapi import Response, status
-
-    return Response(status_code=status.HTTP_202_ACCEPTED)
-
-
-@app.post("/posts/{post_id}/comments/generate")
+    created = crud.create_post(session, post)
+    if created.image_full:
+        dispatcher.notify()
+    return created
+
+
+# -------------------------------------------------
+# Create Post from a multipart/form-data upload (fields: text, user, image).
+# The body is parsed as it streams in; the image is stored as raw bytes.
+# -------------------------------------------------
+@app.post("/posts/upload", response_model=PostSummary)
+async def upload_post(request: Request, session: Session = Depends(get_session)):
+    upload = await read_multipart_upload(request)
+    created = await run_in_threadpool(crud.upload_post, session, upload)
+    if created.image_full_url:
+        dispatcher.notify()
+    return created
+
+
+# -------------------------------------------------
+# AI generation: the job is queued and answered with 202 and the job, whose
+# progress is at GET /jobs/{id} and streamed at GET /jobs/{id}/stream
+# -------------------------------------------------
+def accepted_job(response: Response, job: JobRead) -> JobRead:
+    response.headers["Location"] = f"/jobs/{job.id}"
+    return job
+
+
+@app.post("/posts/generate", response_model=JobRead, status_code=status.HTTP_202_ACCEPTED)
+def create_post_with_ai(
+    post: GeneratedPostCreate, response: Response, session: Session = Depends(get_session)
+):
+    job = crud.enqueue_post_generation(session, post)
+    dispatcher.notify()
+    return accepted_job(response, job)
+
+
+@app.post(
+    "/posts/{post_id}/comments/generate",
+    response_model=JobRead,
+    status_code=status.HTTP_202_ACCEPTED,
+)
 def create_comment_with_ai(
-    post_id: int, comment: GeneratedCommentCreate, session: Session = Depends(get_session)
+    post_id: int,
+    comment: GeneratedCommentCreate,
+    response: Response,
+    session: Session = Depends(get_session),
 ):
+    job = crud.enqueue_comment_generation(session, post_id, comment)
+    dispatcher.notify()
+    return accepted_job(response, job)
 
-    post = session.exec(select(Post).where(Post.id == post_id)).first()
-    if not post:
-        raise HTTPException(404, "Post not found")
 
-    job_payload = {
-        "post_id": post.id,
-        "post_text": post.text,
-        "user": comment.user,
-        "persona": comment.persona,
-    }
-    publish_comment_generate_job(job_payload)
-    from fastapi import Response, status
+@app.get("/jobs/{job_id}", response_model=JobRead)
+def get_job(job_id: str, response: Response, session: Session = Depends(get_session)):
+    response.headers["Cache-Control"] = NO_STORE
+    return crud.get_job(session, job_id)
 
-    return Response(status_code=status.HTTP_202_ACCEPTED)
+
+# Progress reports of the AI worker (status "running", text so far, "failed")
+@app.patch("/jobs/{job_id}", response_model=JobRead)
+def update_job(job_id: str, update: JobUpdate, session: Session = Depends(get_session)):
+    return crud.update_job(session, job_id, update)
+
+
+@app.get("/jobs/{job_id}/stream")
+async def stream_job(job_id: str, session: Session = Depends(get_session)):
+    await run_in_threadpool(crud.get_job, session, job_id)
+    return job_stream_response(lambda: run_in_threadpool(crud.poll_job, session, job_id))
+
+
+def cached_response(entry: CachedBody, hit: bool, validators: Validators) -> Response:
+    """A body of the feed cache (already serialized JSON) as the response."""
+    headers = {**entry.headers, **validators.headers, CACHE_HEADER: "HIT" if hit else "MISS"}
+    return Response(entry.body, media_type="application/json", headers=headers)
+
+
+def rows_response(
+    rows: list[dict] | dict[str, list[dict]],
+    validators: Validators,
+    next_cursor: str | None = None,
+) -> Response:
+    """Rows built for the response_model, serialized without validating them again."""
+    headers = validators.headers
+    if next_cursor:
+        headers[NEXT_CURSOR_HEADER] = next_cursor
+    return Response(fast_json.dumps(rows), media_type="application/json", headers=headers)
 
 
 # -------------------------------------------------
 # Get all posts (list view → thumbnails later)
+# Keyset-paginated, newest first; the cursor of the next page is sent in the
+# X-Next-Cursor response header. Pages come from the feed cache while no post
+# changed (X-Cache: HIT / MISS). `include` adds comment counts and previews,
+# one query each for the whole page.
 # -------------------------------------------------
-@app.get("/posts/", response_model=list[PostRead])
+INCLUDE_DESCRIPTION = "Comma-separated extras: comment_count, latest_comments"
+
+
+@app.get("/posts/", response_model=list[PostSummary])
 def get_all_posts(
     text: str | None = Query(None, description="Search term for text"),
     user: str | None = Query(None, description="Filter by author username"),
-    session: Session = Depends(get_session),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Page size"),
+    cursor: str | None = Query(None, description="Cursor returned by the previous page"),
+    include: str | None = Query(None, description=INCLUDE_DESCRIPTION),
+    validators: Validators = Depends(conditional_get),
+    session: Session = Depends(get_read_session),
 ):
-    query = select(Post)
-    if text:
-        # The comment in the next row is necessary to silence Pylance
-        query = query.where(Post.text.ilike(f"%{text}%"))  # type: ignore[attr-defined]
-    if user:
-        query = query.where(Post.user == user)
-    # The comment in the next row is necessary to silence Pylance
-    query = query.order_by(Post.created_at.desc())  # type: ignore[attr-defined]
-
-    posts = session.exec(query).all()
-    if not posts:
-        raise HTTPException(404, "No posts found")
-    return [PostRead.from_orm_bytes(post) for post in posts]
+    includes = crud.parse_include(include)
+    page = crud.cached_feed_page(session, text, user, limit, cursor, validators.version, includes)
+    return cached_response(*page, validators)
 
 
 # -------------------------------------------------
 # Get single post (detail view → full image later)
 # -------------------------------------------------
 @app.get("/posts/{post_id}", response_model=PostRead)
-def get_post_by_id(post_id: int, session: Session = Depends(get_session)):
-    post = session.exec(select(Post).where(Post.id == post_id)).first()
-    if not post:
-        raise HTTPException(404, "Post not found")
-    return PostRead.from_orm_bytes(post)
+def get_post_by_id(
+    post_id: int,
+    validators: Validators = Depends(conditional_get),
+    session: Session = Depends(get_read_session),
+):
+    return cached_response(*crud.cached_post(session, post_id, validators.version), validators)
+
+
+# -------------------------------------------------
+# Raw image bytes (cacheable by browsers and nginx)
+# -------------------------------------------------
+IMAGE_CACHE_CONTROL = "public, max-age=86400"
+
+
+def image_response(image: PostImage, if_none_match: str | None):
+    # Blobs are content-addressed, so the hash is a strong validator. The
+    # rendition depends on Accept, so shared caches must key on it too.
+    etag = f'"{image.blob_hash}"'
+    headers = {"ETag": etag, "Cache-Control": IMAGE_CACHE_CONTROL, "Vary": "Accept"}
+    if if_none_match == etag:
+        return Response(status_code=304, headers=headers)
+
+    media_type = image.content_type or "application/octet-stream"
+    path = blob_store.local_path(image.blob_hash)
+    if path is not None and BLOB_ACCEL_REDIRECT_PREFIX:
+        # nginx serves the file itself (internal location over BLOB_ROOT)
+        relative = blob_store.relative_path(image.blob_hash)
+        headers["X-Accel-Redirect"] = f"{BLOB_ACCEL_REDIRECT_PREFIX}/{relative}"
+        return Response(media_type=media_type, headers=headers)
+    if path is not None:
+        # Streamed from disk (sendfile / pathsend where the server offers it)
+        return FileResponse(path, media_type=media_type, headers=headers)
+    return Response(content=blob_store.get(image.blob_hash), media_type=media_type, headers=headers)
+
+
+@app.get("/posts/{post_id}/image/{variant}")
+def get_post_image(
+    post_id: int,
+    variant: Literal["full", "thumb"],
+    size: int | None = Query(None, ge=1, description="Longest side in px (closest rendition)"),
+    accept: str | None = Header(None),
+    if_none_match: str | None = Header(None),
+    session: Session = Depends(get_read_session),
+):
+    image = crud.get_post_image(session, post_id, variant, size, accept)
+    return image_response(image, if_none_match)
 
 
 # -----------------------------------------------------------
@@ -205,61 +288,74 @@ def get_post_by_id(post_id: int, session: Session = Depends(get_session)):
 # -----------------------------------------------------------
 @app.delete("/posts/{post_id}", status_code=204)
 def delete_post(post_id: int, session: Session = Depends(get_session)):
-    post = session.exec(select(Post).where(Post.id == post_id)).first()
-    if not post:
-        raise HTTPException(404, "Post not found")
-
-    comments = session.exec(select(Comment).where(Comment.super_id == post_id)).all()
-    for c in comments:
-        session.delete(c)
-
-    session.delete(post)
-    session.commit()
+    crud.delete_post(session, post_id)
     return None
 
 
 # -----------------------------------------------------------
 # Get comments for a post
+# Keyset-paginated, oldest first, like the feed (cursor in X-Next-Cursor)
 # -----------------------------------------------------------
 @app.get("/posts/{post_id}/comments", response_model=list[CommentRead])
 def get_comments_for_post(
     post_id: int,
     text: str | None = Query(None, description="Search term in comment text"),
     user: str | None = Query(None, description="Filter by comment user"),
-    session: Session = Depends(get_session),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Page size"),
+    cursor: str | None = Query(None, description="Cursor returned by the previous page"),
+    session: Session = Depends(get_read_session),
+    validators: Validators = Depends(conditional_get),
 ):
-    query = select(Comment).where(Comment.super_id == post_id)
-    if text:
-        query = query.where(Comment.text.ilike(f"%{text}%"))  # type: ignore[attr-defined]
-    if user:
-        query = query.where(Comment.user == user)
-
-    comments = session.exec(query).all()
-    return [CommentRead.from_orm(c) for c in comments]
+    rows, next_cursor = crud.list_comments(session, post_id, text, user, limit, cursor)
+    return rows_response(rows, validators, next_cursor)
 
 
 @app.post("/posts/{post_id}/comments", response_model=CommentRead)
 def create_comment(post_id: int, comment: CommentCreate, session: Session = Depends(get_session)):
-    new_comment = Comment(super_id=post_id, **comment.model_dump())
-    session.add(new_comment)
-    session.commit()
-    session.refresh(new_comment)
-    return CommentRead.from_orm(new_comment)
+    return crud.create_comment(session, post_id, comment)
 
 
 @app.delete("/comments/{comment_id}", status_code=204)
 def delete_comment(comment_id: int, session: Session = Depends(get_session)):
-    comment = session.exec(select(Comment).where(Comment.comment_id == comment_id)).first()
-    if not comment:
-        raise HTTPException(404, "Comment not found")
-    session.delete(comment)
-    session.commit()
+    crud.delete_comment(session, comment_id)
     return None
 
 
-@app.get("/comments/{comment_id}", response_model=CommentRead)
-def get_comment_by_id(comment_id: int, session: Session = Depends(get_session)):
-    comment = session.exec(select(Comment).where(Comment.comment_id == comment_id)).first()
-    if not comment:
-        raise HTTPException(404, "Comment not found")
-    return CommentRead.from_orm(comment)
+@app.get(
+    "/comments/{comment_id}", response_model=CommentRead, dependencies=[Depends(conditional_get)]
+)
+def get_comment_by_id(comment_id: int, session: Session = Depends(get_read_session)):
+    return crud.get_comment(session, comment_id)
+
+
+# The comments of many posts in one request (instead of one per post)
+@app.get("/comments/", response_model=dict[int, list[CommentRead]])
+def get_comments_for_posts(
+    post_id: list[int] = Query(..., max_length=MAX_PAGE_SIZE, description="Repeat per post"),
+    latest: int | None = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Newest N per post"),
+    session: Session = Depends(get_read_session),
+    validators: Validators = Depends(conditional_get),
+):
+    return rows_response(crud.comments_for_posts(session, post_id, latest), validators)
+
+
+# -------------------------------------------------
+# Hit / miss counters of the feed cache
+# -------------------------------------------------
+@app.get("/cache/stats")
+def get_cache_stats(response: Response):
+    response.headers["Cache-Control"] = NO_STORE
+    return feed_cache.stats()
+
+
+# -----------------------------------------------------------
+# Full-text search (SQLite FTS5, BM25-ranked, prefix matching)
+# -----------------------------------------------------------
+@app.get("/search", response_model=list[SearchHit], dependencies=[Depends(conditional_get)])
+def search(
+    q: str = Query(..., min_length=1, description="Search terms (prefix matched)"),
+    scope: Literal["posts", "comments"] = Query("posts", description="What to search"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Max hits"),
+    session: Session = Depends(get_read_session),
+):
+    return crud.search(session, q, scope, limit)
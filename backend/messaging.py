@@ -0,0 +1,170 @@
+import json
+import os
+import queue
+import threading
+
+import pika
+from pika.exceptions import AMQPError
+
+RABBIT_HOST = os.environ.get("RABBIT_HOST", "localhost")
+PUBLISHER_POOL_SIZE = int(os.environ.get("RABBIT_PUBLISHER_POOL_SIZE", "4"))
+# Publisher confirms: publish() returns once the broker has taken the
+# (persistent) message. RABBIT_PUBLISHER_CONFIRMS=0 saves that round trip per
+# message, but a message the broker had not stored yet is lost if it restarts
+# or the connection drops.
+PUBLISHER_CONFIRMS = os.environ.get("RABBIT_PUBLISHER_CONFIRMS", "1") == "1"
+# Written to disk by the broker, so queued jobs survive a broker restart
+PERSISTENT = pika.BasicProperties(delivery_mode=pika.DeliveryMode.Persistent)
+
+# Queues the backend publishes to, declared once per broker connection
+QUEUES = ("image.resize", "posts.generate", "comments.generate")
+# Messages a consumer rejects (after its retries) are dead-lettered to the
+# parked queue instead of dropped; `python -m backend.replay_parked` puts them
+# back. The job queues get their dead-letter exchange from a broker policy
+# (rabbitmq/set_policies.sh), not from queue arguments: queues that already
+# exist cannot be re-declared with other arguments. post_ai_generation keeps
+# its own copy of these names.
+DEAD_LETTER_EXCHANGE = "jobs.dead-letter"
+PARKED_QUEUE = "jobs.parked"
+
+
+def default_connection_factory():
+    return pika.BlockingConnection(pika.ConnectionParameters(host=RABBIT_HOST))
+
+
+def declare_queues(channel, queues: tuple[str, ...] = QUEUES) -> None:
+    """Declare the job queues together with their dead-letter exchange and parked queue."""
+    channel.exchange_declare(exchange=DEAD_LETTER_EXCHANGE, exchange_type="fanout", durable=True)
+    channel.queue_declare(queue=PARKED_QUEUE, durable=True)
+    channel.queue_bind(queue=PARKED_QUEUE, exchange=DEAD_LETTER_EXCHANGE)
+    for name in queues:
+        channel.queue_declare(queue=name, durable=True)
+
+
+class RabbitPublisher:
+    """
+    Long-lived publisher with a small pool of broker channels.
+
+    pika's BlockingConnection is not thread-safe, so every pooled channel has
+    its own connection and is leased to one request thread at a time. Queues
+    are declared when a channel is opened, and a channel that fails is thrown
+    away and the publish is retried once on a fresh connection.
+    """
+
+    def __init__(
+        self,
+        connection_factory=default_connection_factory,
+        pool_size: int = PUBLISHER_POOL_SIZE,
+        confirm_delivery: bool = PUBLISHER_CONFIRMS,
+        queues: tuple[str, ...] = QUEUES,
+        acquire_timeout: float = 10.0,
+    ):
+        self._connection_factory = connection_factory
+        self._pool_size = pool_size
+        self.confirm_delivery = confirm_delivery
+        self._queues = queues
+        self._acquire_timeout = acquire_timeout
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+        self._open = 0
+        self._lock = threading.Lock()
+
+    # -------------------------------------------------
+    # Lifecycle
+    # -------------------------------------------------
+    def start(self) -> None:
+        """
+        Open the first channel eagerly. A broker that is not up yet is not
+        fatal: channels are (re)opened on demand when publishing.
+        """
+        try:
+            self._release(self._open_channel())
+        except AMQPError as e:
+            print(f"[backend] RabbitMQ not reachable yet: {e}", flush=True)
+
+    def stop(self) -> None:
+        while True:
+            try:
+                connection, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._close(connection)
+
+    # -------------------------------------------------
+    # Publishing
+    # -------------------------------------------------
+    def publish(self, routing_key: str, payload: dict) -> None:
+        body = json.dumps(payload)
+        for attempt in range(2):
+            lease = self._acquire()
+            try:
+                lease[1].basic_publish(
+                    exchange="",
+                    routing_key=routing_key,
+                    body=body,
+                    properties=PERSISTENT,
+                    mandatory=True,
+                )
+            except AMQPError:
+                self._discard(lease)
+                if attempt == 1:
+                    raise
+            else:
+                self._release(lease)
+                return
+
+    # -------------------------------------------------
+    # Channel pool
+    # -------------------------------------------------
+    def _open_channel(self):
+        with self._lock:
+            self._open += 1
+        try:
+            connection = self._connection_factory()
+            channel = connection.channel()
+            if self.confirm_delivery:
+                channel.confirm_delivery()
+            declare_queues(channel, self._queues)
+        except Exception:
+            with self._lock:
+                self._open -= 1
+            raise
+        return connection, channel
+
+    def _acquire(self):
+        try:
+            lease = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_open = self._open < self._pool_size
+            if can_open:
+                return self._open_channel()
+            try:
+                lease = self._idle.get(timeout=self._acquire_timeout)
+            except queue.Empty:
+                raise AMQPError("no publisher channel available")
+
+        # Service heartbeats of the idle connection; a dead one is replaced
+        try:
+            lease[0].process_data_events(time_limit=0)
+        except AMQPError:
+            self._discard(lease)
+            return self._open_channel()
+        return lease
+
+    def _release(self, lease) -> None:
+        self._idle.put(lease)
+
+    def _discard(self, lease) -> None:
+        with self._lock:
+            self._open -= 1
+        self._close(lease[0])
+
+    @staticmethod
+    def _close(connection) -> None:
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+
+publisher = RabbitPublisher()
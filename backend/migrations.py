@@ -0,0 +1,252 @@
+"""
+Versioned schema migrations.
+
+`SQLModel.metadata.create_all` only creates missing tables, so every change to
+an existing table (new index, moved column, ...) is a numbered migration here.
+Applied versions are recorded in `schema_migrations`; pending ones run in order
+on startup, each in its own transaction. Migrations are written to be
+repeatable (IF NOT EXISTS, column checks), so they are also safe on databases
+that create_all has just built with the current schema.
+
+Usage:
+    python -m backend.migrations            # apply pending migrations
+    python -m backend.migrations --status   # list applied / pending versions
+"""
+
+import sys
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Callable
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+
+# Image rows read at a time when moving bytes, so memory stays bounded
+MIGRATION_BATCH_SIZE = 100
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    description: str
+    apply: Callable[[Connection], None]
+
+
+# -------------------------------------------------
+# Migration steps
+# -------------------------------------------------
+def _columns(conn: Connection, table: str) -> set[str]:
+    return {c["name"] for c in inspect(conn).get_columns(table)}
+
+
+def _insert_blob_image(conn: Connection, post_id: int, variant: str, data: bytes) -> None:
+    from backend.blobstore import blob_store
+    from backend.images import sniff_content_type
+
+    conn.execute(
+        text(
+            "INSERT INTO post_image (post_id, variant, blob_hash, size, content_type) "
+            "VALUES (:post_id, :variant, :blob_hash, :size, :content_type)"
+        ),
+        {
+            "post_id": post_id,
+            "variant": variant,
+            "blob_hash": blob_store.put(data),
+            "size": len(data),
+            "content_type": sniff_content_type(data),
+        },
+    )
+
+
+def _move_legacy_post_images(conn: Connection) -> None:
+    # Databases created before the post_image table kept the image BLOBs in
+    # post.image_full / post.image_thumb. Copy them over and drop the columns.
+    columns = _columns(conn, "post")
+    # post_image as create_all builds it today keeps its bytes in the blob
+    # store; before migration 5 it had a BLOB column instead
+    blob_column = "data" in _columns(conn, "post_image")
+    for variant in ("full", "thumb"):
+        column = f"image_{variant}"
+        if column not in columns:
+            continue
+        if blob_column:
+            conn.execute(
+                text(
+                    f"INSERT INTO post_image (post_id, variant, data) "
+                    f"SELECT id, '{variant}', {column} FROM post WHERE {column} IS NOT NULL"
+                )
+            )
+        else:
+            query = text(
+                f"SELECT id, {column} FROM post WHERE {column} IS NOT NULL AND id > :after "
+                "ORDER BY id LIMIT :limit"
+            )
+            after = 0
+            while rows := conn.execute(
+                query, {"after": after, "limit": MIGRATION_BATCH_SIZE}
+            ).all():
+                for post_id, data in rows:
+                    _insert_blob_image(conn, post_id, variant, data)
+                after = rows[-1][0]
+        conn.execute(text(f"ALTER TABLE post DROP COLUMN {column}"))
+
+
+def _install_search_index(conn: Connection) -> None:
+    from backend.search import install_search_index
+
+    install_search_index(conn, rebuild=True)
+
+
+def _create_indexes(*statements: str) -> Callable[[Connection], None]:
+    def apply(conn: Connection) -> None:
+        for statement in statements:
+            conn.execute(text(statement))
+
+    return apply
+
+
+def _add_post_image_dimensions(conn: Connection) -> None:
+    columns = _columns(conn, "post_image")
+    for column, sql_type in (
+        ("width", "INTEGER"),
+        ("height", "INTEGER"),
+        ("content_type", "VARCHAR"),
+    ):
+        if column not in columns:
+            conn.execute(text(f"ALTER TABLE post_image ADD COLUMN {column} {sql_type}"))
+
+
+def _move_image_bytes_to_blob_store(conn: Connection) -> None:
+    from backend.blobstore import blob_store
+    from backend.images import sniff_content_type
+
+    columns = _columns(conn, "post_image")
+    if "data" in columns:
+        for column, sql_type in (("blob_hash", "VARCHAR"), ("size", "INTEGER")):
+            if column not in columns:
+                conn.execute(text(f"ALTER TABLE post_image ADD COLUMN {column} {sql_type}"))
+        # Keyset pages over the primary key (post_id, variant)
+        query = text(
+            "SELECT post_id, variant, data FROM post_image "
+            "WHERE post_id > :post_id OR (post_id = :post_id AND variant > :variant) "
+            "ORDER BY post_id, variant LIMIT :limit"
+        )
+        after = {"post_id": -1, "variant": ""}
+        while rows := conn.execute(query, {**after, "limit": MIGRATION_BATCH_SIZE}).all():
+            for post_id, variant, data in rows:
+                conn.execute(
+                    text(
+                        "UPDATE post_image SET blob_hash = :blob_hash, size = :size, "
+                        "content_type = COALESCE(content_type, :content_type) "
+                        "WHERE post_id = :post_id AND variant = :variant"
+                    ),
+                    {
+                        "blob_hash": blob_store.put(data),
+                        "size": len(data),
+                        "content_type": sniff_content_type(data),
+                        "post_id": post_id,
+                        "variant": variant,
+                    },
+                )
+            after = {"post_id": rows[-1][0], "variant": rows[-1][1]}
+        conn.execute(text("ALTER TABLE post_image DROP COLUMN data"))
+    conn.execute(
+        text("CREATE INDEX IF NOT EXISTS ix_post_image_blob_hash ON post_image (blob_hash)")
+    )
+
+
+def _add_cache_version_updated_at(conn: Connection) -> None:
+    if "updated_at" not in _columns(conn, "cache_version"):
+        conn.execute(text("ALTER TABLE cache_version ADD COLUMN updated_at TIMESTAMP"))
+
+
+MIGRATIONS = [
+    Migration(1, "move post images into post_image", _move_legacy_post_images),
+    Migration(2, "full-text search index", _install_search_index),
+    Migration(
+        3,
+        "indexes for feed ordering, user filter and comment lookups",
+        _create_indexes(
+            "CREATE INDEX IF NOT EXISTS ix_post_created_at_id ON post (created_at, id)",
+            "CREATE INDEX IF NOT EXISTS ix_post_user_created_at_id "
+            'ON post ("user", created_at, id)',
+            'CREATE INDEX IF NOT EXISTS ix_comment_super_id_user ON comment (super_id, "user")',
+        ),
+    ),
+    Migration(4, "dimensions and media type of image renditions", _add_post_image_dimensions),
+    Migration(5, "move image bytes into the blob store", _move_image_bytes_to_blob_store),
+    Migration(6, "time of the last cache version bump", _add_cache_version_updated_at),
+    Migration(
+        7,
+        "index for paginating the comments of a post",
+        _create_indexes(
+            "CREATE INDEX IF NOT EXISTS ix_comment_super_id_created_at_id "
+            "ON comment (super_id, created_at, comment_id)"
+        ),
+    ),
+]
+
+
+# -------------------------------------------------
+# Runner
+# -------------------------------------------------
+def _ensure_version_table(engine: Engine) -> None:
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                "CREATE TABLE IF NOT EXISTS schema_migrations ("
+                "version INTEGER PRIMARY KEY, "
+                "description VARCHAR NOT NULL, "
+                "applied_at TIMESTAMP NOT NULL)"
+            )
+        )
+
+
+def applied_versions(engine: Engine) -> set[int]:
+    _ensure_version_table(engine)
+    with engine.connect() as conn:
+        return {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+
+
+def run_migrations(engine: Engine, migrations: list[Migration] = MIGRATIONS) -> list[int]:
+    """
+    Apply all pending migrations in version order. Returns the versions that
+    were applied by this call.
+    """
+    done = applied_versions(engine)
+    applied = []
+    for migration in sorted(migrations, key=lambda m: m.version):
+        if migration.version in done:
+            continue
+        with engine.begin() as conn:
+            migration.apply(conn)
+            conn.execute(
+                text(
+                    "INSERT INTO schema_migrations (version, description, applied_at) "
+                    "VALUES (:version, :description, :applied_at)"
+                ),
+                {
+                    "version": migration.version,
+                    "description": migration.description,
+                    "applied_at": datetime.now(timezone.utc),
+                },
+            )
+        print(f"[backend] applied migration {migration.version}: {migration.description}")
+        applied.append(migration.version)
+    return applied
+
+
+def main(argv: list[str]) -> None:
+    from backend.database import engine, init_db
+
+    if "--status" in argv:
+        done = applied_versions(engine)
+        for migration in MIGRATIONS:
+            state = "applied" if migration.version in done else "pending"
+            print(f"{migration.version:>4}  {state:<8} {migration.description}")
+        return
+    init_db()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,17 +1,22 @@
 from datetime import datetime, timezone
-from typing import Optional
 
+from sqlalchemy import Index
 from sqlmodel import Field, SQLModel
 
 
 class Post(SQLModel, table=True):
     id: int | None = Field(default=None, primary_key=True)
-    image_full: Optional[bytes] | None = None
-    image_thumb: Optional[bytes] | None = None
     text: str
     user: str
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc), nullable=False)
 
+    # Keyset pagination of the feed (ORDER BY created_at DESC, id DESC),
+    # optionally filtered by author. Existing databases: see migrations.py
+    __table_args__ = (
+        Index("ix_post_created_at_id", "created_at", "id"),
+        Index("ix_post_user_created_at_id", "user", "created_at", "id"),
+    )
+
 
 class Comment(SQLModel, table=True):
     super_id: int | None = Field(default=None, foreign_key="post.id")
@@ -19,3 +24,91 @@ class Comment(SQLModel, table=True):
     text: str
     user: str
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc), nullable=False)
+
+    # Comments of a post, optionally filtered by user, and keyset pagination
+    # of a post's comments (ORDER BY created_at, comment_id). Existing
+    # databases: see migrations.py
+    __table_args__ = (
+        Index("ix_comment_super_id_user", "super_id", "user"),
+        Index("ix_comment_super_id_created_at_id", "super_id", "created_at", "comment_id"),
+    )
+
+
+class PostImage(SQLModel, table=True):
+    """
+    A stored image of a post, one row per variant: the uploaded original
+    ("full") and the renditions made by the image-resizer ("400.webp", ...,
+    see backend/images.py). The bytes live in the blob store under their
+    SHA-256 (see backend/blobstore.py); identical images share one blob.
+    """
+
+    __tablename__ = "post_image"
+
+    post_id: int = Field(foreign_key="post.id", primary_key=True)
+    variant: str = Field(primary_key=True)
+    blob_hash: str = Field(index=True)
+    size: int
+    width: int | None = None
+    height: int | None = None
+    content_type: str | None = None
+
+
+class OrphanBlob(SQLModel, table=True):
+    """
+    A blob whose last post_image row went away, up for garbage collection
+    (see crud.collect_orphan_blobs). Uploads of the same content may refer
+    to it again before it is collected.
+    """
+
+    __tablename__ = "orphan_blob"
+
+    blob_hash: str = Field(primary_key=True)
+
+
+class OutboxMessage(SQLModel, table=True):
+    """
+    Broker message written in the same transaction as the change that caused
+    it and published later by the outbox dispatcher (transactional outbox).
+    """
+
+    __tablename__ = "outbox"
+
+    id: int | None = Field(default=None, primary_key=True)
+    queue: str
+    payload: str  # JSON body
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc), nullable=False)
+
+
+class GenerationJob(SQLModel, table=True):
+    """
+    An AI generation job (posts.generate / comments.generate) as seen by
+    clients: GET /jobs/{id} and its event stream. The worker reports progress
+    through PATCH /jobs/{id}; creating the post or comment with the job id
+    completes the job in the same transaction.
+    """
+
+    __tablename__ = "generation_job"
+
+    id: str = Field(primary_key=True)
+    kind: str  # "post" or "comment"
+    status: str = "queued"  # queued, running, done, failed
+    text: str = ""  # generated so far, while running
+    # Comment jobs: the post commented on; post jobs: the created post
+    post_id: int | None = None
+    comment_id: int | None = None
+    error: str | None = None
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc), nullable=False)
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc), nullable=False)
+
+
+class CacheVersion(SQLModel, table=True):
+    """
+    Counter of changes to a group of cached reads (see backend/feed_cache.py),
+    bumped in the transaction of every write that affects them.
+    """
+
+    __tablename__ = "cache_version"
+
+    name: str = Field(primary_key=True)
+    version: int = 0
+    updated_at: datetime | None = None  # of the last bump: Last-Modified
@@ -0,0 +1,115 @@
+import asyncio
+import json
+import os
+
+from pika.exceptions import AMQPError
+from sqlmodel import Session, col, delete, select
+
+from backend.models import OutboxMessage
+
+OUTBOX_BATCH_SIZE = int(os.environ.get("OUTBOX_BATCH_SIZE", "100"))
+OUTBOX_POLL_INTERVAL = float(os.environ.get("OUTBOX_POLL_INTERVAL", "1.0"))
+
+
+def enqueue(session: Session, queue: str, payload: dict) -> None:
+    """
+    Stage a broker message. It is only visible to the dispatcher once the
+    caller commits, so it is published if and only if the change is stored.
+    """
+    session.add(OutboxMessage(queue=queue, payload=json.dumps(payload)))
+
+
+def dispatch_pending(session: Session, publisher, batch_size: int = OUTBOX_BATCH_SIZE) -> int:
+    """
+    Publish up to `batch_size` pending messages in insertion order and delete
+    the ones that went out. With publisher confirms (the default) publish()
+    returns only once the broker has the persistent message, so a row is
+    deleted only after its message is safe; a crash in between publishes it
+    again (at least once). Stops at the first broker error or nack so the
+    remaining rows are retried on the next run. Returns the number of
+    messages sent.
+    """
+    query = select(OutboxMessage).order_by(col(OutboxMessage.id)).limit(batch_size)
+    sent: list[int] = []
+    for message in session.exec(query).all():
+        try:
+            publisher.publish(message.queue, json.loads(message.payload))
+        except AMQPError as e:
+            print(f"[backend] outbox publish failed, retrying later: {e}", flush=True)
+            break
+        if message.id is not None:
+            sent.append(message.id)
+
+    if sent:
+        session.exec(delete(OutboxMessage).where(col(OutboxMessage.id).in_(sent)))
+        session.commit()
+    return len(sent)
+
+
+class OutboxDispatcher:
+    """
+    Background task that drains the outbox to the broker. It runs every
+    `poll_interval` seconds, or right away when a request calls `notify()`
+    after committing new messages. Full batches are drained back to back.
+    """
+
+    def __init__(
+        self,
+        session_factory,
+        publisher,
+        batch_size: int = OUTBOX_BATCH_SIZE,
+        poll_interval: float = OUTBOX_POLL_INTERVAL,
+    ):
+        self._session_factory = session_factory
+        self._publisher = publisher
+        self._batch_size = batch_size
+        self._poll_interval = poll_interval
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if not getattr(self._publisher, "confirm_delivery", True):
+            print(
+                "[backend] publisher confirms are off: outbox messages can be lost "
+                "if the broker restarts",
+                flush=True,
+            )
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def notify(self) -> None:
+        """Wake the dispatcher; safe to call from request threads."""
+        if self._loop is not None and self._wakeup is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def _drain(self) -> int:
+        with self._session_factory() as session:
+            return dispatch_pending(session, self._publisher, self._batch_size)
+
+    async def _run(self) -> None:
+        assert self._wakeup is not None
+        while True:
+            try:
+                sent = await asyncio.to_thread(self._drain)
+            except Exception as e:
+                print(f"[backend] outbox dispatcher error: {e}", flush=True)
+                sent = 0
+            if sent == self._batch_size:
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self._poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
@@ -0,0 +1,55 @@
+import base64
+import json
+from datetime import datetime
+
+from fastapi import HTTPException
+from sqlalchemy import tuple_
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+# Response header carrying the cursor of the next page (absent on the last page)
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+# -------------------------------------------------
+# Opaque keyset cursors over (created_at, id)
+# -------------------------------------------------
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    raw = json.dumps([created_at.isoformat(), row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(created_at), int(row_id)
+    except Exception:
+        raise HTTPException(400, "Invalid cursor")
+
+
+def after_cursor(query, created_at_col, id_col, cursor: str | None, descending: bool = True):
+    """
+    Restrict `query` to the rows following `cursor` in (created_at, id) order.
+    The row-value comparison lets the database seek into the composite index
+    instead of skipping over all previous pages.
+    """
+    if not cursor:
+        return query
+    created_at, row_id = decode_cursor(cursor)
+    key = tuple_(created_at_col, id_col)
+    if descending:
+        return query.where(key < tuple_(created_at, row_id))
+    return query.where(key > tuple_(created_at, row_id))
+
+
+def split_page(rows: list, limit: int, cursor_of) -> tuple[list, str | None]:
+    """
+    Split `limit + 1` fetched rows into the page itself and the cursor of the
+    next page (None when there is no further row).
+    """
+    if len(rows) <= limit:
+        return rows, None
+    page = rows[:limit]
+    return page, encode_cursor(*cursor_of(page[-1]))
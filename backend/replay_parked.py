@@ -0,0 +1,77 @@
+"""
+Replay dead-lettered jobs: move messages from the parked queue back to the
+queue they were rejected from (taken from the x-death headers RabbitMQ adds).
+
+    python -m backend.replay_parked --list
+    python -m backend.replay_parked --queue posts.generate --limit 10
+"""
+
+import argparse
+
+from backend.messaging import PARKED_QUEUE, declare_queues, default_connection_factory
+
+
+def _text(value) -> str | None:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def original_queue(properties) -> str | None:
+    """Queue a parked message was dead-lettered from, None if unknown."""
+    headers = getattr(properties, "headers", None) or {}
+    queue = headers.get("x-first-death-queue")
+    if queue:
+        return _text(queue)
+    deaths = headers.get("x-death") or []
+    return _text(deaths[0].get("queue")) if deaths else None
+
+
+def replay(
+    channel, queue: str | None = None, limit: int | None = None, dry_run: bool = False
+) -> list[tuple[str, bytes]]:
+    """
+    Republish parked messages (only those from `queue`, if given) to their
+    original queue; returns (queue, body) of each. A message is acked on the
+    parked queue only after it is republished. Messages that are skipped, or
+    all of them with `dry_run`, stay unacked and return to the parked queue
+    when the channel is closed.
+    """
+    replayed = []
+    while limit is None or len(replayed) < limit:
+        method, properties, body = channel.basic_get(queue=PARKED_QUEUE)
+        if method is None:
+            break
+        source = original_queue(properties)
+        if source is None or (queue is not None and source != queue):
+            continue
+        if not dry_run:
+            channel.basic_publish(exchange="", routing_key=source, body=body, properties=properties)
+            channel.basic_ack(delivery_tag=method.delivery_tag)
+        replayed.append((source, body))
+    return replayed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--queue", help="only replay messages rejected from this queue")
+    parser.add_argument("--limit", type=int, help="replay at most this many messages")
+    parser.add_argument("--list", action="store_true", help="only show the parked messages")
+    args = parser.parse_args()
+
+    connection = default_connection_factory()
+    try:
+        channel = connection.channel()
+        declare_queues(channel)
+        # Ack a parked message only once the broker has the republished copy
+        channel.confirm_delivery()
+        replayed = replay(channel, args.queue, args.limit, dry_run=args.list)
+    finally:
+        connection.close()
+
+    for source, body in replayed:
+        print(f"{source}: {body.decode(errors='replace')[:200]}")
+    action = "parked" if args.list else "replayed"
+    print(f"{len(replayed)} message(s) {action}")
+
+
+if __name__ == "__main__":
+    main()
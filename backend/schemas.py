@@ -1,14 +1,17 @@
 import base64
 from datetime import datetime
-from typing import Optional
+from typing import Literal, Optional
 
 from pydantic import BaseModel, ConfigDict
 
+from backend.images import parse_rendition_variant
+
 
 class PostCreate(BaseModel):
     image: Optional[str] = None  # base64 or data URL
     text: str
     user: str
+    job_id: Optional[str] = None  # set by the AI worker: completes the generation job
 
 
 class GeneratedPostCreate(BaseModel):
@@ -29,17 +32,81 @@ class PostRead(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
     @classmethod
-    def from_orm_bytes(cls, obj):
+    def from_orm_bytes(cls, obj, images: dict[str, bytes]):
+        full = images.get("full")
+        thumb = images.get("thumb")
         return cls(
             id=obj.id,
             text=obj.text,
             user=obj.user,
             created_at=obj.created_at,
-            image_full=(base64.b64encode(obj.image_full).decode() if obj.image_full else None),
-            image_thumb=(base64.b64encode(obj.image_thumb).decode() if obj.image_thumb else None),
+            image_full=(base64.b64encode(full).decode() if full else None),
+            image_thumb=(base64.b64encode(thumb).decode() if thumb else None),
         )
 
 
+class ImageRendition(BaseModel):
+    """One stored size of a post image; the format is negotiated via Accept."""
+
+    url: str
+    width: int
+    height: int
+
+
+class PostSummary(BaseModel):
+    """
+    Lean list representation: images are referenced by URL instead of being
+    embedded, so feed pages stay small and the bytes can be cached separately.
+    `image_renditions` lists the available sizes (e.g. for an <img srcset>).
+    `comment_count` and `latest_comments` are only set on request
+    (GET /posts/?include=...).
+    """
+
+    id: int
+    image_thumb_url: Optional[str] = None
+    image_full_url: Optional[str] = None
+    image_renditions: list[ImageRendition] = []
+    text: str
+    user: str
+    created_at: datetime
+    comment_count: Optional[int] = None
+    latest_comments: Optional[list["CommentRead"]] = None
+
+    @classmethod
+    def from_orm_urls(cls, obj, images: list[tuple[str, int | None, int | None]]):
+        """`images`: (variant, width, height) of every stored image of the post."""
+        return cls.model_validate(cls.row(obj.id, obj.text, obj.user, obj.created_at, images))
+
+    @staticmethod
+    def row(
+        post_id: int,
+        text: str,
+        user: str,
+        created_at: datetime,
+        images: list[tuple[str, int | None, int | None]],
+    ) -> dict:
+        """The summary as a plain dict (for backend/fast_json.py), from the post's columns."""
+        variants = {variant for variant, _, _ in images}
+        renditions: dict[int, dict] = {}
+        for variant, width, height in images:
+            parsed = parse_rendition_variant(variant)
+            if parsed and width and height:
+                url = f"/posts/{post_id}/image/thumb?size={parsed[0]}"
+                renditions[parsed[0]] = {"url": url, "width": width, "height": height}
+        has_thumb = bool(renditions) or "thumb" in variants
+        return {
+            "id": post_id,
+            "image_thumb_url": f"/posts/{post_id}/image/thumb" if has_thumb else None,
+            "image_full_url": f"/posts/{post_id}/image/full" if "full" in variants else None,
+            "image_renditions": [renditions[size] for size in sorted(renditions)],
+            "text": text,
+            "user": user,
+            "created_at": created_at,
+            "comment_count": None,
+            "latest_comments": None,
+        }
+
+
 class GeneratedCommentCreate(BaseModel):
     user: str
     persona: Optional[str] = "neutral"
@@ -48,6 +115,7 @@ class GeneratedCommentCreate(BaseModel):
 class CommentCreate(BaseModel):
     text: str
     user: str
+    job_id: Optional[str] = None  # set by the AI worker: completes the generation job
 
 
 class CommentRead(BaseModel):
@@ -65,3 +133,43 @@ class CommentRead(BaseModel):
         Pydantic v2 style ORM conversion.
         """
         return cls.model_validate(obj, from_attributes=True)
+
+
+JobStatus = Literal["queued", "running", "done", "failed"]
+
+
+class JobRead(BaseModel):
+    """
+    State of an AI generation job. `text` grows while the job runs; once it is
+    done, `post_id` / `comment_id` point at the created post or comment.
+    """
+
+    id: str
+    kind: Literal["post", "comment"]
+    status: JobStatus
+    text: str
+    post_id: Optional[int] = None
+    comment_id: Optional[int] = None
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class JobUpdate(BaseModel):
+    """Progress report of the AI worker."""
+
+    status: Optional[Literal["running", "failed"]] = None
+    text: Optional[str] = None
+    error: Optional[str] = None
+
+
+class SearchHit(BaseModel):
+    kind: Literal["post", "comment"]
+    id: int  # post id or comment id, depending on kind
+    post_id: int
+    user: str
+    created_at: datetime
+    snippet: str  # HTML-escaped, matches wrapped in <mark>
+    score: float
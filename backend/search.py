@@ -0,0 +1,173 @@
+import html
+import re
+import sqlite3
+from functools import cache
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection
+from sqlmodel import Session, col, select
+
+from backend.models import Comment, Post
+
+# Snippet markers are control characters so the text can be HTML-escaped
+# before they are turned into <mark> tags.
+_MARK_START = "\x02"
+_MARK_END = "\x03"
+SNIPPET_TOKENS = 12
+
+# -------------------------------------------------
+# SQLite FTS5 index (external content tables kept in sync by triggers)
+# -------------------------------------------------
+_FTS_TABLES = {
+    # fts table: (content table, rowid column)
+    "post_fts": ("post", "id"),
+    "comment_fts": ("comment", "comment_id"),
+}
+
+
+def _fts_ddl(fts: str, table: str, rowid: str) -> list[str]:
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+        f"text, content='{table}', content_rowid='{rowid}', "
+        f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {fts}(rowid, text) VALUES (new.{rowid}, new.text); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, text) VALUES ('delete', old.{rowid}, old.text); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, text) VALUES ('delete', old.{rowid}, old.text); "
+        f"INSERT INTO {fts}(rowid, text) VALUES (new.{rowid}, new.text); END",
+    ]
+
+
+@cache
+def sqlite_has_fts5() -> bool:
+    """
+    Whether the SQLite library has FTS5 (an optional compile-time module).
+    The sqlite dialects, pysqlite and aiosqlite, both use the stdlib sqlite3
+    module, so one probe answers for every engine.
+    """
+    probe = sqlite3.connect(":memory:")
+    try:
+        probe.execute("CREATE VIRTUAL TABLE fts5_probe USING fts5(text)")
+    except sqlite3.OperationalError:
+        return False
+    finally:
+        probe.close()
+    return True
+
+
+def fts_available(bind) -> bool:
+    return bind.dialect.name == "sqlite" and sqlite_has_fts5()
+
+
+def install_search_index(conn: Connection, rebuild: bool = False) -> None:
+    """
+    Create the FTS5 tables and sync triggers (idempotent). Existing rows are
+    indexed when the FTS tables are first created, or when `rebuild` is set.
+    No-op on databases without FTS5; search then falls back to LIKE.
+    """
+    if not fts_available(conn):
+        return
+    existing = set(inspect(conn).get_table_names())
+    for fts, (table, rowid) in _FTS_TABLES.items():
+        for statement in _fts_ddl(fts, table, rowid):
+            conn.execute(text(statement))
+        if rebuild or fts not in existing:
+            conn.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+
+
+def build_match_query(q: str) -> str | None:
+    """
+    Turn free user input into an FTS5 query: every word becomes a quoted
+    prefix term, and all terms must match. Returns None if q has no words.
+    """
+    terms = re.findall(r"\w+", q)
+    if not terms:
+        return None
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def _highlight(snippet: str) -> str:
+    return html.escape(snippet).replace(_MARK_START, "<mark>").replace(_MARK_END, "</mark>")
+
+
+# -------------------------------------------------
+# Queries
+# -------------------------------------------------
+def search_posts(session: Session, q: str, limit: int) -> list[dict]:
+    match = build_match_query(q)
+    if match is None:
+        return []
+    if not fts_available(session.get_bind()):
+        return _like_posts(session, q, limit)
+
+    rows = session.execute(
+        text(
+            "SELECT p.id, p.id, p.user, p.created_at, "
+            f"snippet(post_fts, 0, :start, :end, '…', {SNIPPET_TOKENS}), bm25(post_fts) AS rank "
+            "FROM post_fts JOIN post p ON p.id = post_fts.rowid "
+            "WHERE post_fts MATCH :match ORDER BY rank LIMIT :limit"
+        ),
+        {"match": match, "limit": limit, "start": _MARK_START, "end": _MARK_END},
+    ).all()
+    return [_hit("post", *row) for row in rows]
+
+
+def search_comments(session: Session, q: str, limit: int) -> list[dict]:
+    match = build_match_query(q)
+    if match is None:
+        return []
+    if not fts_available(session.get_bind()):
+        return _like_comments(session, q, limit)
+
+    rows = session.execute(
+        text(
+            "SELECT c.comment_id, c.super_id, c.user, c.created_at, "
+            f"snippet(comment_fts, 0, :start, :end, '…', {SNIPPET_TOKENS}), "
+            "bm25(comment_fts) AS rank "
+            "FROM comment_fts JOIN comment c ON c.comment_id = comment_fts.rowid "
+            "WHERE comment_fts MATCH :match ORDER BY rank LIMIT :limit"
+        ),
+        {"match": match, "limit": limit, "start": _MARK_START, "end": _MARK_END},
+    ).all()
+    return [_hit("comment", *row) for row in rows]
+
+
+def _hit(kind, row_id, post_id, user, created_at, snippet, rank) -> dict:
+    return {
+        "kind": kind,
+        "id": row_id,
+        "post_id": post_id,
+        "user": user,
+        "created_at": created_at,
+        "snippet": _highlight(snippet),
+        # bm25() is lower-is-better; expose higher-is-better scores
+        "score": -rank,
+    }
+
+
+def _like_posts(session: Session, q: str, limit: int) -> list[dict]:
+    query = (
+        select(Post)
+        .where(col(Post.text).ilike(f"%{q}%"))
+        .order_by(col(Post.created_at).desc())
+        .limit(limit)
+    )
+    return [
+        _hit("post", p.id, p.id, p.user, p.created_at, p.text, 0.0)
+        for p in session.exec(query).all()
+    ]
+
+
+def _like_comments(session: Session, q: str, limit: int) -> list[dict]:
+    query = (
+        select(Comment)
+        .where(col(Comment.text).ilike(f"%{q}%"))
+        .order_by(col(Comment.created_at).desc())
+        .limit(limit)
+    )
+    return [
+        _hit("comment", c.comment_id, c.super_id, c.user, c.created_at, c.text, 0.0)
+        for c in session.exec(query).all()
+    ]
@@ -0,0 +1,135 @@
+"""
+Jobs per second of the AI generation worker at different concurrency limits.
+
+Serves a mock of the Mistral chat completions API (answering after
+`--latency` seconds, plus jitter) and of the backend's post / comment
+endpoints with uvicorn, then pushes `--jobs` generation messages through
+post_ai_generation's GenerationWorker with the real MistralTextGenerator,
+rate limiter and pooled HTTP client. Concurrency 1 is the old one-at-a-time
+worker.
+
+    python -m benchmarks.bench_ai_worker --jobs 200 --latency 0.5 --concurrency 1,8,32
+    python -m benchmarks.bench_ai_worker --rate 5 --burst 5   # with a provider quota
+"""
+
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from pathlib import Path
+
+import uvicorn
+from fastapi import FastAPI
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def mock_app(latency: float, jitter: float) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/v1/chat/completions")
+    async def completions(body: dict):
+        await asyncio.sleep(latency + random.uniform(0, jitter))
+        prompt = body["messages"][0]["content"]
+        return {"choices": [{"message": {"content": f"**Mock answer to {len(prompt)} chars**"}}]}
+
+    @app.post("/posts/", status_code=201)
+    async def create_post(body: dict):
+        return {"post_id": 1, **body}
+
+    @app.post("/posts/{post_id}/comments", status_code=201)
+    async def create_comment(post_id: int, body: dict):
+        return {"post_id": post_id, **body}
+
+    return app
+
+
+def serve(app: FastAPI, port: int) -> uvicorn.Server:
+    config = uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+    server = uvicorn.Server(config)
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def load_worker_modules():
+    os.environ.setdefault("MISTRAL_API_KEY", "benchmark")
+    sys.path.insert(0, str(ROOT / "post_ai_generation"))
+    return (
+        importlib.import_module("consumer"),
+        importlib.import_module("rate_limit"),
+        importlib.import_module("text_generator_mistral"),
+    )
+
+
+async def run(base_url: str, jobs: int, concurrency: int, rate: float, burst: float) -> dict:
+    consumer, rate_limit, text_generator_mistral = load_worker_modules()
+    limiter = rate_limit.RateLimiter(rate, burst) if rate else None
+    async with consumer.http_client(concurrency) as client:
+        text_gen = text_generator_mistral.MistralTextGenerator(client, limiter)
+        text_gen.API_URL = f"{base_url}/v1/chat/completions"
+        worker = consumer.GenerationWorker(text_gen, client, base_url, concurrency)
+
+        latencies: list[float] = []
+
+        async def job(i: int) -> bool:
+            if i % 2:
+                queue, msg = consumer.QUEUE_POSTS, {"user": "bench", "prompt": f"topic {i}"}
+            else:
+                queue, msg = consumer.QUEUE_COMMENTS, {"post_id": 1, "post_text": f"post {i}"}
+            start = time.perf_counter()
+            ok = await worker.handle(queue, json.dumps(msg).encode())
+            latencies.append(time.perf_counter() - start)
+            return ok
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(job(i) for i in range(jobs)))
+        elapsed = time.perf_counter() - start
+
+    return {
+        "ok": sum(results),
+        "jobs_per_s": jobs / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--jobs", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.5, help="mock completion time, s")
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--concurrency", default="1,4,16,64")
+    parser.add_argument("--rate", type=float, default=0, help="requests/s quota, 0 = none")
+    parser.add_argument("--burst", type=float, default=1)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    # Output of the worker's per-job prints would drown the results
+    sys.stdout = open(os.devnull, "w")
+    server = serve(mock_app(args.latency, args.jitter), args.port)
+    results = []
+    try:
+        for concurrency in (int(c) for c in args.concurrency.split(",")):
+            result = asyncio.run(
+                run(f"http://127.0.0.1:{args.port}", args.jobs, concurrency, args.rate, args.burst)
+            )
+            results.append((concurrency, result))
+    finally:
+        server.should_exit = True
+        sys.stdout = sys.__stdout__
+
+    print(f"{args.jobs} jobs, mock latency {args.latency}s, rate limit {args.rate or 'none'}")
+    print(f"{'concurrency':>11} {'ok':>5} {'jobs/s':>8} {'p50 ms':>8}")
+    for concurrency, r in results:
+        print(f"{concurrency:>11} {r['ok']:>5} {r['jobs_per_s']:>8.1f} {r['p50_ms']:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
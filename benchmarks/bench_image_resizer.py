@@ -0,0 +1,136 @@
+"""
+Images per second of the image-resizer at different process-pool sizes.
+
+Seeds a SQLite file and a blob store with `--images` full-size images and runs the resizer's
+ResizeWorker over them (load, resize in the pool, batched commit, ack) with
+an in-process stand-in for the broker channel.
+
+    python -m benchmarks.bench_image_resizer --images 200 --pools 1,2,4,8
+"""
+
+import argparse
+import importlib.util
+import io
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from types import SimpleNamespace
+
+from PIL import Image
+from sqlmodel import Session, SQLModel
+
+from backend.blobstore import LocalBlobStore
+from backend.database import create_db_engine
+from backend.models import Post, PostImage
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def load_resizer():
+    spec = importlib.util.spec_from_file_location(
+        "image_resizer", ROOT / "image-resizer" / "main.py"
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class NullChannel:
+    def __init__(self):
+        self.settled = 0
+
+    def basic_ack(self, delivery_tag):
+        self.settled += 1
+
+    def basic_nack(self, delivery_tag, requeue=True):
+        self.settled += 1
+
+
+def sample_image(width: int, height: int) -> bytes:
+    # A gradient compresses like a photo far better than flat colour does
+    img = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", quality=90)
+    return buf.getvalue()
+
+
+def seed(engine, store, count: int, image: bytes) -> list[int]:
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        posts = [Post(text=f"post {i}", user="bench") for i in range(count)]
+        session.add_all(posts)
+        session.flush()
+        image_hash = store.put(image)
+        session.add_all(
+            PostImage(post_id=p.id, variant="full", blob_hash=image_hash, size=len(image))
+            for p in posts
+        )
+        session.commit()
+        return [p.id for p in posts]
+
+
+def run(resizer, engine, store, post_ids, workers: int, prefetch: int, batch_size: int) -> float:
+    channel = NullChannel()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Warm the pool up so process start-up is not measured
+        list(pool.map(abs, range(workers)))
+        worker = resizer.ResizeWorker(
+            pool, lambda: Session(engine), batch_size=batch_size, store=store
+        )
+        worker.attach(channel)
+
+        started = time.perf_counter()
+        queue = list(post_ids)
+        tag = 0
+        while queue or worker.pending:
+            # Respect the prefetch window like the broker would
+            while queue and len(worker.pending) < prefetch:
+                tag += 1
+                body = json.dumps({"post_id": queue.pop()}).encode()
+                worker.on_message(channel, SimpleNamespace(delivery_tag=tag), None, body)
+            if not worker.flush():
+                time.sleep(0.001)
+        elapsed = time.perf_counter() - started
+    assert channel.settled == len(post_ids)
+    return len(post_ids) / elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--images", type=int, default=200)
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument(
+        "--pools", default=",".join(str(2**i) for i in range((os.cpu_count() or 1).bit_length()))
+    )
+    parser.add_argument("--prefetch-per-worker", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args()
+
+    resizer = load_resizer()
+    image = sample_image(args.width, args.height)
+    print(f"{args.images} images of {args.width}x{args.height} ({len(image) // 1024} KiB)")
+
+    for workers in (int(n) for n in args.pools.split(",")):
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = create_db_engine(f"sqlite:///{Path(tmp) / 'bench.db'}")
+            store = LocalBlobStore(Path(tmp) / "blobs")
+            post_ids = seed(engine, store, args.images, image)
+            rate = run(
+                resizer,
+                engine,
+                store,
+                post_ids,
+                workers,
+                prefetch=workers * args.prefetch_per_worker,
+                batch_size=args.batch_size,
+            )
+            engine.dispose()
+        print(f"pool {workers:>3}: {rate:>8.1f} images/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Rows per second of the comment list and feed page responses, from the query
+to the JSON bytes.
+
+"model" is the previous path: ORM objects, a Pydantic model per row,
+validation against response_model and FastAPI's jsonable_encoder + json.dumps
+(comments) or TypeAdapter.dump_json (feed). "rows" is the current one: column
+tuples to dicts, encoded by backend.fast_json (orjson when installed). Runs on
+a throwaway SQLite file; the comments of one post make a response of N rows,
+as does a feed page of N posts.
+
+    python -m benchmarks.bench_json_serialization --rows 1000,10000,100000
+"""
+
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+from sqlmodel import Session, SQLModel, col, insert, select
+
+from backend import crud, fast_json
+from backend.database import create_db_engine
+from backend.models import Comment, Post, PostImage
+from backend.schemas import CommentRead, PostSummary
+
+COMMENTS = TypeAdapter(list[CommentRead])
+SUMMARIES = TypeAdapter(list[PostSummary])
+
+
+def seed(session: Session, sizes: list[int]) -> dict[int, int]:
+    """Feed posts for the largest size, and a post with `size` comments per size."""
+    session.exec(
+        insert(Post),
+        params=[{"text": f"post {i}", "user": f"user{i % 50}"} for i in range(max(sizes))],
+    )
+    commented = {}
+    for size in sizes:
+        post = Post(text=f"{size} comments", user="bench")
+        session.add(post)
+        session.flush()
+        comments = [
+            {"super_id": post.id, "text": f"comment {i}", "user": "bench"} for i in range(size)
+        ]
+        session.exec(insert(Comment), params=comments)
+        commented[size] = post.id
+    session.commit()
+    return commented
+
+
+def comments_model(session: Session, post_id: int, limit: int) -> bytes:
+    query = select(Comment).where(Comment.super_id == post_id)
+    query = query.order_by(col(Comment.created_at), col(Comment.comment_id)).limit(limit)
+    comments = [CommentRead.from_orm(c) for c in session.exec(query)]
+    return json.dumps(jsonable_encoder(COMMENTS.validate_python(comments))).encode()
+
+
+def comments_rows(session: Session, post_id: int, limit: int) -> bytes:
+    comments, _ = crud.list_comments(session, post_id, None, None, limit)
+    return fast_json.dumps(comments)
+
+
+def feed_model(session: Session, post_id: int, limit: int) -> bytes:
+    query = select(Post).order_by(col(Post.created_at).desc(), col(Post.id).desc()).limit(limit)
+    posts = session.exec(query).all()
+    images = select(PostImage.post_id).where(col(PostImage.post_id).in_([p.id for p in posts]))
+    session.exec(images).all()
+    return SUMMARIES.dump_json([PostSummary.from_orm_urls(p, []) for p in posts])
+
+
+def feed_rows(session: Session, post_id: int, limit: int) -> bytes:
+    posts, _ = crud.list_posts(session, None, None, limit, None)
+    return fast_json.dumps(posts)
+
+
+PATHS = {
+    "comments": (comments_model, comments_rows),
+    "feed": (feed_model, feed_rows),
+}
+
+
+def rate(path, session: Session, post_id: int, rows: int, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        session.expunge_all()
+        start = time.perf_counter()
+        path(session, post_id, rows)
+        best = min(best, time.perf_counter() - start)
+    return rows / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", default="1000,10000,100000")
+    parser.add_argument("--repeat", type=int, default=3, help="best of this many runs")
+    args = parser.parse_args()
+    sizes = [int(n) for n in args.rows.split(",")]
+
+    encoder = "orjson" if fast_json.orjson is not None else "pydantic-core"
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_db_engine(f"sqlite:///{Path(tmp) / 'bench.db'}")
+        SQLModel.metadata.create_all(engine)
+        with Session(engine) as session:
+            commented = seed(session, sizes)
+            print(f"fast path encoder: {encoder}")
+            print(f"{'response':>8} {'rows':>7} {'model rows/s':>13} {'rows rows/s':>12} {'x':>5}")
+            for name, (model_path, rows_path) in PATHS.items():
+                for rows in sizes:
+                    post_id = commented[rows]
+                    old = rate(model_path, session, post_id, rows, args.repeat)
+                    new = rate(rows_path, session, post_id, rows, args.repeat)
+                    print(f"{name:>8} {rows:>7} {old:>13,.0f} {new:>12,.0f} {new / old:>5.1f}")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
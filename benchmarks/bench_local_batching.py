@@ -0,0 +1,78 @@
+"""
+Tokens per second of the local-model generator against batch size.
+
+Sends `--prompts` concurrent prompts through post_ai_generation's
+BatchingTextGenerator at each batch size (1 is the old one-prompt-per-call
+pipeline) and counts the generated tokens with the model's tokenizer.
+Needs torch and transformers (the local-model image) and a model such as
+gpt2.
+
+    python -m benchmarks.bench_local_batching --model gpt2 --prompts 32 --batch-sizes 1,4,8,16
+"""
+
+import argparse
+import asyncio
+import importlib
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+PERSONAS = ("neutral", "positive", "negative")
+
+
+async def run(local, text_gen, prompts: int, batch_size: int, wait_ms: float):
+    generator = local.BatchingTextGenerator(
+        text_gen, max_batch_size=batch_size, max_wait_ms=wait_ms, max_queue=prompts
+    )
+    start = time.perf_counter()
+    texts = await asyncio.gather(
+        *(
+            generator.generate_text(f"topic number {i}", PERSONAS[i % len(PERSONAS)])
+            for i in range(prompts)
+        )
+    )
+    elapsed = time.perf_counter() - start
+    batch_sizes = generator.batcher.batch_sizes
+    await generator.close()
+    return texts, elapsed, batch_sizes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--model", default="gpt2", help="model name or path")
+    parser.add_argument("--prompts", type=int, default=32)
+    parser.add_argument("--batch-sizes", default="1,4,8,16")
+    parser.add_argument("--wait-ms", type=float, default=20)
+    parser.add_argument("--threads", type=int, help="torch CPU threads (LOCAL_MODEL_THREADS)")
+    args = parser.parse_args()
+
+    if args.threads:
+        os.environ["LOCAL_MODEL_THREADS"] = str(args.threads)
+    sys.path.insert(0, str(ROOT / "post_ai_generation"))
+    try:
+        local = importlib.import_module("text_generator_local_model_unused")
+    except ImportError as e:
+        sys.exit(f"the local model needs torch and transformers: {e}")
+
+    text_gen = local.TextGenerator(model=args.model)
+    text_gen.generate_text("warm up")
+    tokenizer = text_gen.generator.tokenizer
+
+    print(f"{args.prompts} prompts, model {args.model}, {local.LOCAL_MODEL_THREADS} threads")
+    print(f"{'batch size':>10} {'mean batch':>10} {'tokens/s':>9} {'prompts/s':>9}")
+    for batch_size in (int(b) for b in args.batch_sizes.split(",")):
+        texts, elapsed, batch_sizes = asyncio.run(
+            run(local, text_gen, args.prompts, batch_size, args.wait_ms)
+        )
+        tokens = sum(len(tokenizer(text).input_ids) for text in texts)
+        print(
+            f"{batch_size:>10} {statistics.mean(batch_sizes):>10.1f} "
+            f"{tokens / elapsed:>9.1f} {args.prompts / elapsed:>9.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
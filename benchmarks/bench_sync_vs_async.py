@@ -0,0 +1,143 @@
+"""
+Throughput and tail latency of the sync (backend.main) vs async
+(backend.async_app) API under concurrent load.
+
+Each app is served by uvicorn on a freshly seeded SQLite file and hit with a
+mix of feed reads, post reads and comment writes from `--concurrency`
+clients. Reports requests/s and p50 / p99 latency per app.
+
+    python -m benchmarks.bench_sync_vs_async --requests 5000 --concurrency 64
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+ROOT = Path(__file__).resolve().parent.parent
+APPS = {"sync": "backend.main:app", "async": "backend.async_app:app"}
+
+
+def seed(db_url: str, posts: int, comments_per_post: int) -> None:
+    env = {**os.environ, "DB_URL": db_url}
+    script = (
+        "from sqlmodel import Session\n"
+        "from backend.database import engine, init_db\n"
+        "from backend.models import Comment, Post\n"
+        "init_db()\n"
+        "with Session(engine) as s:\n"
+        f"    for i in range({posts}):\n"
+        "        p = Post(text=f'post {i}', user=f'user{i % 50}')\n"
+        "        s.add(p); s.flush()\n"
+        f"        for j in range({comments_per_post}):\n"
+        "            s.add(Comment(super_id=p.id, text=f'comment {j}', user='bench'))\n"
+        "    s.commit()\n"
+    )
+    subprocess.run([sys.executable, "-c", script], cwd=ROOT, env=env, check=True)
+
+
+async def wait_ready(client: httpx.AsyncClient, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/docs")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+
+async def drive(base_url: str, posts: int, requests: int, concurrency: int) -> list[float]:
+    latencies: list[float] = []
+    remaining = iter(range(requests))
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        await wait_ready(client)
+
+        async def worker() -> None:
+            rng = random.Random()
+            for _ in remaining:
+                post_id = rng.randint(1, posts)
+                roll = rng.random()
+                start = time.perf_counter()
+                if roll < 0.5:
+                    r = await client.get("/posts/", params={"limit": 20})
+                elif roll < 0.8:
+                    r = await client.get(f"/posts/{post_id}/comments")
+                elif roll < 0.9:
+                    r = await client.get(f"/posts/{post_id}")
+                else:
+                    r = await client.post(
+                        f"/posts/{post_id}/comments", json={"text": "bench", "user": "bench"}
+                    )
+                latencies.append(time.perf_counter() - start)
+                r.raise_for_status()
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies
+
+
+def run_app(name: str, args: argparse.Namespace, port: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        db_url = f"sqlite:///{Path(tmp) / 'bench.db'}"
+        seed(db_url, args.posts, args.comments)
+        env = {**os.environ, "DB_URL": db_url, "RABBIT_HOST": args.rabbit_host}
+        server = subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "uvicorn",
+                APPS[name],
+                "--port",
+                str(port),
+                "--log-level",
+                "warning",
+            ],
+            cwd=ROOT,
+            env=env,
+        )
+        try:
+            started = time.perf_counter()
+            latencies = asyncio.run(
+                drive(f"http://127.0.0.1:{port}", args.posts, args.requests, args.concurrency)
+            )
+            elapsed = time.perf_counter() - started
+        finally:
+            server.terminate()
+            server.wait()
+
+    latencies.sort()
+    p50 = statistics.median(latencies) * 1000
+    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+    print(
+        f"{name:<6} {len(latencies) / elapsed:>9.1f} req/s  p50 {p50:>7.2f} ms  p99 {p99:>7.2f} ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--posts", type=int, default=1000)
+    parser.add_argument("--comments", type=int, default=5, help="comments per post")
+    parser.add_argument("--rabbit-host", default="localhost")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--only", choices=sorted(APPS), help="benchmark a single app")
+    args = parser.parse_args()
+
+    for offset, name in enumerate([args.only] if args.only else list(APPS)):
+        run_app(name, args, args.port + offset)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,7 @@
 import { HttpClient } from "@angular/common/http";
 import { Injectable } from "@angular/core";
+import { map } from "rxjs";
+import type { Job } from "./jobs.service";
 
 export interface Comment {
   comment_id: number;
@@ -9,6 +11,12 @@ export interface Comment {
   created_at: string;
 }
 
+// One page of a post's comments, oldest first
+export interface CommentPage {
+  comments: Comment[];
+  nextCursor: string | null;
+}
+
 export interface CommentCreate {
   user: string;
   text: string;
@@ -24,13 +32,39 @@ export class CommentsService {
     return this.http.get<Comment[]>(`${this.api}/posts/${postId}/comments`);
   }
 
+  // Keyset-paginated: pass the nextCursor of the previous page for the next one
+  getPage(postId: number, cursor: string | null = null, limit?: number) {
+    const params: Record<string, string | number> = {};
+    if (cursor) {
+      params['cursor'] = cursor;
+    }
+    if (limit) {
+      params['limit'] = limit;
+    }
+    return this.http
+      .get<Comment[]>(`${this.api}/posts/${postId}/comments`, { params, observe: 'response' })
+      .pipe(map(r => ({
+        comments: r.body ?? [],
+        nextCursor: r.headers.get('X-Next-Cursor'),
+      }) as CommentPage));
+  }
+
+  // The comments of many posts in one request, keyed by post id
+  getForPosts(postIds: number[], latest?: number) {
+    const params: Record<string, string | number | number[]> = { post_id: postIds };
+    if (latest) {
+      params['latest'] = latest;
+    }
+    return this.http.get<Record<string, Comment[]>>(`${this.api}/comments/`, { params });
+  }
+
   create(postId: number, payload: CommentCreate) {
     return this.http.post<Comment>(`${this.api}/posts/${postId}/comments`, payload);
   }
 
   // Korrigierte Methode: Erzeuge Kommentar per AI für einen bestimmten Post
   createCommentWithAI(postId: number, payload: { user: string; persona?: string }) {
-    return this.http.post<Comment>(`${this.api}/posts/${postId}/comments/generate`, payload);
+    return this.http.post<Job>(`${this.api}/posts/${postId}/comments/generate`, payload);
   }
 
   delete(commentId: number) {
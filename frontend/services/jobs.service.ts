@@ -0,0 +1,59 @@
+import { Injectable } from "@angular/core";
+import { Observable } from "rxjs";
+import { API_BASE } from "./posts.service";
+
+// AI generation job (POST /posts/generate, POST /posts/{id}/comments/generate)
+export interface Job {
+  id: string;
+  kind: 'post' | 'comment';
+  status: 'queued' | 'running' | 'done' | 'failed';
+  text: string;
+  post_id: number | null;
+  comment_id: number | null;
+  error: string | null;
+  created_at: string;
+  updated_at: string;
+}
+
+// What GET /jobs/{id}/stream pushes; `text` is the draft generated so far
+export type JobEvent =
+  | { type: 'status'; status: Job['status'] }
+  | { type: 'text'; text: string }
+  | { type: 'done'; text: string; post_id: number | null; comment_id: number | null }
+  | { type: 'failed'; error: string | null };
+
+@Injectable({ providedIn: 'root' })
+export class JobsService {
+  private api = `${API_BASE}/jobs`;
+
+  // Completes after `done`, errors after `failed`; unsubscribing closes the stream
+  watch(jobId: string): Observable<JobEvent> {
+    return new Observable<JobEvent>(subscriber => {
+      const source = new EventSource(`${this.api}/${jobId}/stream`);
+      let text = '';
+      const on = (event: string, handle: (data: any) => void) =>
+        source.addEventListener(event, e => handle(JSON.parse((e as MessageEvent).data)));
+
+      on('status', data => subscriber.next({ type: 'status', status: data.status }));
+      on('token', data => {
+        text += data.delta;
+        subscriber.next({ type: 'text', text });
+      });
+      on('text', data => {
+        text = data.text;
+        subscriber.next({ type: 'text', text });
+      });
+      on('done', data => {
+        source.close();
+        subscriber.next({ type: 'done', text, ...data });
+        subscriber.complete();
+      });
+      on('failed', data => {
+        source.close();
+        subscriber.next({ type: 'failed', error: data.error });
+        subscriber.error(new Error(data.error ?? 'AI generation failed'));
+      });
+      return () => source.close();
+    });
+  }
+}
@@ -1,6 +1,7 @@
 import { describe, it, expect, vi } from 'vitest';
 import { PostsService } from './posts.service';
-import { HttpClient } from '@angular/common/http';
+import { HttpClient, HttpHeaders, HttpResponse } from '@angular/common/http';
+import { of } from 'rxjs';
 
 describe('PostsService (pure Vitest)', () => {
   it('should fetch all posts', () => {
@@ -18,6 +19,25 @@ describe('PostsService (pure Vitest)', () => {
     );
   });
 
+  it('should fetch a feed page with the cursor of the next one', () => {
+    const getMock = vi.fn().mockReturnValue(of(new HttpResponse({
+      body: [{ id: 2 }],
+      headers: new HttpHeaders({ 'X-Next-Cursor': 'next' }),
+    })));
+
+    const http = { get: getMock } as unknown as HttpClient;
+    const service = new PostsService(http);
+
+    let page: any;
+    service.getPage(['comment_count'], 'abc').subscribe(p => page = p);
+
+    expect(getMock).toHaveBeenCalledWith(
+      'http://localhost:8000/posts/',
+      { params: { include: 'comment_count', cursor: 'abc' }, observe: 'response' }
+    );
+    expect(page).toEqual({ posts: [{ id: 2 }], nextCursor: 'next' });
+  });
+
   it('should create a post', () => {
     const postMock = vi.fn().mockReturnValue({
       subscribe: (fn: any) => fn({})
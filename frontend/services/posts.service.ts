@@ -1,5 +1,10 @@
 import { HttpClient } from "@angular/common/http";
 import { Injectable } from "@angular/core";
+import { map } from "rxjs";
+import type { Comment } from "./comments.service";
+import type { Job } from "./jobs.service";
+
+export const API_BASE = 'http://localhost:8000';
 
 export interface Post {
   id: number;
@@ -10,6 +15,34 @@ export interface Post {
   created_at: string; // backend returns a string timestamp
 }
 
+// Lean feed entry: images are referenced by URL (relative to API_BASE)
+export interface ImageRendition {
+  url: string;
+  width: number;
+  height: number;
+}
+
+export interface PostSummary {
+  id: number;
+  user: string;
+  text: string;
+  image_full_url: string | null;
+  image_thumb_url: string | null;
+  image_renditions?: ImageRendition[];
+  created_at: string;
+  // Only filled when requested with getAll(include) / getPage(include)
+  comment_count?: number | null;
+  latest_comments?: Comment[] | null;
+}
+
+export type FeedInclude = 'comment_count' | 'latest_comments';
+
+// One page of the feed, newest first
+export interface FeedPage {
+  posts: PostSummary[];
+  nextCursor: string | null;
+}
+
 export interface PostCreate {
   user: string;
   text: string;
@@ -18,12 +51,34 @@ export interface PostCreate {
 
 @Injectable({ providedIn: 'root' })
 export class PostsService {
-  private api = 'http://localhost:8000/posts';
+  private api = `${API_BASE}/posts`;
 
   constructor(private http: HttpClient) { }
 
-  getAll() {
-    return this.http.get<Post[]>(`${this.api}/`);
+  // Comment counts / previews come with the page instead of one request per post
+  getAll(include: FeedInclude[] = []) {
+    const params = include.length ? { include: include.join(',') } : undefined;
+    return this.http.get<PostSummary[]>(`${this.api}/`, { params });
+  }
+
+  // Keyset-paginated like the comments: pass the nextCursor of the previous page
+  getPage(include: FeedInclude[] = [], cursor: string | null = null, limit?: number) {
+    const params: Record<string, string | number> = {};
+    if (include.length) {
+      params['include'] = include.join(',');
+    }
+    if (cursor) {
+      params['cursor'] = cursor;
+    }
+    if (limit) {
+      params['limit'] = limit;
+    }
+    return this.http
+      .get<PostSummary[]>(`${this.api}/`, { params, observe: 'response' })
+      .pipe(map(r => ({
+        posts: r.body ?? [],
+        nextCursor: r.headers.get('X-Next-Cursor'),
+      }) as FeedPage));
   }
 
   getById(id: number) {
@@ -34,10 +89,21 @@ export class PostsService {
     return this.http.post<Post>(`${this.api}/`, payload);
   }
 
+  // Multipart upload: the image is sent as raw bytes instead of base64 JSON
+  upload(user: string, text: string, image: File | null) {
+    const form = new FormData();
+    form.append('user', user);
+    form.append('text', text);
+    if (image) {
+      form.append('image', image);
+    }
+    return this.http.post<PostSummary>(`${this.api}/upload`, form);
+  }
+
   // Neuer Endpunkt: Erzeuge einen Post mit AI (Backend: POST /posts/generate)
   createWithAI(payload: { user: string; prompt: string; persona?: string; image?: string | null }) {
-    // default to background queueing
-    return this.http.post<Post>(`${this.api}/generate`, payload);
+    // Queued in the background: answers with the job (see JobsService.watch)
+    return this.http.post<Job>(`${this.api}/generate`, payload);
   }
 
 
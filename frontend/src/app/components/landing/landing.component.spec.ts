@@ -1,64 +1,140 @@
 import { describe, it, expect, vi } from 'vitest';
 import { LandingComponent } from './landing.component';
 import { PostsService } from '../../../../services/posts.service';
-import type { Post } from '../../../../services/posts.service';
+import type { PostSummary } from '../../../../services/posts.service';
+import { JobsService } from '../../../../services/jobs.service';
+
+const jobsService = {} as JobsService;
 
 describe('LandingComponent (pure Vitest)', () => {
   it('should load posts via signals', () => {
-    const mockPosts: Post[] = [
+    const mockPosts: PostSummary[] = [
       {
         id: 1,
         text: 'hello',
-        image_thumb: null,
-        image_full: null,
+        image_thumb_url: null,
+        image_full_url: null,
         user: 'u',
         created_at: '2024-01-01T00:00:00Z'
       }
     ];
 
-    const getAllMock = vi.fn().mockReturnValue({
-      subscribe: (fn: any) => fn(mockPosts)
+    const getPageMock = vi.fn().mockReturnValue({
+      subscribe: (fn: any) => fn({ posts: mockPosts, nextCursor: null })
     });
 
-    const postsService = { getAll: getAllMock } as unknown as PostsService;
+    const postsService = { getPage: getPageMock } as unknown as PostsService;
 
-    const comp = new LandingComponent(postsService);
+    const comp = new LandingComponent(postsService, jobsService);
     comp.ngOnInit();
 
     expect(comp.posts()).toEqual(mockPosts);
+    expect(comp.nextCursor()).toBeNull();
+  });
+
+  it('should append the next feed page on load more', () => {
+    const post = (id: number): PostSummary => ({
+      id,
+      text: 'x',
+      user: 'u',
+      image_thumb_url: null,
+      image_full_url: null,
+      created_at: '2024-01-01T00:00:00Z'
+    });
+    const pages: Record<string, any> = {
+      first: { posts: [post(3), post(2)], nextCursor: 'c1' },
+      c1: { posts: [post(1)], nextCursor: null },
+    };
+    const getPageMock = vi.fn().mockImplementation((_include: any, cursor: string | null) => ({
+      subscribe: (fn: any) => fn(pages[cursor ?? 'first'])
+    }));
+    const postsService = { getPage: getPageMock } as unknown as PostsService;
+
+    const comp = new LandingComponent(postsService, jobsService);
+    comp.ngOnInit();
+    expect(comp.nextCursor()).toBe('c1');
+
+    comp.loadMorePosts();
+    expect(getPageMock).toHaveBeenLastCalledWith(['comment_count'], 'c1');
+    expect(comp.posts().map(p => p.id)).toEqual([3, 2, 1]);
+    expect(comp.nextCursor()).toBeNull();
   });
 
-  it('img() should return default placeholder when image_thumb is null', () => {
-    const postsService = { getAll: () => ({ subscribe: () => { } }) } as any;
+  it('img() should return default placeholder when image_thumb_url is null', () => {
+    const postsService = { getPage: () => ({ subscribe: () => { } }) } as any;
 
-    const comp = new LandingComponent(postsService);
+    const comp = new LandingComponent(postsService, jobsService);
 
-    const post: Post = {
+    const post: PostSummary = {
       id: 1,
       text: 'x',
       user: 'u',
-      image_thumb: null,
-      image_full: null,
+      image_thumb_url: null,
+      image_full_url: null,
       created_at: '2024-01-01T00:00:00Z'
     };
 
     expect(comp.img(post)).toBe('default.png');
   });
 
-  it('img() should return base64 data-url when image_thumb exists', () => {
-    const postsService = { getAll: () => ({ subscribe: () => { } }) } as any;
+  it('img() should return the thumbnail URL when image_thumb_url exists', () => {
+    const postsService = { getPage: () => ({ subscribe: () => { } }) } as any;
 
-    const comp = new LandingComponent(postsService);
+    const comp = new LandingComponent(postsService, jobsService);
 
-    const post: Post = {
+    const post: PostSummary = {
       id: 1,
       text: 'x',
       user: 'u',
-      image_thumb: 'AAAA',
-      image_full: null,
+      image_thumb_url: '/posts/1/image/thumb',
+      image_full_url: null,
       created_at: '2024-01-01T00:00:00Z'
     };
 
-    expect(comp.img(post)).toBe('data:image/png;base64,AAAA');
+    expect(comp.img(post)).toBe('http://localhost:8000/posts/1/image/thumb');
+  });
+
+  it('srcset() should list the renditions by width', () => {
+    const postsService = { getPage: () => ({ subscribe: () => { } }) } as any;
+
+    const comp = new LandingComponent(postsService, jobsService);
+
+    const post: PostSummary = {
+      id: 1,
+      text: 'x',
+      user: 'u',
+      image_thumb_url: '/posts/1/image/thumb',
+      image_full_url: null,
+      image_renditions: [
+        { url: '/posts/1/image/thumb?size=160', width: 160, height: 120 },
+        { url: '/posts/1/image/thumb?size=400', width: 400, height: 300 },
+      ],
+      created_at: '2024-01-01T00:00:00Z'
+    };
+
+    expect(comp.srcset(post)).toBe(
+      'http://localhost:8000/posts/1/image/thumb?size=160 160w, http://localhost:8000/posts/1/image/thumb?size=400 400w'
+    );
+  });
+
+  it('should show the AI draft and reload the feed once the job is done', () => {
+    const getPageMock = vi.fn().mockReturnValue({
+      subscribe: (fn: any) => fn({ posts: [], nextCursor: null })
+    });
+    const postsService = { getPage: getPageMock } as unknown as PostsService;
+    let emit: (event: any) => void = () => { };
+    const watchMock = vi.fn().mockReturnValue({
+      subscribe: (handlers: any) => { emit = handlers.next; }
+    });
+    const comp = new LandingComponent(postsService, { watch: watchMock } as unknown as JobsService);
+
+    comp.followJob({ id: 'j1' } as any);
+    expect(watchMock).toHaveBeenCalledWith('j1');
+    emit({ type: 'text', text: 'Cats ar' });
+    expect(comp.aiDraft()).toBe('Cats ar');
+
+    emit({ type: 'done', text: 'Cats are great', post_id: 3, comment_id: null });
+    expect(comp.aiDraft()).toBeNull();
+    expect(getPageMock).toHaveBeenCalled();
   });
 });
@@ -1,7 +1,8 @@
 import { Component, signal } from '@angular/core';
 import { FormsModule } from '@angular/forms';
 import { RouterLink } from '@angular/router';
-import { PostsService, PostCreate, Post } from '../../../../services/posts.service';
+import { API_BASE, PostsService, PostSummary } from '../../../../services/posts.service';
+import { Job, JobsService } from '../../../../services/jobs.service';
 import { NgIconsModule } from '@ng-icons/core';
 
 @Component({
@@ -12,45 +13,53 @@ import { NgIconsModule } from '@ng-icons/core';
 })
 export class LandingComponent {
 
-  posts = signal<Post[]>([]);
+  posts = signal<PostSummary[]>([]);
+  nextCursor = signal<string | null>(null);  // null: all posts loaded
 
   // new post form fields
   user = '';
   text = '';
-  imageBase64: string | null = null;
+  imageFile: File | null = null;
+  imageBase64: string | null = null;  // AI posts still send the image as JSON
   persona = 'neutral';
   prompt = '';  // AI Post prompt field
+  aiDraft = signal<string | null>(null);  // text of the AI post while it is generated
 
-  constructor(private postsService: PostsService) { }
+  constructor(private postsService: PostsService, private jobsService: JobsService) { }
 
   ngOnInit() {
     this.loadPosts();
   }
 
   loadPosts() {
-    this.postsService.getAll().subscribe(p => this.posts.set(p));
+    this.postsService.getPage(['comment_count']).subscribe(page => {
+      this.posts.set(page.posts);
+      this.nextCursor.set(page.nextCursor);
+    });
+  }
 
+  loadMorePosts() {
+    this.postsService.getPage(['comment_count'], this.nextCursor()).subscribe(page => {
+      this.posts.update(p => [...p, ...page.posts]);
+      this.nextCursor.set(page.nextCursor);
+    });
   }
 
   onImage(event: any) {
     const file = event.target.files?.[0];
     if (!file) return;
 
+    this.imageFile = file;
     const reader = new FileReader();
     reader.onload = () => this.imageBase64 = reader.result as string;
     reader.readAsDataURL(file);
   }
 
   submitPost() {
-    const payload: PostCreate = {
-      user: this.user,
-      text: this.text,
-      image: this.imageBase64,
-    };
-
-    this.postsService.create(payload).subscribe(() => {
+    this.postsService.upload(this.user, this.text, this.imageFile).subscribe(() => {
       this.user = '';
       this.text = '';
+      this.imageFile = null;
       this.imageBase64 = null;
       this.loadPosts(); // refresh
     });
@@ -68,28 +77,57 @@ export class LandingComponent {
     };
 
     this.postsService.createWithAI(payload).subscribe({
-      next: () => {
+      next: (job) => {
         this.user = '';
         this.text = '';
+        this.imageFile = null;
         this.imageBase64 = null;
         this.persona = 'neutral';
-        this.loadPosts();
+        this.followJob(job);
       },
       error: (err) => console.error('AI post failed', err),
     });
   }
 
+  // Shows the draft as it is generated and reloads the feed once the post exists
+  followJob(job: Job) {
+    this.aiDraft.set('');
+    this.jobsService.watch(job.id).subscribe({
+      next: (event) => {
+        if (event.type === 'text') {
+          this.aiDraft.set(event.text);
+        } else if (event.type === 'done') {
+          this.aiDraft.set(null);
+          this.loadPosts();
+        }
+      },
+      error: (err) => {
+        this.aiDraft.set(null);
+        console.error('AI post failed', err);
+      },
+    });
+  }
+
   deletePost(id: number) {
     this.postsService.delete(id).subscribe(() => {
       this.loadPosts();
     });
   }
 
-  img(post: Post): string {
-    if (post.image_thumb) {
-      return 'data:image/png;base64,' + post.image_thumb;
+  img(post: PostSummary): string {
+    if (post.image_thumb_url) {
+      return API_BASE + post.image_thumb_url;
     }
     return 'default.png';
   }
 
+  // Lets the browser pick the smallest rendition that fits the layout
+  srcset(post: PostSummary): string | null {
+    const renditions = post.image_renditions ?? [];
+    if (renditions.length === 0) {
+      return null;
+    }
+    return renditions.map(r => `${API_BASE}${r.url} ${r.width}w`).join(', ');
+  }
+
 }
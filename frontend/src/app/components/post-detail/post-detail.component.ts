@@ -5,6 +5,7 @@ import { PostsService } from '../../../../services/posts.service';
 import { CommentsService } from '../../../../services/comments.service';
 import { Post } from '../../../../services/posts.service';
 import { CommentCreate, Comment } from '../../../../services/comments.service';
+import { JobsService } from '../../../../services/jobs.service';
 import { NgIconsModule } from '@ng-icons/core';
 
 @Component({
@@ -17,16 +18,19 @@ export class PostDetailComponent {
 
   post = signal<Post | null>(null);
   comments = signal<Comment[]>([]);
+  nextCommentsCursor = signal<string | null>(null);  // null: all comments loaded
 
   postId!: number;
   newUser = '';
   newText = '';
   commentPersona = 'neutral'; // falls das Template später darauf zugreift
   aiCommentUser = 'AI User';  // Standard-Wert für AI-Kommentar-Benutzer
+  aiDraft = signal<string | null>(null);  // Text des AI-Kommentars, während er entsteht
 
   private route = inject(ActivatedRoute);
   private postsService = inject(PostsService);
   private commentsService = inject(CommentsService);
+  private jobsService = inject(JobsService);
 
   ngOnInit() {
     this.postId = Number(this.route.snapshot.paramMap.get('id'));
@@ -40,7 +44,17 @@ export class PostDetailComponent {
   }
 
   loadComments(postId: number) {
-    this.commentsService.getForPost(postId).subscribe(c => this.comments.set(c));
+    this.commentsService.getPage(postId).subscribe(page => {
+      this.comments.set(page.comments);
+      this.nextCommentsCursor.set(page.nextCursor);
+    });
+  }
+
+  loadMoreComments() {
+    this.commentsService.getPage(this.postId, this.nextCommentsCursor()).subscribe(page => {
+      this.comments.update(c => [...c, ...page.comments]);
+      this.nextCommentsCursor.set(page.nextCursor);
+    });
   }
 
   submitComment() {
@@ -64,11 +78,25 @@ export class PostDetailComponent {
     };
 
     this.commentsService.createCommentWithAI(this.postId, payload).subscribe({
-      next: () => {
-        // Reset lokale Felder und lade Kommentare neu
+      next: (job) => {
+        // Reset lokale Felder; Kommentare neu laden, sobald der Job fertig ist
         this.aiCommentUser = 'AI User';  // Reset auf Standard-Wert
         this.commentPersona = 'neutral';
-        this.loadComments(this.postId);
+        this.aiDraft.set('');
+        this.jobsService.watch(job.id).subscribe({
+          next: (event) => {
+            if (event.type === 'text') {
+              this.aiDraft.set(event.text);
+            } else if (event.type === 'done') {
+              this.aiDraft.set(null);
+              this.loadComments(this.postId);
+            }
+          },
+          error: (err: any) => {
+            this.aiDraft.set(null);
+            console.error('AI comment failed', err);
+          },
+        });
       },
       error: (err: any) => console.error('AI comment failed', err),
     });
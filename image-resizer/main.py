@@ -1,70 +1,233 @@
-import io
 import json
+import os
+import random
 import time
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from dataclasses import dataclass, field
 
 import pika
-from models import Post
 from pika.exceptions import AMQPError
-from PIL import Image
-from sqlmodel import Session, create_engine, select
-
-RABBIT_HOST = "rabbitmq"
+from sqlalchemy.exc import OperationalError
+from sqlmodel import Session
+
+# Shared with the backend: same tuned engine (WAL, busy timeout), blob store,
+# models and the rendition routine (importable, so it can run in worker
+# processes)
+from backend.blobstore import BlobNotFound, BlobStore, blob_store
+from backend.database import engine
+from backend.feed_cache import bump_version
+from backend.images import make_renditions
+from backend.messaging import declare_queues
+from backend.models import PostImage
+
+RABBIT_HOST = os.environ.get("RABBIT_HOST", "rabbitmq")
 QUEUE = "image.resize"
-DB_URL = "sqlite:///sqlite/social.db"
-
-engine = create_engine(DB_URL, echo=False)
-
-
-def process_message(ch, method, properties, body):
-    payload = json.loads(body)
-    post_id: int = payload["post_id"]
 
-    with Session(engine) as session:
-        post = session.exec(select(Post).where(Post.id == post_id)).first()
-
-        if post is None or post.image_full is None:
+# Processes decoding / resizing images; defaults to one per core
+RESIZER_WORKERS = int(os.environ.get("RESIZER_WORKERS", str(os.cpu_count() or 1)))
+# Unacked messages the broker hands us at once; keeps every worker busy while
+# the previous batch is being committed
+RESIZER_PREFETCH = int(os.environ.get("RESIZER_PREFETCH", str(RESIZER_WORKERS * 4)))
+# Images rendered per transaction, and how long a finished image may
+# wait for the batch to fill up
+RESIZER_BATCH_SIZE = int(os.environ.get("RESIZER_BATCH_SIZE", "32"))
+RESIZER_BATCH_TIMEOUT = float(os.environ.get("RESIZER_BATCH_TIMEOUT", "0.2"))
+RESIZER_POLL_INTERVAL = 0.05
+# Tries of a batch commit on transient failures (database locked or down,
+# blob store I/O) before its jobs are parked, and the first backoff in seconds
+RESIZER_COMMIT_ATTEMPTS = int(os.environ.get("RESIZER_COMMIT_ATTEMPTS", "3"))
+RESIZER_RETRY_BASE_DELAY = float(os.environ.get("RESIZER_RETRY_BASE_DELAY", "0.5"))
+
+
+@dataclass
+class ResizeJob:
+    delivery_tag: int
+    post_id: int
+    future: Future
+    finished_at: float | None = field(default=None)
+
+
+class ResizeWorker:
+    """
+    Renders the images of the image.resize queue in an executor (every size
+    and format of backend.images.RENDITION_SIZES / RENDITION_FORMATS) and
+    commits the renditions in batches.
+
+    Messages are acked only once their renditions are committed, so a crash
+    before the commit leads to a redelivery instead of a lost job. A commit
+    that fails transiently is retried with exponential backoff and jitter.
+    Images PIL cannot decode, malformed messages and batches whose commit
+    keeps failing are rejected to the dead-letter exchange (parked, see
+    backend.replay_parked) and logged.
+    """
+
+    def __init__(
+        self,
+        executor: Executor,
+        session_factory=lambda: Session(engine),
+        batch_size: int = RESIZER_BATCH_SIZE,
+        batch_timeout: float = RESIZER_BATCH_TIMEOUT,
+        store: BlobStore = blob_store,
+        commit_attempts: int = RESIZER_COMMIT_ATTEMPTS,
+        retry_base_delay: float = RESIZER_RETRY_BASE_DELAY,
+    ):
+        self.executor = executor
+        self.session_factory = session_factory
+        self.store = store
+        self.batch_size = batch_size
+        self.batch_timeout = batch_timeout
+        self.commit_attempts = commit_attempts
+        self.retry_base_delay = retry_base_delay
+        self.channel = None
+        self.pending: list[ResizeJob] = []
+
+    def attach(self, channel) -> None:
+        # Unacked deliveries of a previous channel are redelivered by the broker
+        self.channel = channel
+        self.pending = []
+
+    def on_message(self, ch, method, properties, body) -> None:
+        try:
+            post_id = int(json.loads(body)["post_id"])
+        except (ValueError, KeyError, TypeError):
+            print(f"[image-resizer] rejecting malformed message: {body!r}")
+            ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
             return
 
-        img = Image.open(io.BytesIO(post.image_full))
-        img.thumbnail((400, 400))
-
-        buf = io.BytesIO()
-        img.save(buf, format="PNG")
-
-        post.image_thumb = buf.getvalue()
-        session.add(post)
-        session.commit()
+        with self.session_factory() as session:
+            full = session.get(PostImage, (post_id, "full"))
+            blob_hash = full.blob_hash if full is not None else None
 
+        try:
+            data = self.store.get(blob_hash) if blob_hash is not None else None
+        except BlobNotFound:
+            data = None
+        if data is None:
+            # Post (or its image) deleted in the meantime: nothing to do
+            ch.basic_ack(delivery_tag=method.delivery_tag)
+            return
 
-def consume():
+        future = self.executor.submit(make_renditions, data)
+        self.pending.append(ResizeJob(method.delivery_tag, post_id, future))
+
+    def flush(self, force: bool = False) -> int:
+        """
+        Commit the renditions that are ready, if the batch is full, has waited
+        long enough, or nothing else is in flight. Returns the committed count.
+        """
+        now = time.monotonic()
+        finished = []
+        for job in self.pending:
+            if job.future.done():
+                if job.finished_at is None:
+                    job.finished_at = now
+                finished.append(job)
+        if not finished:
+            return 0
+
+        oldest = min(job.finished_at for job in finished)
+        if not (
+            force
+            or len(finished) >= self.batch_size
+            or len(finished) == len(self.pending)
+            or now - oldest >= self.batch_timeout
+        ):
+            return 0
+
+        done, failed = [], []
+        for job in finished:
+            try:
+                done.append((job, job.future.result()))
+            except Exception as e:
+                print(f"[image-resizer] cannot resize image of post {job.post_id}: {e!r}")
+                failed.append(job)
+
+        if done and not self._commit(done):
+            failed += [job for job, _ in done]
+            done = []
+
+        for job, _ in done:
+            self.channel.basic_ack(delivery_tag=job.delivery_tag)
+        for job in failed:
+            self.channel.basic_nack(delivery_tag=job.delivery_tag, requeue=False)
+
+        finished_ids = {id(job) for job in finished}
+        self.pending = [job for job in self.pending if id(job) not in finished_ids]
+        return len(done)
+
+    def _commit(self, done: list) -> bool:
+        for attempt in range(self.commit_attempts):
+            try:
+                with self.session_factory() as session:
+                    for job, renditions in done:
+                        for r in renditions:
+                            # Blob first: a committed row always has its bytes
+                            session.merge(
+                                PostImage(
+                                    post_id=job.post_id,
+                                    variant=r.variant,
+                                    blob_hash=self.store.put(r.data),
+                                    size=len(r.data),
+                                    width=r.width,
+                                    height=r.height,
+                                    content_type=r.content_type,
+                                )
+                            )
+                    # New renditions: cached feed pages and posts are stale
+                    bump_version(session)
+                    session.commit()
+                return True
+            except (OperationalError, OSError) as e:
+                if attempt == self.commit_attempts - 1:
+                    print(f"[image-resizer] giving up on a batch of {len(done)}: {e!r}")
+                    return False
+                # Exponential backoff with full jitter
+                delay = random.uniform(0, self.retry_base_delay * 2**attempt)
+                print(f"[image-resizer] commit failed: {e!r}, retrying in {delay:.2f}s")
+                time.sleep(delay)
+        return False
+
+    def drain(self) -> None:
+        """Wait for every job in flight and commit them."""
+        for job in self.pending:
+            job.future.exception()
+        self.flush(force=True)
+
+
+def consume(worker: ResizeWorker):
     connection = pika.BlockingConnection(pika.ConnectionParameters(host=RABBIT_HOST))
     channel = connection.channel()
 
-    channel.queue_declare(queue=QUEUE, durable=True)
-    channel.basic_consume(
-        queue=QUEUE,
-        on_message_callback=process_message,
-        auto_ack=True,
-    )
+    declare_queues(channel, (QUEUE,))
+    channel.basic_qos(prefetch_count=RESIZER_PREFETCH)
+    worker.attach(channel)
+    channel.basic_consume(queue=QUEUE, on_message_callback=worker.on_message)
 
-    print("[image-resizer] waiting for resize jobs")
-    channel.start_consuming()
+    print(
+        f"[image-resizer] waiting for resize jobs "
+        f"({RESIZER_WORKERS} workers, prefetch {RESIZER_PREFETCH})"
+    )
+    while True:
+        connection.process_data_events(time_limit=RESIZER_POLL_INTERVAL)
+        worker.flush()
 
 
 def main():
     original_delay = 0.5
     retry_delay = original_delay
-    while True:
-        try:
-            consume()
-            retry_delay = original_delay
-        except AMQPError as e:
-            print(f"[image-resizer] connection lost: {e}, retrying in {retry_delay} seconds.")
-            time.sleep(retry_delay)
-            retry_delay = retry_delay * 2 - original_delay / 2
-            if retry_delay > 60:
-                print("[image-resizer] giving up on connection retry. Abort service.")
-                break
+    with ProcessPoolExecutor(max_workers=RESIZER_WORKERS) as pool:
+        worker = ResizeWorker(pool)
+        while True:
+            try:
+                consume(worker)
+                retry_delay = original_delay
+            except AMQPError as e:
+                print(f"[image-resizer] connection lost: {e}, retrying in {retry_delay} seconds.")
+                time.sleep(retry_delay)
+                retry_delay = retry_delay * 2 - original_delay / 2
+                if retry_delay > 60:
+                    print("[image-resizer] giving up on connection retry. Abort service.")
+                    break
 
 
 if __name__ == "__main__":
@@ -1,109 +1,370 @@
+"""
+AI post / comment generation worker.
+
+Runs on asyncio: messages of posts.generate and comments.generate are
+processed concurrently (up to AI_CONCURRENCY at once), with the broker
+prefetch set to the same number, so a slow completion no longer stalls the
+queue. Mistral calls share a token-bucket rate limiter sized to the
+account's quota, and all HTTP traffic goes through one pooled keep-alive
+client. pika's AsyncioConnection runs the AMQP side on the same event loop.
+
+Transient failures (429, 5xx, timeouts) of the Mistral call and of the
+backend request are retried separately with exponential backoff and jitter.
+Jobs that still fail, or fail permanently, are rejected to the dead-letter
+exchange and wait in the parked queue (`python -m backend.replay_parked`
+puts them back).
+
+Progress goes to the job of the message (`job_id`, see GET /jobs/{id} of
+the backend): "running", the text generated so far while the completion
+streams in, and "failed" when the worker gives up. The created post or
+comment carries the job id, which completes the job.
+"""
+
+import asyncio
+import functools
 import json
 import os
 import time
 import traceback
 
+import httpx
 import pika
-import requests
+from errors import GenerationError, PermanentError, checked_post, checked_request
+from generation_cache import create_generation_cache
+from pika.adapters.asyncio_connection import AsyncioConnection
+from pika.exceptions import AMQPConnectionError
+from rate_limit import RateLimiter
+from retry import with_retries
 from text_generator_mistral import MistralTextGenerator
 
 RABBIT_HOST = os.environ.get("RABBIT_HOST", "localhost")
-BACKEND_URL = os.environ.get("BACKEND_URL", "http://localhost:8000")
+BACKEND_URL = os.environ.get("BACKEND_URL", "http://localhost:8000").strip()
 
 QUEUE_POSTS = "posts.generate"
 QUEUE_COMMENTS = "comments.generate"
+# Same topology as backend.messaging (dead-lettering is a broker policy, so
+# the job queues are declared without arguments)
+DEAD_LETTER_EXCHANGE = "jobs.dead-letter"
+PARKED_QUEUE = "jobs.parked"
+
+# Generation jobs in flight at once; the prefetch (unacked messages the broker
+# hands out, shared by both queues) matches it by default
+AI_CONCURRENCY = int(os.environ.get("AI_CONCURRENCY", "8"))
+AI_PREFETCH = int(os.environ.get("AI_PREFETCH", str(AI_CONCURRENCY)))
+# Provider quota, defaults of Mistral's free tier; 0 disables a limit
+MISTRAL_REQUESTS_PER_SECOND = float(os.environ.get("MISTRAL_REQUESTS_PER_SECOND", "1"))
+MISTRAL_BURST = float(os.environ.get("MISTRAL_BURST", "1"))
+MISTRAL_TOKENS_PER_MINUTE = float(os.environ.get("MISTRAL_TOKENS_PER_MINUTE", "500000"))
+BACKEND_TIMEOUT = 30
+# Seconds between two reports of the partial text of a job
+JOB_PROGRESS_INTERVAL = float(os.environ.get("JOB_PROGRESS_INTERVAL", "0.5"))
+# Tries per call (Mistral, backend) on transient failures, and the backoff
+# bounds in seconds
+AI_RETRY_ATTEMPTS = int(os.environ.get("AI_RETRY_ATTEMPTS", "5"))
+AI_RETRY_BASE_DELAY = float(os.environ.get("AI_RETRY_BASE_DELAY", "1"))
+AI_RETRY_MAX_DELAY = float(os.environ.get("AI_RETRY_MAX_DELAY", "30"))
+# Generation cache: "off", "memory" or "sqlite" (file AI_CACHE_PATH); a key
+# answers from the cache once it holds AI_CACHE_VARIANTS texts
+AI_CACHE = os.environ.get("AI_CACHE", "off")
+AI_CACHE_TTL = float(os.environ.get("AI_CACHE_TTL", "3600"))
+AI_CACHE_MAX_KEYS = int(os.environ.get("AI_CACHE_MAX_KEYS", "1000"))
+AI_CACHE_VARIANTS = int(os.environ.get("AI_CACHE_VARIANTS", "3"))
+AI_CACHE_PATH = os.environ.get("AI_CACHE_PATH", "generation_cache.sqlite3")
+# "mistral" (API) or "local" (HF model, needs the local-model image); the
+# local engine micro-batches concurrent prompts unless LOCAL_MODEL_BATCHING=0
+AI_ENGINE = os.environ.get("AI_ENGINE", "mistral")
+LOCAL_MODEL_BATCHING = os.environ.get("LOCAL_MODEL_BATCHING", "1") == "1"
+
+
+def http_client(concurrency: int = AI_CONCURRENCY) -> httpx.AsyncClient:
+    """Keep-alive connection pool shared by every job, sized for both hosts."""
+    limits = httpx.Limits(
+        max_connections=2 * concurrency, max_keepalive_connections=2 * concurrency
+    )
+    return httpx.AsyncClient(limits=limits, timeout=BACKEND_TIMEOUT)
+
 
-# Importiere erst nach Verfügbarkeit aller ML-Dependencies
-print("[post-generator] Starting consumer before imports", flush=True)
+class GenerationWorker:
+    """
+    Generates the text of one message and posts it to the backend. handle()
+    returns whether the message is done (ack) or failed (reject); at most
+    `concurrency` messages are worked on at the same time.
+    """
 
+    def __init__(
+        self,
+        text_gen,
+        client: httpx.AsyncClient,
+        backend_url: str = BACKEND_URL,
+        concurrency: int = AI_CONCURRENCY,
+        retry_attempts: int = AI_RETRY_ATTEMPTS,
+        retry_base_delay: float = AI_RETRY_BASE_DELAY,
+        retry_max_delay: float = AI_RETRY_MAX_DELAY,
+        progress_interval: float = JOB_PROGRESS_INTERVAL,
+    ):
+        self.text_gen = text_gen
+        self.client = client
+        self.backend_url = backend_url
+        self.slots = asyncio.Semaphore(concurrency)
+        self.retry = (retry_attempts, retry_base_delay, retry_max_delay)
+        self.progress_interval = progress_interval
+        self.handlers = {QUEUE_POSTS: self.process_post, QUEUE_COMMENTS: self.process_comment}
 
-text_gen = MistralTextGenerator()
+    async def handle(self, queue: str, body: bytes) -> bool:
+        async with self.slots:
+            job_id = None
+            try:
+                try:
+                    msg = json.loads(body)
+                except ValueError:
+                    raise PermanentError(f"malformed message: {body[:200]!r}")
+                job_id = msg.get("job_id")
+                await self.handlers[queue](msg)
+                return True
+            except GenerationError as e:
+                print(f"[post-generator] Giving up on {queue} message: {e}", flush=True)
+                await self._report(job_id, {"status": "failed", "error": str(e)})
+                return False
+            except Exception as e:
+                print(f"[post-generator] Error processing {queue} message:", e)
+                traceback.print_exc()
+                await self._report(job_id, {"status": "failed", "error": "internal error"})
+                return False
 
+    async def _report(self, job_id: str | None, update: dict) -> None:
+        """Best effort: a lost progress report must not fail the job itself."""
+        if not job_id:
+            return
+        try:
+            await checked_request(
+                self.client, "backend", "PATCH", f"{self.backend_url}/jobs/{job_id}", json=update
+            )
+        except GenerationError as e:
+            print(f"[post-generator] Could not report progress of job {job_id}: {e}", flush=True)
+
+    def _progress(self, job_id: str | None):
+        """on_text callback of a generation: reports the text, at most every progress_interval."""
+        if not job_id:
+            return None
+        last_report = float("-inf")
+
+        async def on_text(text: str) -> None:
+            nonlocal last_report
+            now = time.monotonic()
+            if now - last_report >= self.progress_interval:
+                last_report = now
+                await self._report(job_id, {"status": "running", "text": text})
+
+        return on_text
 
-def process_post(ch, method, properties, body):
-    try:
-        msg = json.loads(body)
+    async def _generate(self, prompt: str, persona: str, job_id: str | None = None) -> str:
+        await self._report(job_id, {"status": "running"})
+        on_text = self._progress(job_id)
+        return await with_retries(
+            lambda: self.text_gen.generate_text(
+                additional_prompt=prompt, persona=persona, on_text=on_text
+            ),
+            *self.retry,
+            what="generation",
+        )
+
+    async def _publish(self, path: str, payload: dict) -> None:
+        # Only reached with generated text: failed generations raise before
+        await with_retries(
+            lambda: checked_post(self.client, "backend", f"{self.backend_url}{path}", json=payload),
+            *self.retry,
+            what=f"POST {path}",
+        )
+
+    async def process_post(self, msg: dict) -> None:
         user = msg.get("user", "AI User")
         prompt = msg.get("prompt", "")
         persona = msg.get("persona", "neutral")
         image = msg.get("image")
+        job_id = msg.get("job_id")
 
         print(f"[post-generator] Generating post for user={user} persona={persona}")
-        text = text_gen.generate_text(additional_prompt=prompt, persona=persona)
+        text = await self._generate(prompt, persona, job_id)
 
         payload = {"user": user, "text": text, "image": image}
-        resp = requests.post(f"{BACKEND_URL}/posts/", json=payload, timeout=30)
-        resp.raise_for_status()
-
-        ch.basic_ack(delivery_tag=method.delivery_tag)
+        # With its job id, a redelivered job gets the post of its first run
+        # back instead of creating another one
+        if job_id:
+            payload["job_id"] = job_id
+        await self._publish("/posts/", payload)
         print("[post-generator] Post created")
-    except Exception as e:
-        print("[post-generator] Error processing post:", e)
-        traceback.print_exc()
-        try:
-            ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
-        except Exception:
-            pass
 
-
-def process_comment(ch, method, properties, body):
-    try:
-        msg = json.loads(body)
+    async def process_comment(self, msg: dict) -> None:
         post_text = msg.get("post_text")
         post_id = msg.get("post_id")
         user = msg.get("user", "AI User")
         persona = msg.get("persona", "neutral")
+        job_id = msg.get("job_id")
 
-        if not post_text:
-            raise ValueError("missing post_text in message")
+        if not post_text or post_id is None:
+            raise PermanentError("missing post_text or post_id in message")
 
         print(f"[post-generator] Generating comment for post with persona={persona}")
-        text = text_gen.generate_text(additional_prompt=post_text, persona=persona)
+        text = await self._generate(post_text, persona, job_id)
 
         payload = {"user": user, "text": text}
-        resp = requests.post(f"{BACKEND_URL}/posts/{post_id}/comments", json=payload, timeout=30)
-        resp.raise_for_status()
-
-        ch.basic_ack(delivery_tag=method.delivery_tag)
+        if job_id:
+            payload["job_id"] = job_id
+        await self._publish(f"/posts/{post_id}/comments", payload)
         print("[post-generator] Comment created")
-    except Exception as e:
-        print("[post-generator] Error processing comment:", e)
-        traceback.print_exc()
+
+
+def _settle(future: asyncio.Future, error: Exception | None = None, result=None) -> None:
+    if future.done():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
+def _connection_error(reason) -> Exception:
+    return reason if isinstance(reason, Exception) else AMQPConnectionError(reason)
+
+
+class AmqpConsumer:
+    """
+    Feeds deliveries of both queues into a GenerationWorker, one task per
+    message, and acks / rejects them when the task is done. run() returns
+    only by raising once the connection or channel is lost.
+    """
+
+    def __init__(self, worker: GenerationWorker, prefetch: int = AI_PREFETCH):
+        self.worker = worker
+        self.prefetch = prefetch
+        self.tasks: set[asyncio.Task] = set()
+        self._closed: asyncio.Future | None = None
+
+    async def _call(self, start) -> object:
+        """
+        Await a pika operation that reports completion through a callback;
+        raises instead if the connection goes away in the meantime.
+        """
+        done = asyncio.get_running_loop().create_future()
+        start(lambda result: _settle(done, result=result))
+        await asyncio.wait([done, self._closed], return_when=asyncio.FIRST_COMPLETED)
+        if not done.done():
+            done.cancel()
+            return self._closed.result()  # raises the close reason
+        return done.result()
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        opened = loop.create_future()
+        closed = self._closed = loop.create_future()
+        connection = AsyncioConnection(
+            pika.ConnectionParameters(host=RABBIT_HOST),
+            on_open_callback=lambda conn: _settle(opened, result=conn),
+            on_open_error_callback=lambda _, e: _settle(opened, _connection_error(e)),
+            on_close_callback=lambda _, reason: _settle(closed, _connection_error(reason)),
+            custom_ioloop=loop,
+        )
+        await opened
         try:
-            ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
-        except Exception:
-            pass
+            channel = await self._call(lambda cb: connection.channel(on_open_callback=cb))
+            channel.add_on_close_callback(
+                lambda _, reason: _settle(closed, _connection_error(reason))
+            )
+            await self._call(
+                lambda cb: channel.exchange_declare(
+                    DEAD_LETTER_EXCHANGE, exchange_type="fanout", durable=True, callback=cb
+                )
+            )
+            await self._call(
+                lambda cb: channel.queue_declare(PARKED_QUEUE, durable=True, callback=cb)
+            )
+            await self._call(
+                lambda cb: channel.queue_bind(PARKED_QUEUE, DEAD_LETTER_EXCHANGE, callback=cb)
+            )
+            for queue in self.worker.handlers:
+                await self._call(
+                    lambda cb, queue=queue: channel.queue_declare(queue, durable=True, callback=cb)
+                )
+            # global: one limit for the channel, i.e. for both queues together
+            await self._call(
+                lambda cb: channel.basic_qos(
+                    prefetch_count=self.prefetch, global_qos=True, callback=cb
+                )
+            )
+            for queue in self.worker.handlers:
+                channel.basic_consume(
+                    queue, on_message_callback=functools.partial(self.on_message, queue)
+                )
+
+            print(
+                f"[post-generator] Waiting for messages "
+                f"(engine {AI_ENGINE}, prefetch {self.prefetch})...",
+                flush=True,
+            )
+            await closed
+        finally:
+            if connection.is_open:
+                connection.close()
 
+    def on_message(self, queue, channel, method, properties, body) -> None:
+        task = asyncio.ensure_future(self._process(queue, channel, method.delivery_tag, body))
+        # Keep a reference until the task is done, asyncio only holds weak ones
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
 
-def consume():
-    connection = pika.BlockingConnection(pika.ConnectionParameters(host=RABBIT_HOST))
-    channel = connection.channel()
+    async def _process(self, queue, channel, delivery_tag, body) -> None:
+        ok = await self.worker.handle(queue, body)
+        if not channel.is_open:
+            # Unacked deliveries of a closed channel are redelivered
+            return
+        if ok:
+            channel.basic_ack(delivery_tag=delivery_tag)
+        else:
+            # Dead-lettered to the parked queue
+            channel.basic_nack(delivery_tag=delivery_tag, requeue=False)
 
-    channel.queue_declare(queue=QUEUE_POSTS, durable=True)
-    channel.queue_declare(queue=QUEUE_COMMENTS, durable=True)
 
-    channel.basic_consume(queue=QUEUE_POSTS, on_message_callback=process_post, auto_ack=False)
-    channel.basic_consume(queue=QUEUE_COMMENTS, on_message_callback=process_comment, auto_ack=False)
+def create_text_generator(client: httpx.AsyncClient, cache):
+    if AI_ENGINE == "local":
+        # transformers / torch are only installed in the local-model image
+        from text_generator_local_model_unused import (
+            BatchingTextGenerator,
+            TextGenerator,
+        )
 
-    print("[post-generator] Waiting for messages...", flush=True)
-    channel.start_consuming()
+        if LOCAL_MODEL_BATCHING:
+            return BatchingTextGenerator(TextGenerator(cache=cache))
+        return BatchingTextGenerator(TextGenerator(cache=cache), max_batch_size=1)
+    if AI_ENGINE == "mistral":
+        limiter = RateLimiter(MISTRAL_REQUESTS_PER_SECOND, MISTRAL_BURST, MISTRAL_TOKENS_PER_MINUTE)
+        return MistralTextGenerator(client, limiter, cache=cache)
+    raise ValueError(f"unknown AI_ENGINE: {AI_ENGINE!r}")
+
+
+async def serve():
+    cache = create_generation_cache(
+        AI_CACHE, AI_CACHE_TTL, AI_CACHE_MAX_KEYS, AI_CACHE_VARIANTS, AI_CACHE_PATH
+    )
+    async with http_client() as client:
+        worker = GenerationWorker(create_text_generator(client, cache), client)
+        retry_delay = 1
+        while True:
+            try:
+                print(f"[post-generator] Connecting to RabbitMQ at {RABBIT_HOST}...", flush=True)
+                await AmqpConsumer(worker).run()
+                retry_delay = 1
+            except Exception as e:
+                print(
+                    f"[post-generator] Connection lost: {e}, retrying in {retry_delay}s", flush=True
+                )
+                await asyncio.sleep(retry_delay)
+                retry_delay = min(retry_delay * 2, 60)
 
 
 def main():
-    retry_delay = 1
-    while True:
-        try:
-            print(f"[post-generator] Connecting to RabbitMQ at {RABBIT_HOST}...", flush=True)
-            consume()
-            retry_delay = 1
-        except Exception as e:
-            print(f"[post-generator] Connection lost: {e}, retrying in {retry_delay}s", flush=True)
-            time.sleep(retry_delay)
-            retry_delay = min(retry_delay * 2, 60)
+    asyncio.run(serve())
 
 
 if __name__ == "__main__":
     print("[post-generator] Starting consumer...", flush=True)
     main()
-
-print("[post-generator] Starting consumer outside of main...", flush=True)
@@ -0,0 +1,72 @@
+from contextlib import asynccontextmanager
+
+import httpx
+
+
+class GenerationError(Exception):
+    """A generation job that could not be completed."""
+
+
+class TransientError(GenerationError):
+    """
+    Failure worth retrying: rate limited (429), server errors (5xx), timeouts
+    and connection errors. `retry_after` is the server's hint in seconds.
+    """
+
+    def __init__(self, message: str, retry_after: float | None = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class PermanentError(GenerationError):
+    """Retrying cannot help: malformed message, rejected request or unusable answer."""
+
+
+def _retry_after(response: httpx.Response) -> float | None:
+    try:
+        return max(0.0, float(response.headers["Retry-After"]))
+    except (KeyError, ValueError):
+        # Missing, or an HTTP date: fall back to our own backoff
+        return None
+
+
+def check_status(service: str, response: httpx.Response) -> None:
+    status = response.status_code
+    if status == 429 or status >= 500:
+        raise TransientError(f"{service} answered {status}", _retry_after(response))
+    if status >= 400:
+        raise PermanentError(f"{service} answered {status}: {response.text[:200]}")
+
+
+async def checked_request(client: httpx.AsyncClient, service: str, method: str, url: str, **kwargs):
+    """Request through `client`, raising a typed error for anything but a 2xx/3xx answer."""
+    try:
+        response = await client.request(method, url, **kwargs)
+    except httpx.TimeoutException as e:
+        raise TransientError(f"{service} timed out: {e!r}")
+    except httpx.TransportError as e:
+        raise TransientError(f"{service} unreachable: {e!r}")
+    check_status(service, response)
+    return response
+
+
+async def checked_post(client: httpx.AsyncClient, service: str, url: str, **kwargs):
+    return await checked_request(client, service, "POST", url, **kwargs)
+
+
+@asynccontextmanager
+async def checked_stream(client: httpx.AsyncClient, service: str, method: str, url: str, **kwargs):
+    """
+    checked_request for a streamed answer: yields the response once its
+    status is checked; network errors while reading the body are typed too.
+    """
+    try:
+        async with client.stream(method, url, **kwargs) as response:
+            if response.status_code >= 400:
+                await response.aread()
+            check_status(service, response)
+            yield response
+    except httpx.TimeoutException as e:
+        raise TransientError(f"{service} timed out: {e!r}")
+    except httpx.TransportError as e:
+        raise TransientError(f"{service} unreachable: {e!r}")
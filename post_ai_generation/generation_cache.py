@@ -0,0 +1,164 @@
+"""
+Cache of generated texts, keyed by model, persona and prompt (the post
+prompt, or the post text for comments), so repeated jobs skip the LLM.
+
+A key keeps up to `variants` texts. Lookups miss until that many were
+generated and then answer with a random one of them, so a popular prompt
+still gets varied posts. Entries expire after `ttl` seconds and at most
+`max_keys` keys are kept (least recently used go first). Two backends: in
+process memory, or a SQLite file that survives restarts and can be shared
+by workers on one host.
+"""
+
+import hashlib
+import random
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+
+def cache_key(model: str, persona: str, prompt: str) -> str:
+    return hashlib.sha256("\x1f".join((model, persona, prompt)).encode()).hexdigest()
+
+
+class GenerationCache(ABC):
+    def __init__(self, ttl: float, max_keys: int, variants: int = 1, report_every: int = 100):
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self.variants = variants
+        self.report_every = report_every
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def get(self, key: str) -> str | None:
+        texts = self._lookup(key)
+        hit = len(texts) >= self.variants
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+        if self.report_every and (self.hits + self.misses) % self.report_every == 0:
+            print(
+                f"[post-generator] generation cache: {self.hits} hits, {self.misses} misses "
+                f"({self.hit_rate:.0%} hit rate)",
+                flush=True,
+            )
+        return random.choice(texts) if hit else None
+
+    def put(self, key: str, text: str) -> None:
+        self._store(key, text)
+
+    @abstractmethod
+    def _lookup(self, key: str) -> list[str]:
+        """Unexpired texts of `key`; marks the key as recently used."""
+
+    @abstractmethod
+    def _store(self, key: str, text: str) -> None:
+        """Add `text` to the texts of `key`, keeping the newest `variants`."""
+
+
+class MemoryGenerationCache(GenerationCache):
+    def __init__(self, *args, clock=time.monotonic, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.clock = clock
+        # key -> [(created_at, text)], least recently used first
+        self._entries: OrderedDict[str, list[tuple[float, str]]] = OrderedDict()
+
+    def _lookup(self, key: str) -> list[str]:
+        entries = self._entries.get(key)
+        if entries is None:
+            return []
+        expiry = self.clock() - self.ttl
+        entries[:] = [entry for entry in entries if entry[0] > expiry]
+        if not entries:
+            del self._entries[key]
+            return []
+        self._entries.move_to_end(key)
+        return [text for _, text in entries]
+
+    def _store(self, key: str, text: str) -> None:
+        entries = self._entries.setdefault(key, [])
+        entries.append((self.clock(), text))
+        del entries[: -self.variants]
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_keys:
+            self._entries.popitem(last=False)
+
+
+class SqliteGenerationCache(GenerationCache):
+    def __init__(self, path: str, *args, clock=time.time, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.clock = clock
+        # The local model generates in worker threads
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS generation_cache (key TEXT NOT NULL, "
+            "text TEXT NOT NULL, created_at REAL NOT NULL, used_at REAL NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS ix_generation_cache_key ON generation_cache (key)"
+        )
+
+    def _lookup(self, key: str) -> list[str]:
+        now = self.clock()
+        with self._lock:
+            self._db.execute(
+                "DELETE FROM generation_cache WHERE key = ? AND created_at <= ?",
+                (key, now - self.ttl),
+            )
+            self._db.execute("UPDATE generation_cache SET used_at = ? WHERE key = ?", (now, key))
+            rows = self._db.execute("SELECT text FROM generation_cache WHERE key = ?", (key,))
+            return [text for (text,) in rows]
+
+    def _store(self, key: str, text: str) -> None:
+        now = self.clock()
+        with self._lock, self._db:
+            self._db.execute("BEGIN")
+            self._db.execute(
+                "INSERT INTO generation_cache (key, text, created_at, used_at) VALUES (?, ?, ?, ?)",
+                (key, text, now, now),
+            )
+            self._db.execute("UPDATE generation_cache SET used_at = ? WHERE key = ?", (now, key))
+            # Newest `variants` texts of the key
+            self._db.execute(
+                "DELETE FROM generation_cache WHERE key = ? AND rowid NOT IN "
+                "(SELECT rowid FROM generation_cache WHERE key = ? "
+                "ORDER BY created_at DESC, rowid DESC LIMIT ?)",
+                (key, key, self.variants),
+            )
+            # Most recently used `max_keys` keys
+            self._db.execute(
+                "DELETE FROM generation_cache WHERE key IN "
+                "(SELECT key FROM generation_cache GROUP BY key "
+                "ORDER BY MAX(used_at) DESC LIMIT -1 OFFSET ?)",
+                (self.max_keys,),
+            )
+
+    def close(self) -> None:
+        self._db.close()
+
+
+def create_generation_cache(
+    backend: str,
+    ttl: float,
+    max_keys: int,
+    variants: int = 1,
+    path: str = "generation_cache.sqlite3",
+) -> GenerationCache | None:
+    """Cache for `backend` "memory" or "sqlite"; None (no caching) for "off"."""
+    if backend == "memory":
+        return MemoryGenerationCache(ttl, max_keys, variants)
+    if backend == "sqlite":
+        return SqliteGenerationCache(path, ttl, max_keys, variants)
+    if backend in ("", "off"):
+        return None
+    raise ValueError(f"unknown generation cache backend: {backend!r}")
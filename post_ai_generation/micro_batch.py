@@ -0,0 +1,89 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+
+class MicroBatcher:
+    """
+    Turns concurrent single requests into batches: submit() queues an item
+    with its own future; a collector takes the first waiting item, then
+    whatever else arrives within `max_wait` seconds, up to `max_batch_size`
+    items, and hands them to the blocking `run_batch(items) -> results` in a
+    worker thread. One batch runs at a time; meanwhile the next one fills up.
+
+    The queue holds at most `max_queue` items, submit() waits while it is
+    full (backpressure instead of unbounded memory).
+    """
+
+    def __init__(
+        self,
+        run_batch,
+        max_batch_size: int = 8,
+        max_wait: float = 0.02,
+        max_queue: int = 64,
+    ):
+        self.run_batch = run_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self.batch_sizes: list[int] = []
+        self._queue: asyncio.Queue | None = None
+        self._collector: asyncio.Task | None = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="micro-batch")
+
+    async def submit(self, item):
+        if self._collector is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+            self._collector = asyncio.create_task(self._collect())
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future))
+        return await future
+
+    async def _next_batch(self) -> list[tuple[object, asyncio.Future]]:
+        batch = [await self._queue.get()]
+        deadline = asyncio.get_running_loop().time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        # Callers that gave up meanwhile do not need a result
+        return [(item, future) for item, future in batch if not future.cancelled()]
+
+    async def _collect(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._next_batch()
+            if not batch:
+                continue
+            self.batch_sizes.append(len(batch))
+            items = [item for item, _ in batch]
+            try:
+                results = await loop.run_in_executor(self._executor, self.run_batch, items)
+                if len(results) != len(items):
+                    raise RuntimeError(f"{len(results)} results for a batch of {len(items)}")
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    async def close(self) -> None:
+        if self._collector is not None:
+            self._collector.cancel()
+            try:
+                await self._collector
+            except asyncio.CancelledError:
+                pass
+            self._collector = None
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,60 @@
+import asyncio
+import time
+
+
+class TokenBucket:
+    """
+    Asyncio token bucket: holds up to `capacity` tokens and refills at `rate`
+    tokens per second. acquire() waits until enough tokens are there, so
+    callers are spread out to the refill rate after an initial burst of
+    `capacity`. Waiters are served in order (no starvation of large requests).
+    """
+
+    def __init__(self, rate: float, capacity: float, clock=time.monotonic):
+        if rate <= 0 or capacity <= 0:
+            raise ValueError("rate and capacity must be positive")
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self._tokens = capacity
+        self._updated = clock()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = self.clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, tokens: float = 1) -> None:
+        # A request larger than the bucket could never be served otherwise
+        tokens = min(tokens, self.capacity)
+        async with self._lock:
+            self._refill()
+            while self._tokens < tokens:
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= tokens
+
+
+class RateLimiter:
+    """
+    Provider quota: requests per second and (optionally) tokens per minute,
+    each as its own bucket. A value of 0 disables that limit.
+    """
+
+    def __init__(
+        self,
+        requests_per_second: float,
+        burst: float = 1,
+        tokens_per_minute: float = 0,
+    ):
+        self.requests = TokenBucket(requests_per_second, burst) if requests_per_second else None
+        self.tokens = (
+            TokenBucket(tokens_per_minute / 60, tokens_per_minute) if tokens_per_minute else None
+        )
+
+    async def acquire(self, tokens: int = 0) -> None:
+        if self.requests is not None:
+            await self.requests.acquire()
+        if self.tokens is not None and tokens:
+            await self.tokens.acquire(tokens)
@@ -0,0 +1,33 @@
+import asyncio
+import random
+
+from errors import TransientError
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Exponential backoff with full jitter: uniform in [0, min(cap, base * 2^attempt)]."""
+    return random.uniform(0, min(cap, base * 2**attempt))
+
+
+async def with_retries(call, attempts: int, base_delay: float, max_delay: float, what: str = ""):
+    """
+    Await `call()` until it succeeds, retrying TransientErrors up to
+    `attempts` times in total. A Retry-After hint from the server is
+    honoured (up to `max_delay`). Other errors, and the last
+    TransientError, are raised.
+    """
+    for attempt in range(attempts):
+        try:
+            return await call()
+        except TransientError as e:
+            if attempt == attempts - 1:
+                raise
+            delay = backoff_delay(attempt, base_delay, max_delay)
+            if e.retry_after is not None:
+                delay = max(delay, min(e.retry_after, max_delay))
+            print(
+                f"[post-generator] {what} failed ({e}), "
+                f"retry {attempt + 1}/{attempts - 1} in {delay:.1f}s",
+                flush=True,
+            )
+            await asyncio.sleep(delay)
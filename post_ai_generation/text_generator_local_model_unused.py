@@ -1,7 +1,22 @@
+import os
+
+import torch
+from errors import PermanentError
+from generation_cache import GenerationCache, cache_key
+from micro_batch import MicroBatcher
 from transformers import pipeline
 
 print("[post-generator] Transformers imported")
 
+# Threads torch may use for inference; defaults to one per core
+LOCAL_MODEL_THREADS = int(os.environ.get("LOCAL_MODEL_THREADS", str(os.cpu_count() or 1)))
+# Micro-batching: prompts collected for up to LOCAL_BATCH_WAIT_MS or
+# LOCAL_BATCH_SIZE items run as one padded batch; at most LOCAL_BATCH_QUEUE
+# prompts wait
+LOCAL_BATCH_SIZE = int(os.environ.get("LOCAL_BATCH_SIZE", "8"))
+LOCAL_BATCH_WAIT_MS = float(os.environ.get("LOCAL_BATCH_WAIT_MS", "20"))
+LOCAL_BATCH_QUEUE = int(os.environ.get("LOCAL_BATCH_QUEUE", "64"))
+
 
 # -----------------------------
 # Personas (prompt templates)
@@ -16,38 +31,112 @@ PERSONAS = {
 # -----------------------------
 # Text Generator
 # -----------------------------
+def _checked(text: str) -> str:
+    # Like MistralTextGenerator: nothing to post, the job is dead-lettered
+    if not text:
+        raise PermanentError("empty completion from the local model")
+    return text
+
+
 class TextGenerator:
     _generator = None
+    MODEL = "/hf_models/gpt2"
 
-    def __init__(self):
+    def __init__(self, cache: GenerationCache | None = None, model: str = MODEL):
         self.generator = None
+        self.cache = cache
+        self.model = model
 
     def _init_generator(self):
         if TextGenerator._generator is None:
             print("[post-generator] Loading text-generation model .", flush=True)
-            TextGenerator._generator = pipeline(
+            torch.set_num_threads(LOCAL_MODEL_THREADS)
+            generator = pipeline(
                 "text-generation",
-                model="/hf_models/gpt2",
+                model=self.model,
                 device=-1,
             )
+            # Batches are padded on the left (decoder-only model); GPT-2 has
+            # no pad token of its own
+            generator.tokenizer.padding_side = "left"
+            if generator.tokenizer.pad_token_id is None:
+                generator.tokenizer.pad_token_id = generator.model.config.eos_token_id
+            TextGenerator._generator = generator
             print("[post-generator] Loaded text-generation model", flush=True)
 
         self.generator = TextGenerator._generator
 
+    def cached_text(self, additional_prompt, persona="neutral"):
+        if self.cache is None:
+            return None
+        return self.cache.get(cache_key(self.model, persona, additional_prompt))
+
     def generate_text(self, additional_prompt, persona="neutral", max_new_tokens=60):
+        cached = self.cached_text(additional_prompt, persona)
+        if cached is not None:
+            return cached
+        return _checked(self.generate_batch([(additional_prompt, persona)], max_new_tokens)[0])
+
+    def generate_batch(self, requests, max_new_tokens=60):
+        """
+        Texts for (additional_prompt, persona) pairs, run as one padded batch.
+        A prompt the model produced nothing for gets an empty string, so it
+        does not fail the other prompts of the batch.
+        """
         if self.generator is None:
             self._init_generator()
-        persona_instruction = PERSONAS.get(persona, PERSONAS["neutral"])
-        prompt = f"{persona_instruction}\nTopic: {additional_prompt}\nPost:"
-        result = self.generator(
-            prompt,
+        prompts = []
+        for additional_prompt, persona in requests:
+            persona_instruction = PERSONAS.get(persona, PERSONAS["neutral"])
+            prompts.append(f"{persona_instruction}\nTopic: {additional_prompt}\nPost:")
+        results = self.generator(
+            prompts,
+            batch_size=len(prompts),
             max_new_tokens=max_new_tokens,
             do_sample=True,
             temperature=0.7,
             top_p=0.9,
             repetition_penalty=1.1,
         )
-        generated = result[0]["generated_text"]
-        if "Post:" in generated:
-            generated = generated.split("Post:", 1)[1]
-        return generated.strip()
+
+        texts = []
+        for (additional_prompt, persona), result in zip(requests, results):
+            generated = result[0]["generated_text"]
+            if "Post:" in generated:
+                generated = generated.split("Post:", 1)[1]
+            generated = generated.strip()
+            if self.cache is not None and generated:
+                self.cache.put(cache_key(self.model, persona, additional_prompt), generated)
+            texts.append(generated)
+        return texts
+
+
+class BatchingTextGenerator:
+    """
+    Async front of TextGenerator for the consumer: concurrent generate_text
+    calls are micro-batched (see MicroBatcher) instead of running the
+    pipeline one prompt at a time. `max_batch_size=1` gives the unbatched
+    behaviour, still off the event loop.
+    """
+
+    def __init__(
+        self,
+        text_gen: TextGenerator,
+        max_batch_size: int = LOCAL_BATCH_SIZE,
+        max_wait_ms: float = LOCAL_BATCH_WAIT_MS,
+        max_queue: int = LOCAL_BATCH_QUEUE,
+    ):
+        self.text_gen = text_gen
+        self.batcher = MicroBatcher(
+            text_gen.generate_batch, max_batch_size, max_wait_ms / 1000, max_queue
+        )
+
+    async def generate_text(self, additional_prompt, persona="neutral", on_text=None):
+        # A batch is generated as a whole, there is no partial text to report
+        cached = self.text_gen.cached_text(additional_prompt, persona)
+        if cached is not None:
+            return cached
+        return _checked(await self.batcher.submit((additional_prompt, persona)))
+
+    async def close(self):
+        await self.batcher.close()
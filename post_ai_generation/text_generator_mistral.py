@@ -1,8 +1,12 @@
+import json
 import os
 import re
 
-import requests
+import httpx
 from dotenv import load_dotenv
+from errors import PermanentError, TransientError, checked_post, checked_stream
+from generation_cache import GenerationCache, cache_key
+from rate_limit import RateLimiter
 
 # Load .env file
 load_dotenv()
@@ -22,16 +26,47 @@ PERSONAS = {
 # Mistral Text Generator
 # -----------------------------
 class MistralTextGenerator:
-    API_URL = "https://api.mistral.ai/v1/chat/completions"
-
-    def __init__(self, model="mistral-small-latest"):
+    """
+    Client of the Mistral chat completions API. Requests go through the
+    shared (pooled, keep-alive) `client` and wait for the `limiter` first,
+    so concurrent callers stay within the account's quota.
+
+    generate_text raises TransientError (429, 5xx, timeouts) or
+    PermanentError instead of returning error text, so a failed call can
+    never end up as the content of a post. With a `cache`, repeated
+    prompts are answered from it without a call (nor using up quota).
+
+    With an `on_text` callback the completion is streamed, and
+    `await on_text(text_so_far)` is called as it grows.
+    """
+
+    API_URL = os.getenv("MISTRAL_API_URL", "https://api.mistral.ai/v1/chat/completions")
+    MAX_TOKENS = 150
+    TIMEOUT = 60
+
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        limiter: RateLimiter | None = None,
+        model="mistral-small-latest",
+        cache: GenerationCache | None = None,
+    ):
+        self.client = client
+        self.limiter = limiter
+        self.cache = cache
         self.model = model
         self.api_key = os.getenv("MISTRAL_API_KEY")
 
         if not self.api_key:
             raise RuntimeError("MISTRAL_API_KEY environment variable not set")
 
-    def generate_text(self, additional_prompt, persona="neutral"):
+    async def generate_text(self, additional_prompt, persona="neutral", on_text=None):
+        key = cache_key(self.model, persona, additional_prompt)
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+
         persona_instruction = PERSONAS.get(persona, PERSONAS["neutral"])
         prompt = f"{persona_instruction}\n\n{additional_prompt}"
 
@@ -46,27 +81,17 @@ class MistralTextGenerator:
             "model": self.model,
             "messages": [{"role": "user", "content": prompt}],
             "temperature": 0.7,
-            "max_tokens": 150,
+            "max_tokens": self.MAX_TOKENS,
         }
 
-        try:
-            resp = requests.post(self.API_URL, headers=headers, json=payload, timeout=60)
-            resp.raise_for_status()
-        except requests.RequestException as e:
-            print(f"[post-generator] Error calling Mistral API: {e}", flush=True)
-            return f"[Error generating text: {e}]"
+        if self.limiter is not None:
+            # Rough token estimate (~4 characters per token) plus the completion
+            await self.limiter.acquire(len(prompt) // 4 + self.MAX_TOKENS)
 
-        try:
-            data = resp.json()
-        except ValueError:
-            print(f"[post-generator] Invalid JSON from Mistral: {resp.text}", flush=True)
-            return "[Error: invalid JSON from Mistral]"
-
-        try:
-            text = data["choices"][0]["message"]["content"]
-        except (KeyError, IndexError):
-            print(f"[post-generator] Unexpected response format: {data}", flush=True)
-            return "[Error: unexpected response format from Mistral]"
+        if on_text is None:
+            text = await self._complete(headers, payload)
+        else:
+            text = await self._stream(headers, payload, on_text)
 
         # Extract text between ** **
         match = re.search(r"\*\*(.*?)\*\*", text, re.DOTALL)
@@ -75,5 +100,65 @@ class MistralTextGenerator:
         else:
             print("[post-generator] No **text** found, returning raw text", flush=True)
 
+        if not text.strip():
+            raise PermanentError("empty completion from Mistral")
+
         print(f"[post-generator] Received text: {text[:100]}...", flush=True)
+        if self.cache is not None:
+            self.cache.put(key, text)
+        return text
+
+    async def _complete(self, headers: dict, payload: dict) -> str:
+        resp = await checked_post(
+            self.client,
+            "Mistral",
+            self.API_URL,
+            headers=headers,
+            json=payload,
+            timeout=self.TIMEOUT,
+        )
+
+        try:
+            data = resp.json()
+        except ValueError:
+            # Usually an error page of a proxy in between
+            raise TransientError(f"invalid JSON from Mistral: {resp.text[:200]}")
+
+        try:
+            text = data["choices"][0]["message"]["content"]
+        except (KeyError, IndexError, TypeError):
+            raise PermanentError(f"unexpected response format from Mistral: {data}")
+        if not isinstance(text, str):
+            raise PermanentError(f"unexpected response format from Mistral: {data}")
+        return text
+
+    async def _stream(self, headers: dict, payload: dict, on_text) -> str:
+        text = ""
+        async with checked_stream(
+            self.client,
+            "Mistral",
+            "POST",
+            self.API_URL,
+            headers=headers,
+            json={**payload, "stream": True},
+            timeout=self.TIMEOUT,
+        ) as resp:
+            # Server-sent events: a "data: {chunk}" line per delta, "data: [DONE]" last
+            async for line in resp.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line.removeprefix("data:").strip()
+                if data == "[DONE]":
+                    break
+                try:
+                    delta = json.loads(data)["choices"][0]["delta"].get("content") or ""
+                except ValueError:
+                    raise TransientError(f"invalid JSON from Mistral: {data[:200]}")
+                except (KeyError, IndexError, TypeError, AttributeError):
+                    raise PermanentError(f"unexpected response format from Mistral: {data}")
+                if not isinstance(delta, str):
+                    raise PermanentError(f"unexpected response format from Mistral: {data}")
+                if delta:
+                    text += delta
+                    await on_text(text)
         return text
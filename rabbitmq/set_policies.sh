@@ -0,0 +1,11 @@
+#!/bin/sh
+# Dead-letter the job queues to jobs.dead-letter (parked in jobs.parked, see
+# backend/messaging.py). A policy instead of x-dead-letter-exchange queue
+# arguments: it also applies to queues that already exist, which the broker
+# refuses to re-declare with different arguments (406 PRECONDITION_FAILED).
+# Idempotent; docker compose runs it with the healthcheck, so the policy is in
+# place before the workers start.
+rabbitmqctl -q list_policies | grep -q jobs-dead-letter ||
+    rabbitmqctl -q set_policy --apply-to queues jobs-dead-letter \
+        '^(image\.resize|posts\.generate|comments\.generate)$' \
+        '{"dead-letter-exchange":"jobs.dead-letter"}'
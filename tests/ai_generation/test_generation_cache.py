@@ -0,0 +1,133 @@
+import asyncio
+import importlib
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "post_ai_generation"))
+generation_cache = importlib.import_module("generation_cache")
+text_generator_mistral = importlib.import_module("text_generator_mistral")
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_cache(request, tmp_path):
+    clock = Clock()
+
+    def make(ttl=60, max_keys=10, variants=1):
+        if request.param == "memory":
+            cache = generation_cache.MemoryGenerationCache(ttl, max_keys, variants, clock=clock)
+        else:
+            cache = generation_cache.SqliteGenerationCache(
+                str(tmp_path / "cache.sqlite3"), ttl, max_keys, variants, clock=clock
+            )
+        return cache
+
+    return make
+
+
+def test_hit_after_put_and_hit_rate(make_cache):
+    cache = make_cache()
+
+    assert cache.get("k") is None
+    cache.put("k", "text")
+    assert cache.get("k") == "text"
+    assert cache.get("k") == "text"
+    assert (cache.hits, cache.misses) == (2, 1)
+    assert cache.hit_rate == pytest.approx(2 / 3)
+
+
+def test_misses_until_all_variants_are_generated(make_cache):
+    cache = make_cache(variants=3)
+
+    for text in ("a", "b"):
+        assert cache.get("k") is None
+        cache.put("k", text)
+    assert cache.get("k") is None
+    cache.put("k", "c")
+
+    answers = {cache.get("k") for _ in range(50)}
+    assert answers == {"a", "b", "c"}
+    # Only the newest `variants` texts are kept
+    cache.put("k", "d")
+    assert {cache.get("k") for _ in range(50)} == {"b", "c", "d"}
+
+
+def test_entries_expire_after_ttl(make_cache):
+    cache = make_cache(ttl=60)
+    cache.put("k", "text")
+
+    cache.clock.now += 59
+    assert cache.get("k") == "text"
+    cache.clock.now += 2
+    assert cache.get("k") is None
+
+
+def test_least_recently_used_keys_are_evicted(make_cache):
+    cache = make_cache(max_keys=2)
+    cache.put("a", "1")
+    cache.clock.now += 1
+    cache.put("b", "2")
+    cache.clock.now += 1
+    assert cache.get("a") == "1"  # "b" is now the least recently used
+    cache.clock.now += 1
+    cache.put("c", "3")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+    assert cache.get("c") == "3"
+
+
+def test_sqlite_cache_survives_restart(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = generation_cache.SqliteGenerationCache(path, 60, 10)
+    cache.put("k", "kept")
+    cache.close()
+
+    assert generation_cache.SqliteGenerationCache(path, 60, 10).get("k") == "kept"
+
+
+def test_generation_cache_is_abstract():
+    with pytest.raises(TypeError):
+        generation_cache.GenerationCache(60, 10)
+
+
+def test_create_generation_cache():
+    assert generation_cache.create_generation_cache("off", 60, 10) is None
+    cache = generation_cache.create_generation_cache("memory", 60, 10, variants=2)
+    assert isinstance(cache, generation_cache.MemoryGenerationCache)
+    assert cache.variants == 2
+    with pytest.raises(ValueError):
+        generation_cache.create_generation_cache("redis", 60, 10)
+
+
+def test_mistral_generator_answers_repeated_prompts_from_cache(monkeypatch):
+    monkeypatch.setenv("MISTRAL_API_KEY", "test")
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        content = f"**answer {len(calls)}**"
+        return httpx.Response(200, json={"choices": [{"message": {"content": content}}]})
+
+    async def main():
+        cache = generation_cache.MemoryGenerationCache(60, 10, variants=1)
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            text_gen = text_generator_mistral.MistralTextGenerator(client, cache=cache)
+            return [
+                await text_gen.generate_text("cats", "positive"),
+                await text_gen.generate_text("cats", "positive"),
+                await text_gen.generate_text("cats", "negative"),
+            ]
+
+    assert asyncio.run(main()) == ["answer 1", "answer 1", "answer 2"]
+    assert len(calls) == 2
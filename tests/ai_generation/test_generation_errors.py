@@ -0,0 +1,152 @@
+import asyncio
+import importlib
+import json
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "post_ai_generation"))
+consumer = importlib.import_module("consumer")
+errors = importlib.import_module("errors")
+retry = importlib.import_module("retry")
+text_generator_mistral = importlib.import_module("text_generator_mistral")
+
+MISTRAL_URL = "http://mistral/v1/chat/completions"
+
+
+def completion(content):
+    return httpx.Response(200, json={"choices": [{"message": {"content": content}}]})
+
+
+class Services:
+    """Mistral answers from `mistral` in turn (last repeats); the backend records posts."""
+
+    def __init__(self, *mistral):
+        self.mistral = list(mistral)
+        self.mistral_calls = 0
+        self.posted: list[dict] = []
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        if request.url.host == "mistral":
+            self.mistral_calls += 1
+            answer = self.mistral.pop(0) if len(self.mistral) > 1 else self.mistral[0]
+            if isinstance(answer, Exception):
+                raise answer
+            return answer
+        self.posted.append(json.loads(request.content))
+        return httpx.Response(201, json={})
+
+
+def generate_post(services, monkeypatch, attempts=3):
+    monkeypatch.setenv("MISTRAL_API_KEY", "test")
+
+    async def main():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(services.handler)) as client:
+            text_gen = text_generator_mistral.MistralTextGenerator(client)
+            text_gen.API_URL = MISTRAL_URL
+            worker = consumer.GenerationWorker(
+                text_gen, client, "http://backend", retry_attempts=attempts, retry_base_delay=0
+            )
+            return await worker.handle(consumer.QUEUE_POSTS, b'{"prompt": "cats"}')
+
+    return asyncio.run(main())
+
+
+def test_rate_limited_generation_is_retried(monkeypatch):
+    services = Services(
+        httpx.Response(429, headers={"Retry-After": "0"}),
+        httpx.ReadTimeout("slow"),
+        completion("**Cats rule**"),
+    )
+
+    assert generate_post(services, monkeypatch) is True
+    assert services.mistral_calls == 3
+    assert services.posted == [{"user": "AI User", "text": "Cats rule", "image": None}]
+
+
+@pytest.mark.parametrize(
+    "answer",
+    [
+        httpx.Response(503),
+        httpx.Response(400, json={"message": "bad request"}),
+        httpx.Response(200, json={"unexpected": True}),
+        completion("   "),
+        httpx.ConnectError("refused"),
+    ],
+)
+def test_failed_generation_is_never_posted(monkeypatch, answer):
+    services = Services(answer)
+
+    assert generate_post(services, monkeypatch) is False
+    assert services.posted == []
+
+
+def stream(*events):
+    body = "".join(f"data: {event}\n\n" for event in events)
+    return httpx.Response(200, text=body, headers={"Content-Type": "text/event-stream"})
+
+
+def delta(content):
+    return json.dumps({"choices": [{"delta": {"content": content}}]})
+
+
+def stream_text(services, monkeypatch):
+    monkeypatch.setenv("MISTRAL_API_KEY", "test")
+    partial = []
+
+    async def on_text(text):
+        partial.append(text)
+
+    async def main():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(services.handler)) as client:
+            text_gen = text_generator_mistral.MistralTextGenerator(client)
+            text_gen.API_URL = MISTRAL_URL
+            return await text_gen.generate_text("cats", on_text=on_text)
+
+    return asyncio.run(main()), partial
+
+
+def test_streamed_completion_reports_partial_text(monkeypatch):
+    services = Services(stream(delta("**Cats"), delta(" rule**"), delta(""), "[DONE]"))
+
+    text, partial = stream_text(services, monkeypatch)
+    assert text == "Cats rule"
+    assert partial == ["**Cats", "**Cats rule**"]
+
+
+@pytest.mark.parametrize(
+    "answer, error",
+    [
+        (httpx.Response(429), "TransientError"),
+        (stream("{not json"), "TransientError"),
+        (stream(json.dumps({"choices": []})), "PermanentError"),
+        (stream("[DONE]"), "PermanentError"),  # empty completion
+    ],
+)
+def test_streamed_completion_failures_are_typed(monkeypatch, answer, error):
+    with pytest.raises(getattr(errors, error)):
+        stream_text(Services(answer), monkeypatch)
+
+
+def test_checked_post_classifies_failures():
+    async def post(response):
+        transport = httpx.MockTransport(lambda request: response)
+        async with httpx.AsyncClient(transport=transport) as client:
+            return await errors.checked_post(client, "svc", "http://svc/")
+
+    with pytest.raises(errors.TransientError) as e:
+        asyncio.run(post(httpx.Response(429, headers={"Retry-After": "7"})))
+    assert e.value.retry_after == 7
+    with pytest.raises(errors.TransientError):
+        asyncio.run(post(httpx.Response(502)))
+    with pytest.raises(errors.PermanentError):
+        asyncio.run(post(httpx.Response(422)))
+    assert asyncio.run(post(httpx.Response(201))).status_code == 201
+
+
+def test_backoff_grows_exponentially_with_cap():
+    for attempt in range(8):
+        delay = retry.backoff_delay(attempt, base=0.5, cap=10)
+        assert 0 <= delay <= min(10, 0.5 * 2**attempt)
@@ -0,0 +1,220 @@
+import asyncio
+import importlib
+import json
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+# The worker is a standalone service with flat imports
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "post_ai_generation"))
+consumer = importlib.import_module("consumer")
+rate_limit = importlib.import_module("rate_limit")
+
+
+class SlowGenerator:
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def generate_text(self, additional_prompt, persona="neutral", on_text=None):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        return f"{persona}: {additional_prompt}"
+
+
+class Backend:
+    """Records what the worker posts; answers with `statuses` in turn (the last one repeats)."""
+
+    def __init__(self, statuses=(201,)):
+        self.statuses = list(statuses)
+        self.requests: list[tuple[str, dict]] = []
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append((request.url.path, json.loads(request.content)))
+        status = self.statuses.pop(0) if len(self.statuses) > 1 else self.statuses[0]
+        return httpx.Response(status, json={})
+
+
+def run_jobs(generator, backend, jobs, concurrency=4):
+    async def main():
+        transport = httpx.MockTransport(backend.handler)
+        async with httpx.AsyncClient(transport=transport) as client:
+            worker = consumer.GenerationWorker(
+                generator,
+                client,
+                backend_url="http://backend",
+                concurrency=concurrency,
+                retry_attempts=3,
+                retry_base_delay=0,
+            )
+            return await asyncio.gather(
+                *(worker.handle(queue, json.dumps(msg).encode()) for queue, msg in jobs)
+            )
+
+    return asyncio.run(main())
+
+
+def test_worker_limits_concurrency():
+    generator, backend = SlowGenerator(), Backend()
+    jobs = [(consumer.QUEUE_POSTS, {"user": "ai", "prompt": f"p{i}"}) for i in range(9)]
+
+    start = time.perf_counter()
+    results = run_jobs(generator, backend, jobs, concurrency=3)
+    elapsed = time.perf_counter() - start
+
+    assert results == [True] * 9
+    assert generator.max_in_flight == 3
+    # Three rounds of three, not nine sequential generations
+    assert elapsed < 9 * generator.delay
+    assert sorted(body["text"] for _, body in backend.requests) == sorted(
+        f"neutral: p{i}" for i in range(9)
+    )
+
+
+def test_worker_posts_comments_to_the_post():
+    backend = Backend()
+    msg = {"post_id": 7, "post_text": "hello", "user": "bot", "persona": "positive"}
+
+    assert run_jobs(SlowGenerator(0), backend, [(consumer.QUEUE_COMMENTS, msg)]) == [True]
+    assert backend.requests == [("/posts/7/comments", {"user": "bot", "text": "positive: hello"})]
+
+
+def test_worker_reports_failures():
+    backend = Backend(statuses=(500,))
+    jobs = [
+        (consumer.QUEUE_COMMENTS, {"post_id": 1}),  # no post_text
+        (consumer.QUEUE_POSTS, {"prompt": "x"}),  # backend error
+    ]
+    assert run_jobs(SlowGenerator(0), backend, jobs) == [False, False]
+    # The 5xx was retried, the malformed message was not
+    assert len(backend.requests) == 3
+
+
+def test_worker_retries_transient_backend_errors():
+    backend = Backend(statuses=(503, 429, 201))
+
+    assert run_jobs(SlowGenerator(0), backend, [(consumer.QUEUE_POSTS, {"prompt": "x"})]) == [True]
+    assert len(backend.requests) == 3
+
+
+def test_worker_does_not_retry_rejected_requests():
+    backend = Backend(statuses=(404,))
+    msg = {"post_id": 9, "post_text": "gone"}
+
+    assert run_jobs(SlowGenerator(0), backend, [(consumer.QUEUE_COMMENTS, msg)]) == [False]
+    assert len(backend.requests) == 1
+
+
+class StreamingGenerator:
+    """Reports each of `parts` through on_text, then answers with all of them."""
+
+    def __init__(self, *parts, error=None):
+        self.parts = parts
+        self.error = error
+
+    async def generate_text(self, additional_prompt, persona="neutral", on_text=None):
+        text = ""
+        for part in self.parts:
+            text += part
+            await on_text(text)
+        if self.error:
+            raise self.error
+        return text
+
+
+def test_worker_reports_job_progress_and_completes_the_job():
+    backend = Backend()
+    msg = {"job_id": "j1", "user": "ai", "prompt": "cats"}
+
+    assert run_jobs(StreamingGenerator("Cats ", "rule"), backend, [(consumer.QUEUE_POSTS, msg)])
+    # The second partial text came within the progress interval of the first
+    assert backend.requests == [
+        ("/jobs/j1", {"status": "running"}),
+        ("/jobs/j1", {"status": "running", "text": "Cats "}),
+        ("/posts/", {"user": "ai", "text": "Cats rule", "image": None, "job_id": "j1"}),
+    ]
+
+
+def test_worker_marks_given_up_job_failed():
+    backend = Backend()
+    generator = StreamingGenerator(error=consumer.PermanentError("empty completion"))
+    msg = {"job_id": "j2", "post_id": 3, "post_text": "hello"}
+
+    assert run_jobs(generator, backend, [(consumer.QUEUE_COMMENTS, msg)]) == [False]
+    assert backend.requests[-1] == ("/jobs/j2", {"status": "failed", "error": "empty completion"})
+
+
+def test_lost_progress_report_does_not_fail_the_job():
+    backend = Backend(statuses=(404, 404, 201))
+    msg = {"job_id": "gone", "prompt": "x"}
+
+    assert run_jobs(StreamingGenerator("x"), backend, [(consumer.QUEUE_POSTS, msg)]) == [True]
+    assert backend.requests[-1][0] == "/posts/"
+
+
+def test_token_bucket_spaces_requests_after_burst():
+    bucket = rate_limit.TokenBucket(rate=100, capacity=2)
+
+    async def main():
+        stamps = []
+        for _ in range(6):
+            await bucket.acquire()
+            stamps.append(time.perf_counter())
+        return stamps
+
+    start = time.perf_counter()
+    stamps = asyncio.run(main())
+
+    # The burst goes through at once, the other four wait 10 ms each
+    assert stamps[1] - start < 0.01
+    assert stamps[-1] - start >= 0.035
+
+
+def test_rate_limiter_zero_disables_limits():
+    limiter = rate_limit.RateLimiter(requests_per_second=0, tokens_per_minute=0)
+    assert limiter.requests is None and limiter.tokens is None
+
+    limiter = rate_limit.RateLimiter(requests_per_second=5, burst=2, tokens_per_minute=600)
+    assert limiter.requests.capacity == 2
+    assert limiter.tokens.rate == 10
+
+
+class FakeChannel:
+    is_open = True
+
+    def __init__(self):
+        self.acked: list[int] = []
+        self.nacked: list[int] = []
+
+    def basic_ack(self, delivery_tag):
+        self.acked.append(delivery_tag)
+
+    def basic_nack(self, delivery_tag, requeue=True):
+        self.nacked.append(delivery_tag)
+
+
+def test_amqp_consumer_acks_done_and_rejects_failed_messages():
+    channel, backend = FakeChannel(), Backend()
+
+    async def main():
+        transport = httpx.MockTransport(backend.handler)
+        async with httpx.AsyncClient(transport=transport) as client:
+            worker = consumer.GenerationWorker(SlowGenerator(0.01), client, "http://backend")
+            amqp = consumer.AmqpConsumer(worker)
+            for tag, body in enumerate([b'{"prompt": "a"}', b"not json", b'{"prompt": "b"}']):
+                method = type("Method", (), {"delivery_tag": tag})
+                amqp.on_message(consumer.QUEUE_POSTS, channel, method, None, body)
+            await asyncio.gather(*amqp.tasks)
+            return amqp
+
+    amqp = asyncio.run(main())
+    assert sorted(channel.acked) == [0, 2]
+    assert channel.nacked == [1]
+    assert not amqp.tasks
@@ -0,0 +1,52 @@
+import asyncio
+import importlib
+import sys
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("transformers")
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "post_ai_generation"))
+errors = importlib.import_module("errors")
+local_model = importlib.import_module("text_generator_local_model_unused")
+
+
+class ScriptedPipeline:
+    """Text-generation pipeline whose model continues the prompts with `continuations`."""
+
+    def __init__(self, *continuations):
+        self.continuations = list(continuations)
+
+    def __call__(self, prompts, **kwargs):
+        return [[{"generated_text": prompt + self.continuations.pop(0)}] for prompt in prompts]
+
+
+def test_empty_completion_is_a_permanent_error():
+    text_gen = local_model.TextGenerator()
+    text_gen.generator = ScriptedPipeline("  \n", " A sunny day")
+
+    with pytest.raises(errors.PermanentError):
+        text_gen.generate_text("weather")
+    assert text_gen.generate_text("weather") == "A sunny day"
+
+
+def test_empty_completion_fails_only_its_own_job_in_a_batch():
+    text_gen = local_model.TextGenerator()
+    text_gen.generator = ScriptedPipeline(" A sunny day", "")
+    batching = local_model.BatchingTextGenerator(text_gen, max_batch_size=2, max_wait_ms=50)
+
+    async def main():
+        try:
+            return await asyncio.gather(
+                batching.generate_text("weather"),
+                batching.generate_text("nothing"),
+                return_exceptions=True,
+            )
+        finally:
+            await batching.close()
+
+    sunny, empty = asyncio.run(main())
+    assert sunny == "A sunny day"
+    assert isinstance(empty, errors.PermanentError)
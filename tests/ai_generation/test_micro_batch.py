@@ -0,0 +1,83 @@
+import asyncio
+import importlib
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "post_ai_generation"))
+micro_batch = importlib.import_module("micro_batch")
+
+
+def run(batcher, items):
+    async def main():
+        try:
+            return await asyncio.gather(
+                *(batcher.submit(item) for item in items), return_exceptions=True
+            )
+        finally:
+            await batcher.close()
+
+    return asyncio.run(main())
+
+
+def test_concurrent_requests_are_batched_with_their_own_results():
+    batches = []
+
+    def run_batch(items):
+        batches.append(list(items))
+        time.sleep(0.01)
+        return [item.upper() for item in items]
+
+    batcher = micro_batch.MicroBatcher(run_batch, max_batch_size=4, max_wait=0.05)
+    items = [f"p{i}" for i in range(10)]
+
+    assert run(batcher, items) == [item.upper() for item in items]
+    assert batcher.batch_sizes == [4, 4, 2]
+    assert [item for batch in batches for item in batch] == items
+
+
+def test_lone_request_waits_at_most_max_wait():
+    batcher = micro_batch.MicroBatcher(lambda items: items, max_batch_size=8, max_wait=0.05)
+
+    start = time.perf_counter()
+    assert run(batcher, ["only"]) == ["only"]
+    assert 0.04 <= time.perf_counter() - start < 0.5
+    assert batcher.batch_sizes == [1]
+
+
+def test_failed_batch_fails_each_of_its_requests():
+    def run_batch(items):
+        if "bad" in items:
+            raise RuntimeError("model crashed")
+        return items
+
+    batcher = micro_batch.MicroBatcher(run_batch, max_batch_size=2, max_wait=0.05)
+    results = run(batcher, ["a", "bad", "c"])
+
+    assert [type(r) for r in results[:2]] == [RuntimeError, RuntimeError]
+    assert results[2] == "c"
+
+
+def test_full_queue_applies_backpressure():
+    queued = []
+
+    def run_batch(items):
+        queued.append(batcher._queue.qsize())
+        time.sleep(0.01)
+        return items
+
+    batcher = micro_batch.MicroBatcher(run_batch, max_batch_size=2, max_wait=0, max_queue=1)
+
+    # Submitters wait for room instead of piling up
+    assert run(batcher, list(range(5))) == list(range(5))
+    assert max(queued) <= 1
+    assert sum(batcher.batch_sizes) == 5
+
+
+def test_mismatched_result_count_is_an_error():
+    batcher = micro_batch.MicroBatcher(lambda items: [], max_wait=0)
+    (result,) = run(batcher, ["x"])
+    with pytest.raises(RuntimeError):
+        raise result
@@ -0,0 +1,137 @@
+import pytest
+
+# Before any backend import: backend.async_database builds its engine on import
+pytest.importorskip("aiosqlite")
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy.ext.asyncio import create_async_engine  # noqa: E402
+from sqlalchemy.pool import NullPool  # noqa: E402
+from sqlmodel import Session, SQLModel  # noqa: E402
+from sqlmodel.ext.asyncio.session import AsyncSession  # noqa: E402
+
+from backend.async_app import app  # noqa: E402
+from backend.async_database import (  # noqa: E402
+    get_async_read_session,
+    get_async_session,
+    to_async_url,
+)
+from backend.database import create_db_engine  # noqa: E402
+from backend.main import app as sync_app  # noqa: E402
+from backend.main import get_read_session, get_session  # noqa: E402
+from backend.search import install_search_index  # noqa: E402
+from tests.conftest import TEST_PNG, create_post, encode_image  # noqa: E402
+
+client = TestClient(app)
+
+
+@pytest.fixture(scope="module", autouse=True)
+def shared_database(tmp_path_factory):
+    """
+    A database file for the async app and the sync app (the helpers of
+    tests.conftest post through the sync app), also when the rest of the
+    suite runs on an in-memory database.
+    """
+    url = f"sqlite:///{tmp_path_factory.mktemp('async') / 'async.db'}"
+    engine = create_db_engine(url)
+    SQLModel.metadata.create_all(engine)
+    with engine.begin() as conn:
+        install_search_index(conn, rebuild=True)
+    # NullPool: TestClient runs every request on a fresh event loop
+    async_engine = create_async_engine(to_async_url(url), poolclass=NullPool)
+
+    def get_test_session():
+        with Session(engine) as session:
+            yield session
+
+    async def get_test_async_session():
+        async with AsyncSession(async_engine) as session:
+            yield session
+
+    sync_overrides = dict(sync_app.dependency_overrides)
+    sync_app.dependency_overrides[get_session] = get_test_session
+    sync_app.dependency_overrides[get_read_session] = get_test_session
+    app.dependency_overrides[get_async_session] = get_test_async_session
+    app.dependency_overrides[get_async_read_session] = get_test_async_session
+    yield engine
+    sync_app.dependency_overrides = sync_overrides
+    app.dependency_overrides.clear()
+    engine.dispose()
+
+
+@pytest.fixture(autouse=True)
+def clean_shared_database(shared_database):
+    yield
+    with Session(shared_database) as session:
+        for table in reversed(SQLModel.metadata.sorted_tables):
+            session.exec(table.delete())
+        session.commit()
+
+
+def test_async_create_and_get_post():
+    r = client.post(
+        "/posts/", json={"text": "async", "user": "alice", "image": encode_image(TEST_PNG)}
+    )
+    assert r.status_code == 200
+    post_id = r.json()["id"]
+
+    r = client.get(f"/posts/{post_id}")
+    assert r.status_code == 200
+    assert r.json()["text"] == "async"
+    assert r.json()["image_full"] == encode_image(TEST_PNG)
+
+
+def test_async_list_sees_posts_from_sync_app():
+    ids = [create_post(text=f"post {i}") for i in range(3)]
+
+    r = client.get("/posts/", params={"limit": 2})
+    assert r.status_code == 200
+    assert [p["id"] for p in r.json()] == ids[::-1][:2]
+    assert "X-Next-Cursor" in r.headers
+
+
+def test_async_comments_round_trip():
+    post_id = create_post()
+
+    r = client.post(f"/posts/{post_id}/comments", json={"text": "hi", "user": "bob"})
+    assert r.status_code == 200
+    comment_id = r.json()["comment_id"]
+
+    assert [c["comment_id"] for c in client.get(f"/posts/{post_id}/comments").json()] == [
+        comment_id
+    ]
+    assert client.delete(f"/comments/{comment_id}").status_code == 204
+    assert client.get(f"/comments/{comment_id}").status_code == 404
+
+
+def test_async_feed_includes_and_comment_batch():
+    post_id = create_post()
+    client.post(f"/posts/{post_id}/comments", json={"text": "hi", "user": "bob"})
+
+    (post,) = client.get("/posts/", params={"include": "comment_count"}).json()
+    assert post["comment_count"] == 1
+    comments = client.get("/comments/", params={"post_id": [post_id]}).json()
+    assert [c["text"] for c in comments[str(post_id)]] == ["hi"]
+
+
+def test_async_missing_post_is_404():
+    assert client.get("/posts/999999").status_code == 404
+    assert client.post("/posts/999999/comments", json={"text": "x", "user": "y"}).status_code == 404
+
+
+def test_async_generation_job_round_trip():
+    r = client.post("/posts/generate", json={"user": "ai", "prompt": "cats"})
+    assert r.status_code == 202
+    job_id = r.json()["id"]
+
+    r = client.patch(f"/jobs/{job_id}", json={"status": "running", "text": "Cats"})
+    assert r.json()["status"] == "running"
+    r = client.post("/posts/", json={"text": "Cats!", "user": "ai", "job_id": job_id})
+    post_id = r.json()["id"]
+    # A redelivered job answers with the post of its first run
+    r = client.post("/posts/", json={"text": "Cats again", "user": "ai", "job_id": job_id})
+    assert (r.json()["id"], r.json()["text"]) == (post_id, "Cats!")
+
+    assert client.get(f"/jobs/{job_id}").json()["post_id"] == post_id
+    stream = client.get(f"/jobs/{job_id}/stream").text
+    assert 'event: token\ndata: {"delta": "Cats!"}' in stream
+    assert stream.endswith(f'data: {{"post_id": {post_id}, "comment_id": null}}\n\n')
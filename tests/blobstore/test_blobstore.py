@@ -0,0 +1,221 @@
+import hashlib
+import io
+import os
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+from sqlmodel import Session
+
+from backend import crud
+from backend.blobstore import (
+    BlobNotFound,
+    BlobStore,
+    LocalBlobStore,
+    S3BlobStore,
+    blob_store,
+)
+from backend.models import OrphanBlob
+from tests.conftest import client, create_post, encode_image, engine, make_png
+
+
+class ClientError(Exception):
+    """Like botocore's ClientError: the S3 error code is in response["Error"]["Code"]."""
+
+    def __init__(self, code: str):
+        super().__init__(f"An error occurred ({code})")
+        self.response = {"Error": {"Code": code}}
+
+
+class InMemoryS3Client:
+    """Stand-in for a boto3 S3 client: just the calls S3BlobStore makes."""
+
+    exceptions = SimpleNamespace(ClientError=ClientError)
+
+    def __init__(self):
+        self.objects: dict[tuple[str, str], bytes] = {}
+        self.modified: dict[tuple[str, str], datetime] = {}
+        # Error code every read fails with, to simulate an outage
+        self.failing: str | None = None
+
+    def put_object(self, Bucket, Key, Body):
+        self.objects[(Bucket, Key)] = Body.read()
+        self.modified[(Bucket, Key)] = datetime.now(timezone.utc)
+
+    def get_object(self, Bucket, Key):
+        self._check(Bucket, Key, "NoSuchKey")
+        return {"Body": io.BytesIO(self.objects[(Bucket, Key)])}
+
+    def head_object(self, Bucket, Key):
+        self._check(Bucket, Key, "404")
+        return {
+            "ContentLength": len(self.objects[(Bucket, Key)]),
+            "LastModified": self.modified[(Bucket, Key)],
+        }
+
+    def delete_object(self, Bucket, Key):
+        self.objects.pop((Bucket, Key), None)
+
+    def _check(self, Bucket, Key, missing_code):
+        if self.failing:
+            raise ClientError(self.failing)
+        if (Bucket, Key) not in self.objects:
+            raise ClientError(missing_code)
+
+
+@pytest.fixture(params=["local", "s3"])
+def store(request, tmp_path):
+    if request.param == "local":
+        return LocalBlobStore(tmp_path)
+    return S3BlobStore(InMemoryS3Client(), bucket="test")
+
+
+def test_put_is_content_addressed(store):
+    digest = store.put(b"hello")
+
+    assert digest == hashlib.sha256(b"hello").hexdigest()
+    assert store.get(digest) == b"hello"
+    assert store.exists(digest)
+
+
+def test_identical_content_is_stored_once(store):
+    assert store.put(b"same") == store.put(b"same")
+    if isinstance(store, S3BlobStore):
+        assert len(store.client.objects) == 1
+
+
+def test_chunked_writer(store):
+    writer = store.writer()
+    for chunk in (b"ab", b"cd", b"ef"):
+        writer.write(chunk)
+    digest = writer.commit()
+
+    assert writer.size == 6
+    assert store.get(digest) == b"abcdef"
+
+
+def test_aborted_writer_leaves_nothing(tmp_path):
+    store = LocalBlobStore(tmp_path)
+    writer = store.writer()
+    writer.write(b"partial")
+    writer.abort()
+
+    assert list((tmp_path / "tmp").iterdir()) == []
+
+
+def test_delete_and_missing(store):
+    digest = store.put(b"gone soon")
+    store.delete(digest)
+
+    assert not store.exists(digest)
+    with pytest.raises(BlobNotFound):
+        store.get(digest)
+
+
+@pytest.mark.parametrize("code", ["403", "SlowDown", "InternalError"])
+def test_s3_errors_other_than_missing_keys_are_raised(code):
+    store = S3BlobStore(InMemoryS3Client(), bucket="test")
+    digest = store.put(b"kept")
+    store.client.failing = code
+
+    for call in (store.get, store.exists):
+        with pytest.raises(ClientError):
+            call(digest)
+    # The collector must not take an outage for a deleted blob
+    with pytest.raises(ClientError):
+        store.delete_if_idle(digest, datetime.now(timezone.utc))
+    assert store.client.objects
+
+
+def backdate(store, digest: str, age: timedelta) -> None:
+    """Pretend the blob was last written `age` ago."""
+    when = datetime.now(timezone.utc) - age
+    if isinstance(store, S3BlobStore):
+        store.client.modified[(store.bucket, store._key(digest))] = when
+    else:
+        os.utime(store.local_path(digest), (when.timestamp(), when.timestamp()))
+
+
+def test_delete_if_idle_keeps_blobs_put_again(store):
+    digest = store.put(b"shared")
+    backdate(store, digest, timedelta(hours=2))
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=1)
+
+    # A deduplicated put refreshes the blob, so the collector keeps it
+    store.put(b"shared")
+    assert not store.delete_if_idle(digest, cutoff)
+    assert store.get(digest) == b"shared"
+
+    backdate(store, digest, timedelta(hours=2))
+    assert store.delete_if_idle(digest, cutoff)
+    assert not store.exists(digest)
+    assert store.delete_if_idle(digest, cutoff)
+
+
+def test_blob_store_is_abstract():
+    with pytest.raises(TypeError):
+        BlobStore()
+
+
+def test_posts_share_blobs_until_last_reference_is_deleted():
+    picture = make_png((1, 2, 3))
+    first, second = create_post(image=picture), create_post(image=picture)
+    digest = hashlib.sha256(picture).hexdigest()
+    assert blob_store.exists(digest)
+
+    assert client.delete(f"/posts/{first}").status_code == 204
+    assert blob_store.exists(digest)
+    assert client.get(f"/posts/{second}/image/full").content == picture
+
+    assert client.delete(f"/posts/{second}").status_code == 204
+    # Just put: kept for the grace period, in case an upload refers to it again
+    assert blob_store.exists(digest)
+    backdate(blob_store, digest, crud.BLOB_GC_GRACE * 2)
+    with Session(engine) as session:
+        assert crud.collect_orphan_blobs(session) == 1
+    assert not blob_store.exists(digest)
+
+
+def test_upload_of_an_orphaned_blob_wins_over_the_collector():
+    picture = make_png((7, 8, 9))
+    digest = hashlib.sha256(picture).hexdigest()
+    assert client.delete(f"/posts/{create_post(image=picture)}").status_code == 204
+    backdate(blob_store, digest, crud.BLOB_GC_GRACE * 2)
+
+    # An upload of the same bytes has stored (deduplicated) but not committed
+    # yet when the collector runs
+    assert blob_store.put(picture) == digest
+    with Session(engine) as session:
+        assert crud.collect_orphan_blobs(session) == 0
+    post_id = create_post(image=picture)
+
+    backdate(blob_store, digest, crud.BLOB_GC_GRACE * 2)
+    with Session(engine) as session:
+        assert crud.collect_orphan_blobs(session) == 0
+    assert client.get(f"/posts/{post_id}/image/full").content == picture
+
+
+def test_collector_keeps_orphans_the_store_fails_on(monkeypatch):
+    store = S3BlobStore(InMemoryS3Client(), bucket="test")
+    digest = store.put(b"orphan")
+    monkeypatch.setattr(crud, "blob_store", store)
+    store.client.failing = "503"
+
+    with Session(engine) as session:
+        session.add(OrphanBlob(blob_hash=digest))
+        session.commit()
+        assert crud.collect_orphan_blobs(session, grace=timedelta(0)) == 0
+        assert session.get(OrphanBlob, digest) is not None
+
+        store.client.failing = None
+        assert crud.collect_orphan_blobs(session, grace=timedelta(0)) == 1
+    assert not store.exists(digest)
+
+
+def test_image_etag_is_content_hash():
+    picture = make_png((4, 5, 6))
+    payload = {"image": encode_image(picture), "text": "t", "user": "u"}
+    post_id = client.post("/posts/", json=payload).json()["id"]
+
+    r = client.get(f"/posts/{post_id}/image/full")
+    assert r.headers["etag"] == f'"{hashlib.sha256(picture).hexdigest()}"'
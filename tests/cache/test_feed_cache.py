@@ -0,0 +1,136 @@
+import asyncio
+
+from sqlmodel import Session
+
+from backend.feed_cache import (
+    CachedBody,
+    FeedCache,
+    SharedFeedCache,
+    bump_version,
+    current_version,
+)
+from tests.conftest import client, create_post, engine
+
+
+def get(path, **params):
+    r = client.get(path, params=params)
+    assert r.status_code == 200
+    return r
+
+
+def test_feed_page_is_served_from_the_cache():
+    ids = [create_post(text=f"post {i}") for i in range(3)]
+    before = client.get("/cache/stats").json()
+
+    first = get("/posts/", limit=2)
+    second = get("/posts/", limit=2)
+    assert (first.headers["X-Cache"], second.headers["X-Cache"]) == ("MISS", "HIT")
+    assert second.json() == first.json()
+    assert [p["id"] for p in second.json()] == ids[::-1][:2]
+    assert second.headers["X-Next-Cursor"] == first.headers["X-Next-Cursor"]
+
+    stats = client.get("/cache/stats").json()
+    assert (stats["hits"] - before["hits"], stats["misses"] - before["misses"]) == (1, 1)
+    assert stats["bytes"] > 0
+
+
+def test_filters_and_pages_are_cached_separately():
+    create_post(user="alice")
+    create_post(user="bob")
+    get("/posts/")
+
+    r = get("/posts/", user="bob")
+    assert r.headers["X-Cache"] == "MISS"
+    assert [p["user"] for p in r.json()] == ["bob"]
+
+
+def test_new_and_deleted_posts_invalidate_the_feed():
+    first = create_post(text="first")
+    get("/posts/")
+
+    second = create_post(text="second")
+    r = get("/posts/")
+    assert r.headers["X-Cache"] == "MISS"
+    assert [p["id"] for p in r.json()] == [second, first]
+
+    client.delete(f"/posts/{second}")
+    assert [p["id"] for p in get("/posts/").json()] == [first]
+
+
+def test_post_detail_is_cached_until_a_comment_changes_it():
+    post_id = create_post()
+    assert get(f"/posts/{post_id}").headers["X-Cache"] == "MISS"
+    assert get(f"/posts/{post_id}").headers["X-Cache"] == "HIT"
+
+    client.post(f"/posts/{post_id}/comments", json={"text": "hi", "user": "bob"})
+    assert get(f"/posts/{post_id}").headers["X-Cache"] == "MISS"
+
+    client.delete(f"/posts/{post_id}")
+    assert client.get(f"/posts/{post_id}").status_code == 404
+
+
+def test_versions_count_from_zero():
+    with Session(engine) as session:
+        assert current_version(session) == 0
+        bump_version(session)
+        bump_version(session)
+        session.commit()
+        assert current_version(session) == 2
+
+
+def entry(size: int) -> CachedBody:
+    return CachedBody(b"x" * size, {})
+
+
+def test_lru_is_bounded_by_bytes():
+    cache = FeedCache(max_bytes=250)
+    for key in "abc":
+        cache.put(key, 1, entry(100))
+
+    assert cache.get("a", 1) is None  # evicted to stay within 250 bytes
+    assert cache.get("b", 1) is not None
+    cache.put("d", 1, entry(100))  # evicts c, b was used more recently
+    assert cache.get("c", 1) is None
+    assert cache.size == 200
+
+    cache.put("huge", 1, entry(300))
+    assert cache.get("huge", 1) is None
+
+
+def test_newer_version_drops_older_entries():
+    cache = FeedCache(max_bytes=1000)
+    cache.put("a", 1, entry(10))
+
+    assert cache.get("a", 2) is None
+    assert cache.size == 0
+    cache.put("a", 1, entry(10))  # loaded before the change: not kept
+    assert cache.get("a", 2) is None
+
+
+def test_async_read_through_loads_once_per_version():
+    cache = FeedCache(max_bytes=1000)
+    loads = []
+
+    async def load():
+        loads.append(1)
+        return entry(10)
+
+    async def main():
+        return [(await cache.read_through_async("a", load, version))[1] for version in (1, 1, 2)]
+
+    assert asyncio.run(main()) == [False, True, False]
+    assert len(loads) == 2
+
+
+def test_shared_tier_serves_other_processes(tmp_path):
+    path = str(tmp_path / "feed.sqlite3")
+    writer = FeedCache(max_bytes=1000, shared=SharedFeedCache(path))
+    reader = FeedCache(max_bytes=1000, shared=SharedFeedCache(path))
+
+    writer.put("page", 3, CachedBody(b"[]", {"X-Next-Cursor": "abc"}))
+    assert reader.get("page", 3) == CachedBody(b"[]", {"X-Next-Cursor": "abc"})
+    assert (reader.hits, reader.shared_hits) == (1, 1)
+    assert reader.get("page", 4) is None
+
+    writer.put("other", 4, entry(10))
+    assert SharedFeedCache(path).get("page", 3) is None
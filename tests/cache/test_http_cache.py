@@ -0,0 +1,93 @@
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+from backend.http_cache import Validators
+from tests.conftest import client, count_queries, create_comment, create_post
+
+
+def test_reads_carry_validators():
+    post_id = create_post()
+    for path in ("/posts/", f"/posts/{post_id}", f"/posts/{post_id}/comments"):
+        r = client.get(path)
+        assert r.status_code == 200
+        assert r.headers["ETag"].startswith('W/"posts-')
+        assert r.headers["Cache-Control"] == "no-cache"
+        assert "Last-Modified" in r.headers
+
+
+def test_unchanged_feed_is_304_after_a_single_query():
+    create_post()
+    etag = client.get("/posts/").headers["ETag"]
+
+    with count_queries() as statements:
+        r = client.get("/posts/", headers={"If-None-Match": etag})
+    assert r.status_code == 304
+    assert r.content == b""
+    assert r.headers["ETag"] == etag
+    assert len(statements) == 1 and "cache_version" in statements[0]
+
+
+def test_changes_give_a_new_etag():
+    post_id = create_post()
+    etag = client.get(f"/posts/{post_id}/comments").headers["ETag"]
+
+    create_comment(post_id)
+    r = client.get(f"/posts/{post_id}/comments", headers={"If-None-Match": etag})
+    assert r.status_code == 200
+    assert r.headers["ETag"] != etag
+    assert len(r.json()) == 1
+
+
+def test_if_modified_since():
+    create_post()
+    last_modified = client.get("/posts/").headers["Last-Modified"]
+
+    r = client.get("/posts/", headers={"If-Modified-Since": last_modified})
+    assert r.status_code == 304
+
+    earlier = format_datetime(datetime.now(timezone.utc) - timedelta(hours=1), usegmt=True)
+    assert client.get("/posts/", headers={"If-Modified-Since": earlier}).status_code == 200
+    assert client.get("/posts/", headers={"If-Modified-Since": "garbage"}).status_code == 200
+
+
+def test_etag_wins_over_if_modified_since():
+    create_post()
+    last_modified = client.get("/posts/").headers["Last-Modified"]
+
+    r = client.get(
+        "/posts/", headers={"If-None-Match": 'W/"stale"', "If-Modified-Since": last_modified}
+    )
+    assert r.status_code == 200
+
+
+def test_etag_comparison_is_weak_and_takes_lists():
+    validators = Validators(3, 'W/"posts-3-1"', None)
+    assert validators.not_modified('"other", "posts-3-1"', None)
+    assert validators.not_modified("*", None)
+    assert not validators.not_modified('W/"posts-2-1"', None)
+    assert not validators.not_modified(None, "Mon, 01 Jan 2024 00:00:00 GMT")
+
+
+def test_large_json_is_gzipped():
+    for i in range(30):
+        text = f"a post with some text to make the feed page bigger {i}"
+        client.post("/posts/", json={"text": text, "user": "alice"})
+
+    r = client.get("/posts/", params={"limit": 30}, headers={"Accept-Encoding": "gzip"})
+    assert r.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in r.headers["Vary"]
+    assert len(r.json()) == 30
+
+    r = client.get("/posts/", params={"limit": 1}, headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in r.headers
+    r = client.get("/posts/", params={"limit": 30}, headers={"Accept-Encoding": "identity"})
+    assert "Content-Encoding" not in r.headers
+
+
+def test_images_and_jobs_are_not_touched():
+    post_id = create_post()
+    r = client.get(f"/posts/{post_id}/image/full", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in r.headers
+
+    job = client.post("/posts/generate", json={"user": "ai", "prompt": "x"}).json()
+    assert client.get(f"/jobs/{job['id']}").headers["Cache-Control"] == "no-store"
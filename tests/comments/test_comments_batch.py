@@ -0,0 +1,68 @@
+from tests.conftest import client, count_queries, create_comment, create_post
+
+
+def test_feed_includes_comment_counts_and_latest_comments():
+    busy, quiet = create_post(text="busy"), create_post(text="quiet")
+    for i in range(5):
+        create_comment(busy, text=f"c{i}")
+
+    r = client.get("/posts/", params={"include": "comment_count,latest_comments"})
+    assert r.status_code == 200
+    posts = {post["id"]: post for post in r.json()}
+
+    assert posts[busy]["comment_count"] == 5
+    assert [c["text"] for c in posts[busy]["latest_comments"]] == ["c2", "c3", "c4"]
+    assert posts[quiet]["comment_count"] == 0
+    assert posts[quiet]["latest_comments"] == []
+
+
+def test_feed_includes_cost_one_query_each_for_the_page():
+    for _ in range(6):
+        create_comment(create_post())
+
+    with count_queries() as plain:
+        client.get("/posts/")
+    with count_queries() as included:
+        r = client.get("/posts/", params={"include": "latest_comments,comment_count"})
+
+    assert all(post["comment_count"] == 1 for post in r.json())
+    assert len(included) == len(plain) + 2
+
+
+def test_feed_without_include_leaves_the_extras_out():
+    create_comment(create_post())
+
+    (post,) = client.get("/posts/").json()
+    assert post["comment_count"] is None and post["latest_comments"] is None
+
+
+def test_unknown_include_is_rejected():
+    create_post()
+    r = client.get("/posts/", params={"include": "comment_count,likes"})
+    assert r.status_code == 422
+    assert "likes" in r.json()["detail"]
+
+
+def test_comments_of_many_posts_in_one_request():
+    first, second, empty = create_post(), create_post(), create_post()
+    create_comment(first, text="a")
+    create_comment(second, text="b")
+    create_comment(first, text="c")
+
+    r = client.get("/comments/", params={"post_id": [first, second, empty, first]})
+    assert r.status_code == 200
+    comments = r.json()
+
+    assert set(comments) == {str(first), str(second), str(empty)}
+    assert [c["text"] for c in comments[str(first)]] == ["a", "c"]
+    assert [c["text"] for c in comments[str(second)]] == ["b"]
+    assert comments[str(empty)] == []
+
+    latest = client.get("/comments/", params={"post_id": [first], "latest": 1}).json()
+    assert [c["text"] for c in latest[str(first)]] == ["c"]
+
+
+def test_comment_batch_needs_post_ids():
+    assert client.get("/comments/").status_code == 422
+    too_many = list(range(1, 102))
+    assert client.get("/comments/", params={"post_id": too_many}).status_code == 422
@@ -13,3 +13,8 @@ def test_create_comment():
     assert data["text"] == "nice post"
     assert data["user"] == "alice"
     assert data["super_id"] == post_id
+
+
+def test_create_comment_for_missing_post():
+    r = client.post("/posts/99999999/comments", json={"text": "orphan", "user": "alice"})
+    assert r.status_code == 404
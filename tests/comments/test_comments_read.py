@@ -1,3 +1,4 @@
+from backend.schemas import CommentRead
 from tests.conftest import client, create_comment, create_post
 
 
@@ -18,3 +19,58 @@ def test_get_comment_by_id():
     r = client.get(f"/comments/{comment_id}")
     assert r.status_code == 200
     assert r.json()["text"] == "unique"
+
+
+def test_comment_rows_match_the_response_model():
+    post_id = create_post()
+    comment_id = create_comment(post_id, text="fast", user="erin")
+
+    (row,) = client.get(f"/posts/{post_id}/comments").json()
+    # Same JSON as validating and serializing with CommentRead
+    expected = CommentRead.model_validate(row).model_dump(mode="json")
+    assert row == expected
+    assert row["comment_id"] == comment_id and row["super_id"] == post_id
+    assert "ETag" in client.get(f"/posts/{post_id}/comments").headers
+
+
+def test_get_comments_paginated_oldest_first():
+    post_id = create_post()
+    ids = [create_comment(post_id, text=f"c{i}") for i in range(5)]
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        r = client.get(f"/posts/{post_id}/comments", params=params)
+        assert r.status_code == 200
+        seen += [c["comment_id"] for c in r.json()]
+        cursor = r.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+
+    assert seen == ids
+
+
+def test_get_comments_paginated_with_filters():
+    post_id = create_post()
+    wanted = [create_comment(post_id, text=f"apple {i}", user="bob") for i in range(3)]
+    create_comment(post_id, text="apple pie", user="carol")
+    create_comment(post_id, text="banana", user="bob")
+
+    r = client.get(
+        f"/posts/{post_id}/comments", params={"text": "apple", "user": "bob", "limit": 2}
+    )
+    assert [c["comment_id"] for c in r.json()] == wanted[:2]
+
+    cursor = r.headers["X-Next-Cursor"]
+    r = client.get(
+        f"/posts/{post_id}/comments",
+        params={"text": "apple", "user": "bob", "limit": 2, "cursor": cursor},
+    )
+    assert [c["comment_id"] for c in r.json()] == wanted[2:]
+    assert "X-Next-Cursor" not in r.headers
+
+
+def test_get_comments_invalid_page_parameters():
+    post_id = create_post()
+    assert client.get(f"/posts/{post_id}/comments", params={"limit": 0}).status_code == 422
+    assert client.get(f"/posts/{post_id}/comments", params={"cursor": "nope"}).status_code == 400
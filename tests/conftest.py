@@ -1,17 +1,36 @@
 import os
+import tempfile
 
 os.environ["WALLOH_SOCIAL_TESTING"] = "1"
+# Image blobs of the test run go to a throwaway directory
+os.environ.setdefault("BLOB_ROOT", tempfile.mkdtemp(prefix="social-blobs-"))
 
 import base64  # noqa: E402
+import io  # noqa: E402
+import json  # noqa: E402
+from contextlib import contextmanager  # noqa: E402
 
 import pytest  # noqa: E402
 from fastapi.testclient import TestClient  # noqa: E402
-from sqlmodel import Session, SQLModel, create_engine  # noqa: E402
-
-from backend.main import app, get_session  # noqa: E402
-
-TEST_DB_URL = "sqlite:///./test.db"
-engine = create_engine(TEST_DB_URL, connect_args={"check_same_thread": False})
+from pika.exceptions import (  # noqa: E402
+    AMQPConnectionError,
+    ChannelClosedByBroker,
+    NackError,
+    StreamLostError,
+)
+from PIL import Image  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+from sqlmodel import Session, SQLModel  # noqa: E402
+
+from backend.database import create_db_engine  # noqa: E402
+from backend.feed_cache import feed_cache  # noqa: E402
+from backend.main import app, get_read_session, get_session  # noqa: E402
+from backend.search import install_search_index  # noqa: E402
+
+# SQLite file by default; point TEST_DB_URL at a PostgreSQL database
+# (e.g. postgresql+psycopg://user:pw@localhost/social_test) to run against it.
+TEST_DB_URL = os.environ.get("TEST_DB_URL", "sqlite:///./test.db")
+engine = create_db_engine(TEST_DB_URL)
 
 
 # --------------------------
@@ -23,6 +42,7 @@ def get_test_session():
 
 
 app.dependency_overrides[get_session] = get_test_session
+app.dependency_overrides[get_read_session] = get_test_session
 client = TestClient(app)
 
 
@@ -33,6 +53,8 @@ client = TestClient(app)
 def setup_db():
     SQLModel.metadata.drop_all(engine)
     SQLModel.metadata.create_all(engine)
+    with engine.begin() as conn:
+        install_search_index(conn, rebuild=True)
 
 
 @pytest.fixture(autouse=True)
@@ -42,16 +64,29 @@ def clean_db_after_test():
         for table in reversed(SQLModel.metadata.sorted_tables):
             session.exec(table.delete())
         session.commit()
+    # The version counters restart with the emptied tables
+    feed_cache.clear()
 
 
 # --------------------------
 # Helpers
 # --------------------------
-def encode_image(content: str) -> str:
-    return base64.b64encode(content.encode()).decode()
+def make_png(color=(200, 30, 30), size=(8, 8)) -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", size, color).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+TEST_PNG = make_png()
 
 
-def create_post(text="Test", user="tester", image="img.png"):
+def encode_image(content: bytes | str) -> str:
+    if isinstance(content, str):
+        content = content.encode()
+    return base64.b64encode(content).decode()
+
+
+def create_post(text="Test", user="tester", image=TEST_PNG):
     payload = {
         "image": encode_image(image),
         "text": text,
@@ -67,3 +102,101 @@ def create_comment(post_id, text="Test comment", user="tester2"):
     r = client.post(f"/posts/{post_id}/comments", json=payload)
     assert r.status_code == 200
     return r.json()["comment_id"]
+
+
+@contextmanager
+def count_queries():
+    """Collects the SQL statements run against the test database."""
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+
+# --------------------------
+# In-process stand-in for RabbitMQ
+# --------------------------
+class InMemoryBroker:
+    """
+    Minimal broker double for RabbitPublisher: records declared queues and
+    published messages, and can drop connections to exercise reconnects.
+    """
+
+    def __init__(self):
+        self.queues: dict[str, list[dict]] = {}
+        self.queue_arguments: dict[str, dict] = {}
+        # (routing key, delivery mode, published on a confirming channel)
+        self.published: list[tuple[str, int | None, bool]] = []
+        self.exchanges: dict[str, str] = {}
+        self.bindings: list[tuple[str, str]] = []
+        self.connections: list["InMemoryConnection"] = []
+        self.fail_next_publish = False
+        # Publishes on confirming channels the broker nacks, e.g. out of disk
+        self.nack_publishes = 0
+        self.down = False
+
+    def connect(self):
+        if self.down:
+            raise AMQPConnectionError("broker down")
+        connection = InMemoryConnection(self)
+        self.connections.append(connection)
+        return connection
+
+    def messages(self, queue: str) -> list[dict]:
+        return self.queues.get(queue, [])
+
+
+class InMemoryConnection:
+    def __init__(self, broker: InMemoryBroker):
+        self.broker = broker
+        self.is_open = True
+
+    def channel(self):
+        return InMemoryChannel(self)
+
+    def process_data_events(self, time_limit=None):
+        if not self.is_open:
+            raise StreamLostError("connection lost")
+
+    def close(self):
+        self.is_open = False
+
+
+class InMemoryChannel:
+    def __init__(self, connection: InMemoryConnection):
+        self.connection = connection
+        self.confirming = False
+
+    def confirm_delivery(self):
+        self.confirming = True
+
+    def exchange_declare(self, exchange, exchange_type="direct", durable=False):
+        self.connection.broker.exchanges[exchange] = exchange_type
+
+    def queue_declare(self, queue, durable=False, arguments=None):
+        broker = self.connection.broker
+        if broker.queue_arguments.setdefault(queue, arguments or {}) != (arguments or {}):
+            raise ChannelClosedByBroker(406, f"PRECONDITION_FAILED - inequivalent arg ({queue})")
+        broker.queues.setdefault(queue, [])
+
+    def queue_bind(self, queue, exchange, routing_key=None):
+        self.connection.broker.bindings.append((exchange, queue))
+
+    def basic_publish(self, exchange, routing_key, body, properties=None, mandatory=False):
+        broker = self.connection.broker
+        if broker.fail_next_publish or not self.connection.is_open:
+            broker.fail_next_publish = False
+            self.connection.is_open = False
+            raise StreamLostError("connection lost")
+        if broker.nack_publishes and self.confirming:
+            broker.nack_publishes -= 1
+            raise NackError([body])
+        delivery_mode = properties.delivery_mode if properties else None
+        broker.published.append((routing_key, delivery_mode, self.confirming))
+        broker.queues.setdefault(routing_key, []).append(json.loads(body))
@@ -0,0 +1,24 @@
+from sqlalchemy import text
+
+from backend.database import SQLITE_PRAGMAS, create_db_engine
+
+
+def test_sqlite_file_engine_applies_pragmas(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'tuned.db'}")
+
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() == SQLITE_PRAGMAS["busy_timeout"]
+        assert conn.execute(text("PRAGMA temp_store")).scalar() == 2  # MEMORY
+    assert engine.pool.size() > 1
+
+
+def test_sqlite_memory_engine_shares_one_database():
+    engine = create_db_engine("sqlite:///:memory:")
+
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE t (x INTEGER)"))
+        conn.execute(text("INSERT INTO t VALUES (1)"))
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT x FROM t")).scalar() == 1
@@ -0,0 +1,120 @@
+from sqlalchemy import create_engine, inspect, text
+from sqlmodel import Session, SQLModel
+
+from backend import migrations, search
+from backend.blobstore import blob_store
+from backend.migrations import MIGRATIONS, applied_versions, run_migrations
+
+LEGACY_SCHEMA = [
+    "CREATE TABLE post (id INTEGER PRIMARY KEY, image_full BLOB, image_thumb BLOB, "
+    "text VARCHAR NOT NULL, user VARCHAR NOT NULL, created_at DATETIME NOT NULL)",
+    "CREATE TABLE comment (super_id INTEGER REFERENCES post (id), "
+    "comment_id INTEGER PRIMARY KEY, text VARCHAR NOT NULL, user VARCHAR NOT NULL, "
+    "created_at DATETIME NOT NULL)",
+    "INSERT INTO post VALUES (1, x'0102', NULL, 'first', 'a', '2024-01-01 00:00:00.000000')",
+    "INSERT INTO post VALUES (2, x'0304', x'05', 'second', 'b', '2024-01-02 00:00:00.000000')",
+]
+
+
+def legacy_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as conn:
+        for statement in LEGACY_SCHEMA:
+            conn.execute(text(statement))
+    return engine
+
+
+def test_migrations_upgrade_legacy_database(tmp_path, monkeypatch):
+    monkeypatch.setattr(migrations, "MIGRATION_BATCH_SIZE", 1)
+    engine = legacy_engine(tmp_path)
+    SQLModel.metadata.create_all(engine)
+
+    assert run_migrations(engine) == [m.version for m in MIGRATIONS]
+
+    with engine.connect() as conn:
+        images = conn.execute(
+            text("SELECT post_id, variant, blob_hash FROM post_image ORDER BY post_id, variant")
+        ).all()
+        found = conn.execute(text("SELECT rowid FROM post_fts WHERE post_fts MATCH 'second'"))
+        assert [row[0] for row in found] == [2]
+
+    assert [(post_id, variant, blob_store.get(digest)) for post_id, variant, digest in images] == [
+        (1, "full", b"\x01\x02"),
+        (2, "full", b"\x03\x04"),
+        (2, "thumb", b"\x05"),
+    ]
+    inspector = inspect(engine)
+    assert "image_full" not in {c["name"] for c in inspector.get_columns("post")}
+    assert "ix_post_user_created_at_id" in {i["name"] for i in inspector.get_indexes("post")}
+    comment_indexes = {i["name"] for i in inspector.get_indexes("comment")}
+    assert {"ix_comment_super_id_user", "ix_comment_super_id_created_at_id"} <= comment_indexes
+
+
+def test_migrations_without_fts5_fall_back_to_like_search(tmp_path, monkeypatch):
+    monkeypatch.setattr(search, "sqlite_has_fts5", lambda: False)
+    engine = legacy_engine(tmp_path)
+    SQLModel.metadata.create_all(engine)
+
+    assert run_migrations(engine) == [m.version for m in MIGRATIONS]
+
+    assert "post_fts" not in inspect(engine).get_table_names()
+    with Session(engine) as session:
+        assert [hit["id"] for hit in search.search_posts(session, "second", 10)] == [2]
+
+
+def test_migrations_are_applied_once(tmp_path):
+    engine = legacy_engine(tmp_path)
+    SQLModel.metadata.create_all(engine)
+
+    run_migrations(engine)
+    assert run_migrations(engine) == []
+    assert applied_versions(engine) == {m.version for m in MIGRATIONS}
+
+
+def test_migrations_on_fresh_database(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'fresh.db'}")
+    SQLModel.metadata.create_all(engine)
+
+    assert run_migrations(engine) == [m.version for m in MIGRATIONS]
+
+
+PNG = b"\x89PNG\r\n\x1a\n same"
+
+
+def test_image_bytes_move_to_blob_store(tmp_path, monkeypatch):
+    # One row per batch: every page is visited
+    monkeypatch.setattr(migrations, "MIGRATION_BATCH_SIZE", 1)
+    # post_image as it was before migration 5: bytes in a BLOB column
+    engine = create_engine(f"sqlite:///{tmp_path / 'blobs.db'}")
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                "CREATE TABLE post_image (post_id INTEGER, variant VARCHAR, data BLOB NOT NULL, "
+                "width INTEGER, height INTEGER, content_type VARCHAR, "
+                "PRIMARY KEY (post_id, variant))"
+            )
+        )
+        conn.execute(
+            text("INSERT INTO post_image (post_id, variant, data) VALUES (1, 'full', :d)"),
+            {"d": PNG},
+        )
+        conn.execute(
+            text(
+                "INSERT INTO post_image (post_id, variant, data) "
+                "VALUES (2, 'full', :d), (2, 'thumb', :d)"
+            ),
+            {"d": PNG},
+        )
+    SQLModel.metadata.create_all(engine)
+
+    run_migrations(engine)
+
+    with engine.connect() as conn:
+        rows = conn.execute(
+            text("SELECT blob_hash, size, content_type FROM post_image ORDER BY post_id")
+        ).all()
+    assert "data" not in {c["name"] for c in inspect(engine).get_columns("post_image")}
+    # Identical images share one blob
+    assert rows[0] == rows[1] == rows[2]
+    assert rows[0][1:] == (len(PNG), "image/png")
+    assert blob_store.get(rows[0][0]) == PNG
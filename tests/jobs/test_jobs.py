@@ -0,0 +1,159 @@
+import asyncio
+
+from backend.jobs import job_events
+from backend.schemas import JobRead
+from tests.conftest import client, create_post
+
+
+def generate_post(prompt="cats") -> dict:
+    r = client.post("/posts/generate", json={"user": "ai", "prompt": prompt})
+    assert r.status_code == 202
+    job = r.json()
+    assert r.headers["location"] == f"/jobs/{job['id']}"
+    return job
+
+
+def test_generate_returns_queued_job():
+    job = generate_post()
+    assert job["kind"] == "post"
+    assert job["status"] == "queued"
+
+    r = client.get(f"/jobs/{job['id']}")
+    assert r.status_code == 200
+    assert r.json() == job
+
+
+def test_comment_job_knows_its_post():
+    post_id = create_post()
+    r = client.post(f"/posts/{post_id}/comments/generate", json={"user": "ai"})
+    assert r.status_code == 202
+    job = r.json()
+    assert (job["kind"], job["post_id"]) == ("comment", post_id)
+
+
+def test_unknown_job_is_404():
+    assert client.get("/jobs/nope").status_code == 404
+    assert client.get("/jobs/nope/stream").status_code == 404
+    assert client.patch("/jobs/nope", json={"status": "running"}).status_code == 404
+
+
+def test_worker_progress_then_created_post_completes_the_job():
+    job = generate_post()
+    r = client.patch(f"/jobs/{job['id']}", json={"status": "running", "text": "Cats are"})
+    assert (r.json()["status"], r.json()["text"]) == ("running", "Cats are")
+
+    r = client.post("/posts/", json={"text": "Cats are great", "user": "ai", "job_id": job["id"]})
+    assert r.status_code == 200
+    done = client.get(f"/jobs/{job['id']}").json()
+    assert (done["status"], done["post_id"]) == ("done", r.json()["id"])
+
+    # Late reports of a redelivered attempt do not reopen it
+    client.patch(f"/jobs/{job['id']}", json={"status": "running", "text": "again"})
+    assert client.get(f"/jobs/{job['id']}").json()["status"] == "done"
+
+
+def test_created_comment_completes_the_job():
+    post_id = create_post()
+    job = client.post(f"/posts/{post_id}/comments/generate", json={"user": "ai"}).json()
+
+    r = client.post(
+        f"/posts/{post_id}/comments", json={"text": "Nice", "user": "ai", "job_id": job["id"]}
+    )
+    assert r.status_code == 200
+    done = client.get(f"/jobs/{job['id']}").json()
+    assert (done["status"], done["comment_id"]) == ("done", r.json()["comment_id"])
+
+
+def test_redelivered_jobs_create_their_post_and_comment_once():
+    job = generate_post()
+    payload = {"text": "Cats are great", "user": "ai", "job_id": job["id"]}
+    first = client.post("/posts/", json=payload).json()
+    # The worker ran the job again (redelivered message): same post, no second one
+    again = client.post("/posts/", json={**payload, "text": "Cats rule"}).json()
+    assert again == first
+    assert [p["id"] for p in client.get("/posts/").json()] == [first["id"]]
+
+    post_id = first["id"]
+    job = client.post(f"/posts/{post_id}/comments/generate", json={"user": "ai"}).json()
+    payload = {"text": "Nice", "user": "ai", "job_id": job["id"]}
+    first = client.post(f"/posts/{post_id}/comments", json=payload).json()
+    assert client.post(f"/posts/{post_id}/comments", json=payload).json() == first
+    assert len(client.get(f"/posts/{post_id}/comments").json()) == 1
+
+
+def test_stream_of_a_finished_job_ends_with_done():
+    job = generate_post()
+    client.patch(f"/jobs/{job['id']}", json={"text": "Hello"})
+    post_id = client.post(
+        "/posts/", json={"text": "Hello", "user": "ai", "job_id": job["id"]}
+    ).json()["id"]
+
+    r = client.get(f"/jobs/{job['id']}/stream")
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/event-stream")
+    assert 'event: token\ndata: {"delta": "Hello"}' in r.text
+    assert r.text.endswith(f'event: done\ndata: {{"post_id": {post_id}, "comment_id": null}}\n\n')
+
+
+def test_failed_job_stream_reports_the_error():
+    job = generate_post()
+    client.patch(f"/jobs/{job['id']}", json={"status": "failed", "error": "LLM down"})
+    r = client.get(f"/jobs/{job['id']}/stream")
+    assert r.text.endswith('event: failed\ndata: {"error": "LLM down"}\n\n')
+
+
+def job_state(status, text="", **fields) -> JobRead:
+    now = "2024-01-01T00:00:00"
+    return JobRead(
+        id="j", kind="post", status=status, text=text, created_at=now, updated_at=now, **fields
+    )
+
+
+def collect(states) -> list[str]:
+    states = iter(states)
+
+    async def load_job():
+        return next(states)
+
+    async def main():
+        return [event async for event in job_events(load_job, poll_interval=0)]
+
+    return asyncio.run(main())
+
+
+def test_events_push_status_changes_and_token_deltas():
+    events = collect(
+        [
+            job_state("queued"),
+            job_state("running"),
+            job_state("running", "Hel"),
+            job_state("running", "Hel"),
+            job_state("running", "Hello"),
+            job_state("done", "Hello", post_id=7),
+        ]
+    )
+    assert events == [
+        'event: status\ndata: {"status": "queued"}\n\n',
+        'event: status\ndata: {"status": "running"}\n\n',
+        'event: token\ndata: {"delta": "Hel"}\n\n',
+        'event: token\ndata: {"delta": "lo"}\n\n',
+        'event: done\ndata: {"post_id": 7, "comment_id": null}\n\n',
+    ]
+
+
+def test_restarted_text_is_sent_whole():
+    events = collect(
+        [
+            job_state("running", "First try"),
+            job_state("running", "Second"),
+            job_state("failed", "Second", error="LLM down"),
+        ]
+    )
+    assert events[1:] == [
+        'event: text\ndata: {"text": "Second"}\n\n',
+        'event: failed\ndata: {"error": "LLM down"}\n\n',
+    ]
+
+
+def test_vanished_job_ends_the_stream():
+    assert collect([job_state("queued"), None])[-1].startswith("event: failed")
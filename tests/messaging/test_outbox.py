@@ -0,0 +1,102 @@
+import asyncio
+
+from sqlmodel import Session, select
+
+from backend.messaging import RabbitPublisher
+from backend.models import OutboxMessage
+from backend.outbox import OutboxDispatcher, dispatch_pending
+from tests.conftest import InMemoryBroker, client, create_post, engine
+
+
+def pending_queues() -> list[str]:
+    with Session(engine) as session:
+        return [m.queue for m in session.exec(select(OutboxMessage)).all()]
+
+
+def test_create_post_with_image_writes_resize_job_to_outbox():
+    create_post()
+    assert pending_queues() == ["image.resize"]
+
+
+def test_create_post_without_image_writes_no_job():
+    r = client.post("/posts/", json={"image": None, "text": "plain", "user": "alice"})
+    assert r.status_code == 200
+    assert pending_queues() == []
+
+
+def test_generate_endpoints_enqueue_jobs():
+    r = client.post("/posts/generate", json={"user": "ai", "prompt": "cats"})
+    assert r.status_code == 202
+
+    post_id = client.post("/posts/", json={"text": "t", "user": "u"}).json()["id"]
+    r = client.post(f"/posts/{post_id}/comments/generate", json={"user": "ai"})
+    assert r.status_code == 202
+
+    assert pending_queues() == ["posts.generate", "comments.generate"]
+
+
+def test_dispatch_pending_publishes_and_deletes_in_batches():
+    post_ids = [create_post() for _ in range(3)]
+    broker = InMemoryBroker()
+    publisher = RabbitPublisher(connection_factory=broker.connect)
+
+    with Session(engine) as session:
+        assert dispatch_pending(session, publisher, batch_size=2) == 2
+        assert dispatch_pending(session, publisher, batch_size=2) == 1
+        assert dispatch_pending(session, publisher, batch_size=2) == 0
+
+    assert broker.messages("image.resize") == [{"post_id": i} for i in post_ids]
+    assert pending_queues() == []
+
+
+def test_dispatch_pending_keeps_messages_while_broker_is_down():
+    create_post()
+    broker = InMemoryBroker()
+    broker.down = True
+    publisher = RabbitPublisher(connection_factory=broker.connect)
+
+    with Session(engine) as session:
+        assert dispatch_pending(session, publisher) == 0
+    assert pending_queues() == ["image.resize"]
+
+    broker.down = False
+    with Session(engine) as session:
+        assert dispatch_pending(session, publisher) == 1
+    assert pending_queues() == []
+
+
+def test_dispatch_pending_keeps_messages_the_broker_does_not_confirm():
+    first, second = create_post(), create_post()
+    broker = InMemoryBroker()
+    publisher = RabbitPublisher(connection_factory=broker.connect)
+    # Nacked on the first attempt and on the retry
+    broker.nack_publishes = 2
+
+    with Session(engine) as session:
+        assert dispatch_pending(session, publisher) == 0
+    assert broker.messages("image.resize") == []
+    assert pending_queues() == ["image.resize", "image.resize"]
+
+    with Session(engine) as session:
+        assert dispatch_pending(session, publisher) == 2
+    assert broker.messages("image.resize") == [{"post_id": first}, {"post_id": second}]
+    assert pending_queues() == []
+
+
+def test_dispatcher_drains_outbox_when_notified():
+    post_id = create_post()
+    broker = InMemoryBroker()
+    publisher = RabbitPublisher(connection_factory=broker.connect)
+    dispatcher = OutboxDispatcher(lambda: Session(engine), publisher, poll_interval=60)
+
+    async def run():
+        dispatcher.start()
+        dispatcher.notify()
+        for _ in range(100):
+            if broker.messages("image.resize"):
+                break
+            await asyncio.sleep(0.01)
+        await dispatcher.stop()
+
+    asyncio.run(run())
+    assert broker.messages("image.resize") == [{"post_id": post_id}]
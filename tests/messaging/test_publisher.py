@@ -0,0 +1,108 @@
+import re
+from pathlib import Path
+
+import pytest
+from pika.exceptions import AMQPError
+
+from backend.messaging import (
+    DEAD_LETTER_EXCHANGE,
+    PARKED_QUEUE,
+    QUEUES,
+    RabbitPublisher,
+)
+from tests.conftest import InMemoryBroker
+
+
+def test_publish_reuses_connection_and_declares_queues_once():
+    broker = InMemoryBroker()
+    publisher = RabbitPublisher(connection_factory=broker.connect, queues=("image.resize",))
+    publisher.start()
+
+    publisher.publish("image.resize", {"post_id": 1})
+    publisher.publish("image.resize", {"post_id": 2})
+
+    assert broker.messages("image.resize") == [{"post_id": 1}, {"post_id": 2}]
+    assert len(broker.connections) == 1
+    publisher.stop()
+    assert not broker.connections[0].is_open
+
+
+def test_publish_reconnects_after_connection_loss():
+    broker = InMemoryBroker()
+    publisher = RabbitPublisher(connection_factory=broker.connect)
+
+    publisher.publish("posts.generate", {"n": 1})
+    broker.fail_next_publish = True
+    publisher.publish("posts.generate", {"n": 2})
+
+    assert broker.messages("posts.generate") == [{"n": 1}, {"n": 2}]
+    assert len(broker.connections) == 2
+
+
+def test_publish_is_persistent_and_confirmed_by_default():
+    broker = InMemoryBroker()
+    publisher = RabbitPublisher(connection_factory=broker.connect)
+
+    publisher.publish("comments.generate", {"post_id": 3})
+
+    assert broker.messages("comments.generate") == [{"post_id": 3}]
+    assert broker.published == [("comments.generate", 2, True)]
+
+
+def test_publish_without_confirms():
+    broker = InMemoryBroker()
+    publisher = RabbitPublisher(connection_factory=broker.connect, confirm_delivery=False)
+
+    publisher.publish("comments.generate", {"post_id": 3})
+
+    assert broker.published == [("comments.generate", 2, False)]
+
+
+def test_start_tolerates_unreachable_broker_and_publish_raises():
+    broker = InMemoryBroker()
+    broker.down = True
+    publisher = RabbitPublisher(connection_factory=broker.connect)
+    publisher.start()
+
+    with pytest.raises(AMQPError):
+        publisher.publish("image.resize", {"post_id": 1})
+
+    broker.down = False
+    publisher.publish("image.resize", {"post_id": 1})
+    assert broker.messages("image.resize") == [{"post_id": 1}]
+
+
+def test_job_queues_dead_letter_to_parked_queue():
+    broker = InMemoryBroker()
+    publisher = RabbitPublisher(connection_factory=broker.connect)
+    publisher.start()
+
+    assert broker.exchanges[DEAD_LETTER_EXCHANGE] == "fanout"
+    assert (DEAD_LETTER_EXCHANGE, PARKED_QUEUE) in broker.bindings
+    # Dead-lettering is a broker policy (rabbitmq/set_policies.sh); the parked
+    # queue is outside its pattern, so it does not dead-letter (no loops)
+    for name in QUEUES + (PARKED_QUEUE,):
+        assert broker.queue_arguments[name] == {}
+
+
+def test_dead_letter_policy_covers_the_job_queues():
+    script = Path(__file__).parents[2] / "rabbitmq" / "set_policies.sh"
+    pattern, definition = re.findall(r"'([^']+)'", script.read_text())
+
+    assert all(re.fullmatch(pattern, name) for name in QUEUES)
+    assert not re.fullmatch(pattern, PARKED_QUEUE)
+    assert definition == f'{{"dead-letter-exchange":"{DEAD_LETTER_EXCHANGE}"}}'
+
+
+def test_publisher_redeclares_existing_job_queues():
+    broker = InMemoryBroker()
+    # Queues as declared before the dead-letter setup: redeclaring them with
+    # other arguments would close the channel (406 PRECONDITION_FAILED)
+    channel = broker.connect().channel()
+    for name in QUEUES:
+        channel.queue_declare(queue=name, durable=True)
+    publisher = RabbitPublisher(connection_factory=broker.connect)
+
+    publisher.publish("image.resize", {"post_id": 1})
+
+    assert broker.messages("image.resize") == [{"post_id": 1}]
@@ -0,0 +1,91 @@
+from types import SimpleNamespace
+
+from backend.messaging import PARKED_QUEUE
+from backend.replay_parked import original_queue, replay
+
+
+class ParkedChannel:
+    """basic_get / publish / ack over an in-memory parked queue."""
+
+    def __init__(self, messages):
+        # (headers, body); a message handed out stays unacked until acked
+        self.parked = list(messages)
+        self.unacked: dict[int, tuple] = {}
+        self.published: list[tuple[str, bytes]] = []
+        self._tag = 0
+
+    def basic_get(self, queue):
+        assert queue == PARKED_QUEUE
+        if not self.parked:
+            return None, None, None
+        headers, body = self.parked.pop(0)
+        self._tag += 1
+        self.unacked[self._tag] = (headers, body)
+        return SimpleNamespace(delivery_tag=self._tag), SimpleNamespace(headers=headers), body
+
+    def basic_publish(self, exchange, routing_key, body, properties=None):
+        self.published.append((routing_key, body))
+
+    def basic_ack(self, delivery_tag):
+        del self.unacked[delivery_tag]
+
+    def close(self):
+        # Unacked messages go back to the queue
+        self.parked.extend(self.unacked.values())
+        self.unacked.clear()
+
+
+def parked(queue, body):
+    return {"x-first-death-queue": queue, "x-death": [{"queue": queue, "count": 1}]}, body
+
+
+def test_original_queue_from_headers():
+    assert original_queue(SimpleNamespace(headers=parked("posts.generate", b"")[0])) == (
+        "posts.generate"
+    )
+    assert original_queue(SimpleNamespace(headers={"x-death": [{"queue": b"image.resize"}]})) == (
+        "image.resize"
+    )
+    assert original_queue(SimpleNamespace(headers=None)) is None
+
+
+def test_replay_moves_messages_back_to_their_queue():
+    channel = ParkedChannel(
+        [parked("posts.generate", b"p1"), parked("image.resize", b"r1"), ({}, b"unknown")]
+    )
+
+    replayed = replay(channel)
+    channel.close()
+
+    assert replayed == [("posts.generate", b"p1"), ("image.resize", b"r1")]
+    assert channel.published == replayed
+    # Without a known origin the message stays parked
+    assert channel.parked == [({}, b"unknown")]
+
+
+def test_replay_filters_by_queue_and_limit():
+    channel = ParkedChannel(
+        [
+            parked("posts.generate", b"p1"),
+            parked("comments.generate", b"c1"),
+            parked("posts.generate", b"p2"),
+            parked("posts.generate", b"p3"),
+        ]
+    )
+
+    replayed = replay(channel, queue="posts.generate", limit=2)
+    channel.close()
+
+    assert replayed == [("posts.generate", b"p1"), ("posts.generate", b"p2")]
+    assert sorted(body for _, body in channel.parked) == [b"c1", b"p3"]
+
+
+def test_dry_run_leaves_everything_parked():
+    channel = ParkedChannel([parked("posts.generate", b"p1"), parked("image.resize", b"r1")])
+
+    replayed = replay(channel, dry_run=True)
+    channel.close()
+
+    assert len(replayed) == 2
+    assert channel.published == []
+    assert len(channel.parked) == 2
@@ -0,0 +1,25 @@
+from datetime import datetime, timezone
+
+from pydantic import TypeAdapter
+
+from backend import fast_json
+from backend.schemas import PostSummary
+
+CREATED = datetime(2024, 5, 1, 12, 30, 15, 123456)
+
+
+def test_summary_rows_serialize_like_the_model():
+    images = [("full", 800, 600), ("320.webp", 320, 240), ("160.webp", 160, 120)]
+    row = PostSummary.row(7, "hello", "alice", CREATED, images)
+
+    summaries = TypeAdapter(list[PostSummary])
+    assert fast_json.dumps([row]) == summaries.dump_json(summaries.validate_python([row]))
+    assert [r["width"] for r in row["image_renditions"]] == [160, 320]
+
+
+def test_datetimes_keep_the_pydantic_format():
+    aware = CREATED.replace(tzinfo=timezone.utc)
+    row = PostSummary.row(1, "t", "u", aware, [])
+
+    assert fast_json.dumps(row) == PostSummary.model_validate(row).model_dump_json().encode()
+    assert b'"2024-05-01T12:30:15.123456Z"' in fast_json.dumps(row)
@@ -0,0 +1,45 @@
+import io
+
+from PIL import Image
+
+from backend.images import accepted_formats, choose_rendition, make_renditions
+
+
+def png_bytes(size, mode="RGB"):
+    buf = io.BytesIO()
+    Image.new(mode, size).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def test_make_renditions_sizes_and_formats():
+    renditions = make_renditions(png_bytes((1600, 800)), sizes=[160, 400], formats=["webp", "jpeg"])
+
+    assert [(r.variant, r.width, r.height) for r in renditions] == [
+        ("160.webp", 160, 80),
+        ("160.jpeg", 160, 80),
+        ("400.webp", 400, 200),
+        ("400.jpeg", 400, 200),
+    ]
+    assert Image.open(io.BytesIO(renditions[0].data)).format == "WEBP"
+    assert Image.open(io.BytesIO(renditions[1].data)).format == "JPEG"
+
+
+def test_make_renditions_never_upscales():
+    renditions = make_renditions(png_bytes((300, 300), "RGBA"), sizes=[160, 400, 1080])
+
+    assert sorted({(r.size, r.width) for r in renditions}) == [(160, 160), (400, 300)]
+
+
+def test_accepted_formats_ignore_wildcards():
+    assert accepted_formats(None) == ["jpeg"]
+    assert accepted_formats("image/avif,image/webp,*/*;q=0.8") == ["avif", "webp", "jpeg"]
+    assert accepted_formats("image/webp;q=0, image/*") == ["jpeg"]
+
+
+def test_choose_rendition():
+    available = ["full", "160.webp", "160.jpeg", "400.webp", "400.jpeg"]
+
+    assert choose_rendition(available, 400, "image/webp") == "400.webp"
+    assert choose_rendition(available, 200, None) == "400.jpeg"
+    assert choose_rendition(available, 1080, "image/avif") == "400.jpeg"
+    assert choose_rendition(["full"], 400, None) is None
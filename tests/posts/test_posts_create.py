@@ -1,9 +1,9 @@
-from tests.conftest import client, encode_image
+from tests.conftest import TEST_PNG, client, encode_image
 
 
 def test_create_post():
     payload = {
-        "image": encode_image("hello.png"),
+        "image": encode_image(TEST_PNG),
         "text": "Hello world",
         "user": "alice",
     }
@@ -20,3 +20,11 @@ def test_delete_post_and_its_comments():
 def test_delete_nonexistent_post():
     r = client.delete("/posts/999999")
     assert r.status_code == 404
+
+
+def test_delete_post_removes_its_images():
+    post_id = create_post()
+    assert client.get(f"/posts/{post_id}/image/full").status_code == 200
+
+    assert client.delete(f"/posts/{post_id}").status_code == 204
+    assert client.get(f"/posts/{post_id}/image/full").status_code == 404
@@ -0,0 +1,108 @@
+import base64
+
+from sqlmodel import Session
+
+from backend.blobstore import blob_store
+from backend.models import PostImage
+from tests.conftest import TEST_PNG, client, create_post, engine
+
+
+def test_list_returns_image_urls_instead_of_bytes():
+    post_id = create_post()
+
+    r = client.get("/posts/")
+    assert r.status_code == 200
+
+    data = r.json()[0]
+    assert "image_full" not in data
+    assert data["image_full_url"] == f"/posts/{post_id}/image/full"
+    # The thumbnail is produced later by the image-resizer
+    assert data["image_thumb_url"] is None
+
+
+def test_get_full_image_bytes():
+    payload = {"image": base64.b64encode(TEST_PNG).decode(), "text": "png", "user": "alice"}
+    post_id = client.post("/posts/", json=payload).json()["id"]
+
+    r = client.get(f"/posts/{post_id}/image/full")
+    assert r.status_code == 200
+    assert r.content == TEST_PNG
+    assert r.headers["content-type"] == "image/png"
+    assert "max-age" in r.headers["cache-control"]
+
+    r = client.get(f"/posts/{post_id}/image/full", headers={"If-None-Match": r.headers["etag"]})
+    assert r.status_code == 304
+
+
+def test_get_missing_thumbnail():
+    post_id = create_post()
+    assert client.get(f"/posts/{post_id}/image/thumb").status_code == 404
+
+
+def test_get_image_of_missing_post():
+    assert client.get("/posts/99999999/image/full").status_code == 404
+
+
+def add_renditions(post_id, sizes=((160, 120), (400, 300))):
+    # What the image-resizer stores: every size in WebP and JPEG
+    with Session(engine) as session:
+        for width, height in sizes:
+            for fmt in ("webp", "jpeg"):
+                session.add(
+                    PostImage(
+                        post_id=post_id,
+                        variant=f"{width}.{fmt}",
+                        blob_hash=blob_store.put(f"{width}-{fmt}".encode()),
+                        size=len(f"{width}-{fmt}"),
+                        width=width,
+                        height=height,
+                        content_type=f"image/{fmt}",
+                    )
+                )
+        session.commit()
+
+
+def test_list_returns_rendition_sizes():
+    post_id = create_post()
+    add_renditions(post_id)
+
+    data = client.get("/posts/").json()[0]
+    assert data["image_thumb_url"] == f"/posts/{post_id}/image/thumb"
+    assert data["image_renditions"] == [
+        {"url": f"/posts/{post_id}/image/thumb?size=160", "width": 160, "height": 120},
+        {"url": f"/posts/{post_id}/image/thumb?size=400", "width": 400, "height": 300},
+    ]
+
+
+def test_thumbnail_negotiates_format_from_accept():
+    post_id = create_post()
+    add_renditions(post_id)
+
+    r = client.get(f"/posts/{post_id}/image/thumb", headers={"Accept": "image/webp,*/*"})
+    assert r.content == b"400-webp"
+    assert r.headers["content-type"] == "image/webp"
+    assert r.headers["vary"] == "Accept"
+
+    r = client.get(f"/posts/{post_id}/image/thumb", headers={"Accept": "*/*"})
+    assert r.content == b"400-jpeg"
+    assert r.headers["content-type"] == "image/jpeg"
+
+
+def test_thumbnail_picks_closest_size():
+    post_id = create_post()
+    add_renditions(post_id)
+
+    assert client.get(f"/posts/{post_id}/image/thumb?size=100").content == b"160-jpeg"
+    assert client.get(f"/posts/{post_id}/image/thumb?size=200").content == b"400-jpeg"
+    # Larger than anything stored: the largest rendition
+    assert client.get(f"/posts/{post_id}/image/thumb?size=2000").content == b"400-jpeg"
+    # A sized "full" request is served from the renditions as well
+    assert client.get(f"/posts/{post_id}/image/full?size=160").content == b"160-jpeg"
+
+
+def test_detail_embeds_default_jpeg_thumbnail():
+    post_id = create_post()
+    add_renditions(post_id)
+
+    data = client.get(f"/posts/{post_id}").json()
+    assert base64.b64decode(data["image_thumb"]) == b"400-jpeg"
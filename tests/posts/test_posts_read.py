@@ -27,3 +27,42 @@ def test_get_post_by_id():
 def test_get_post_not_found():
     r = client.get("/posts/99999999")
     assert r.status_code == 404
+
+
+def test_get_all_posts_paginated():
+    ids = [create_post(text=f"page-{i}") for i in range(5)]
+
+    r = client.get("/posts/", params={"limit": 2})
+    assert r.status_code == 200
+    first = r.json()
+    assert [p["id"] for p in first] == ids[::-1][:2]
+    cursor = r.headers["X-Next-Cursor"]
+
+    seen = [p["id"] for p in first]
+    while cursor:
+        r = client.get("/posts/", params={"limit": 2, "cursor": cursor})
+        assert r.status_code == 200
+        seen += [p["id"] for p in r.json()]
+        cursor = r.headers.get("X-Next-Cursor")
+
+    assert seen == ids[::-1]
+
+
+def test_get_all_posts_paginated_with_filter():
+    for i in range(3):
+        create_post(text=f"filtered-{i}", user="pager")
+    create_post(text="other", user="someone-else")
+
+    r = client.get("/posts/", params={"user": "pager", "limit": 2})
+    assert len(r.json()) == 2
+    r = client.get(
+        "/posts/", params={"user": "pager", "limit": 2, "cursor": r.headers["X-Next-Cursor"]}
+    )
+    assert [p["user"] for p in r.json()] == ["pager"]
+    assert "X-Next-Cursor" not in r.headers
+
+
+def test_get_all_posts_invalid_cursor():
+    create_post()
+    r = client.get("/posts/", params={"cursor": "not-a-cursor"})
+    assert r.status_code == 400
@@ -0,0 +1,60 @@
+from backend.uploads import MAX_UPLOAD_BYTES
+from tests.conftest import TEST_PNG, client, encode_image
+
+
+def upload(image: bytes | None = TEST_PNG, **fields):
+    data = {"text": "uploaded", "user": "alice", **fields}
+    if image is None:
+        # What browsers send for an empty file input
+        files = {"image": ("", b"", "application/octet-stream")}
+    else:
+        files = {"image": ("photo.png", image, "image/png")}
+    return client.post("/posts/upload", data=data, files=files)
+
+
+def test_upload_stores_raw_image_bytes():
+    r = upload()
+    assert r.status_code == 200
+    post = r.json()
+    assert post["text"] == "uploaded"
+    assert post["image_full_url"] == f"/posts/{post['id']}/image/full"
+
+    r = client.get(post["image_full_url"])
+    assert r.content == TEST_PNG
+    assert r.headers["content-type"] == "image/png"
+
+
+def test_upload_without_image():
+    r = upload(image=None)
+    assert r.status_code == 200
+    assert r.json()["image_full_url"] is None
+
+
+def test_upload_rejects_non_image():
+    r = upload(image=b"#!/bin/sh\nrm -rf /\n" * 4)
+    assert r.status_code == 415
+
+
+def test_upload_rejects_oversized_image():
+    r = upload(image=TEST_PNG + b"\x00" * MAX_UPLOAD_BYTES)
+    assert r.status_code == 413
+
+
+def test_upload_requires_text_and_user():
+    r = client.post("/posts/upload", files={"image": ("photo.png", TEST_PNG, "image/png")})
+    assert r.status_code == 422
+
+
+def test_upload_requires_multipart():
+    r = client.post("/posts/upload", json={"text": "x", "user": "y"})
+    assert r.status_code == 415
+
+
+def test_json_data_url_still_supported():
+    payload = {"image": "data:image/png;base64," + encode_image(TEST_PNG), "text": "t", "user": "u"}
+    r = client.post("/posts/", json=payload)
+    assert r.status_code == 200
+    assert client.get(f"/posts/{r.json()['id']}/image/full").content == TEST_PNG
+
+    payload["image"] = "data:image/png," + encode_image(TEST_PNG)
+    assert client.post("/posts/", json=payload).status_code == 400
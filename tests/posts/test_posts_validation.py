@@ -0,0 +1,70 @@
+import io
+
+from PIL import Image
+
+from backend.images import MAX_IMAGE_DIMENSION
+from tests.conftest import client, encode_image
+
+
+def image_bytes(size, fmt="PNG", mode="RGB", orientation=None) -> bytes:
+    buf = io.BytesIO()
+    options = {}
+    if orientation is not None:
+        exif = Image.Exif()
+        exif[0x0112] = orientation  # Orientation
+        exif[0x010F] = "Some Camera"  # Make
+        options["exif"] = exif.tobytes()
+    Image.new(mode, size).save(buf, format=fmt, **options)
+    return buf.getvalue()
+
+
+def post_json(image: bytes):
+    payload = {"image": encode_image(image), "text": "t", "user": "u"}
+    return client.post("/posts/", json=payload)
+
+
+def post_multipart(image: bytes):
+    files = {"image": ("photo", image, "application/octet-stream")}
+    return client.post("/posts/upload", data={"text": "t", "user": "u"}, files=files)
+
+
+def stored_image(post_id) -> Image.Image:
+    r = client.get(f"/posts/{post_id}/image/full")
+    assert r.status_code == 200
+    return Image.open(io.BytesIO(r.content))
+
+
+def test_rejects_bytes_that_are_not_an_image():
+    assert post_json(b"img.png").status_code == 415
+
+
+def test_rejects_truncated_image():
+    assert post_json(image_bytes((64, 64))[:-30]).status_code == 415
+
+
+def test_rejects_decompression_bomb():
+    # ~50 KB on the wire, 400 megapixels once decoded
+    bomb = image_bytes((20000, 20000), mode="1")
+    assert len(bomb) < 100_000
+
+    assert post_json(bomb).status_code == 413
+    assert post_multipart(bomb).status_code == 413
+
+
+def test_exif_orientation_applied_and_stripped():
+    photo = image_bytes((40, 20), fmt="JPEG", orientation=6)  # rotated 90° clockwise
+
+    for response in (post_json(photo), post_multipart(photo)):
+        assert response.status_code == 200
+        img = stored_image(response.json()["id"])
+        assert img.size == (20, 40)
+        assert dict(img.getexif()) == {}
+
+
+def test_oversized_original_is_downsized():
+    r = post_multipart(image_bytes((MAX_IMAGE_DIMENSION * 2, 100)))
+    assert r.status_code == 200
+
+    img = stored_image(r.json()["id"])
+    assert img.size == (MAX_IMAGE_DIMENSION, 50)
+    assert img.format == "PNG"
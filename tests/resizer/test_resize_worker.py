@@ -0,0 +1,161 @@
+import importlib.util
+import io
+import json
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+from PIL import Image
+from sqlalchemy.exc import OperationalError
+from sqlmodel import Session, select
+
+from backend.blobstore import blob_store
+from backend.feed_cache import current_version
+from backend.models import Post, PostImage
+from tests.conftest import engine
+
+_spec = importlib.util.spec_from_file_location(
+    "image_resizer", Path(__file__).resolve().parents[2] / "image-resizer" / "main.py"
+)
+resizer = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(resizer)
+
+
+class RecordingChannel:
+    def __init__(self):
+        self.acked: list[int] = []
+        self.nacked: list[int] = []
+
+    def basic_ack(self, delivery_tag):
+        self.acked.append(delivery_tag)
+
+    def basic_nack(self, delivery_tag, requeue=True):
+        self.nacked.append(delivery_tag)
+
+
+def png_bytes(size=(800, 600)) -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", size, (200, 30, 30)).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def add_post(image: bytes | None) -> int:
+    with Session(engine) as session:
+        post = Post(text="resize me", user="alice")
+        session.add(post)
+        session.flush()
+        if image is not None:
+            image_hash = blob_store.put(image)
+            session.add(
+                PostImage(post_id=post.id, variant="full", blob_hash=image_hash, size=len(image))
+            )
+        session.commit()
+        return post.id
+
+
+@pytest.fixture
+def worker():
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        worker = resizer.ResizeWorker(pool, lambda: Session(engine), batch_size=2)
+        worker.attach(RecordingChannel())
+        yield worker
+
+
+def deliver(worker, tag, payload):
+    body = json.dumps(payload).encode()
+    worker.on_message(worker.channel, SimpleNamespace(delivery_tag=tag), None, body)
+
+
+def renditions_of(post_id):
+    with Session(engine) as session:
+        query = select(PostImage).where(PostImage.post_id == post_id, PostImage.variant != "full")
+        return {image.variant: image for image in session.exec(query)}
+
+
+def test_renditions_committed_before_ack(worker):
+    ids = [add_post(png_bytes()) for _ in range(3)]
+    for tag, post_id in enumerate(ids, start=1):
+        deliver(worker, tag, {"post_id": post_id})
+    assert worker.channel.acked == []
+
+    worker.drain()
+
+    assert sorted(worker.channel.acked) == [1, 2, 3]
+    assert worker.pending == []
+    for post_id in ids:
+        renditions = renditions_of(post_id)
+        assert set(renditions) == {f"{s}.{f}" for s in (160, 400, 1080) for f in ("webp", "jpeg")}
+        # Never upscaled: the 1080 rendition keeps the original 800x600
+        assert (renditions["1080.jpeg"].width, renditions["1080.jpeg"].height) == (800, 600)
+        thumb = renditions["400.webp"]
+        assert (thumb.width, thumb.height) == (400, 300)
+        assert thumb.content_type == "image/webp"
+        assert Image.open(io.BytesIO(blob_store.get(thumb.blob_hash))).size == (400, 300)
+
+
+def test_undecodable_image_is_rejected(worker):
+    good, bad = add_post(png_bytes()), add_post(b"not an image")
+    deliver(worker, 1, {"post_id": good})
+    deliver(worker, 2, {"post_id": bad})
+
+    worker.drain()
+
+    assert worker.channel.acked == [1]
+    assert worker.channel.nacked == [2]
+    assert renditions_of(bad) == {}
+
+
+def test_missing_image_and_malformed_message_are_settled_immediately(worker):
+    deliver(worker, 1, {"post_id": add_post(None)})
+    deliver(worker, 2, {"nope": 1})
+
+    assert worker.channel.acked == [1]
+    assert worker.channel.nacked == [2]
+    assert worker.pending == []
+
+
+def flaky_sessions(failures: int):
+    """Session factory whose first `failures` commits fail like a locked database."""
+    remaining = [failures]
+
+    class FlakySession(Session):
+        def commit(self):
+            if remaining[0] > 0:
+                remaining[0] -= 1
+                raise OperationalError("COMMIT", {}, Exception("database is locked"))
+            super().commit()
+
+    return lambda: FlakySession(engine)
+
+
+@pytest.mark.parametrize("failures, committed", [(2, True), (3, False)])
+def test_transient_commit_failures_are_retried_then_parked(failures, committed):
+    post_id = add_post(png_bytes())
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        worker = resizer.ResizeWorker(
+            pool, flaky_sessions(failures), commit_attempts=3, retry_base_delay=0
+        )
+        worker.attach(RecordingChannel())
+        deliver(worker, 1, {"post_id": post_id})
+        worker.drain()
+
+    if committed:
+        assert worker.channel.acked == [1]
+        assert renditions_of(post_id)
+    else:
+        # Rejected to the dead-letter exchange, nothing half-written
+        assert worker.channel.nacked == [1]
+        assert renditions_of(post_id) == {}
+
+
+def test_committed_renditions_invalidate_the_feed_cache(worker):
+    post_id = add_post(png_bytes())
+    with Session(engine) as session:
+        version = current_version(session)
+
+    deliver(worker, 1, {"post_id": post_id})
+    worker.drain()
+
+    with Session(engine) as session:
+        assert current_version(session) == version + 1
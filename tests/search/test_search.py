@@ -0,0 +1,61 @@
+import pytest
+
+from backend.search import build_match_query, fts_available
+from tests.conftest import client, create_comment, create_post, engine
+
+# Ranking and snippets need FTS5; other databases fall back to LIKE
+pytestmark = pytest.mark.skipif(not fts_available(engine), reason="SQLite FTS5 only")
+
+
+def test_search_posts_ranked_with_snippet():
+    create_post(text="Walking the dog in the park")
+    best = create_post(text="Dog dog dog: my dog loves parks")
+    create_post(text="Cats only")
+
+    r = client.get("/search", params={"q": "dog"})
+    assert r.status_code == 200
+
+    hits = r.json()
+    assert [h["id"] for h in hits][0] == best
+    assert len(hits) == 2
+    assert "<mark>dog</mark>" in hits[1]["snippet"].lower()
+
+
+def test_search_posts_prefix_and_all_terms():
+    post_id = create_post(text="Photography tips for beginners")
+    create_post(text="Photography gear review")
+
+    r = client.get("/search", params={"q": "photo begin"})
+    assert [h["id"] for h in r.json()] == [post_id]
+
+
+def test_search_comments():
+    post_id = create_post(text="Holiday")
+    comment_id = create_comment(post_id, text="Wonderful sunset picture")
+    create_comment(post_id, text="Meh")
+
+    r = client.get("/search", params={"q": "sunset", "scope": "comments"})
+    hits = r.json()
+    assert len(hits) == 1
+    assert hits[0]["id"] == comment_id
+    assert hits[0]["post_id"] == post_id
+
+
+def test_search_index_follows_deletes():
+    post_id = create_post(text="Ephemeral content")
+    assert client.delete(f"/posts/{post_id}").status_code == 204
+
+    assert client.get("/search", params={"q": "ephemeral"}).json() == []
+
+
+def test_search_snippet_is_html_escaped():
+    create_post(text="<script>alert(1)</script> hello")
+
+    snippet = client.get("/search", params={"q": "hello"}).json()[0]["snippet"]
+    assert "<script>" not in snippet
+    assert "<mark>hello</mark>" in snippet
+
+
+def test_build_match_query_quotes_terms():
+    assert build_match_query('foo "bar" OR-baz') == '"foo"* "bar"* "OR"* "baz"*'
+    assert build_match_query("  *** ") is None